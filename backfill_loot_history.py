@@ -0,0 +1,179 @@
+import requests
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+from bulk_decode import BULK_DECODE_WORKERS, BulkDecoder
+from loot_store import open_loot_store, store_loot_entries, backfilled_season_ids, mark_season_backfilled, query_loot_totals
+from query_loot import print_table
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_characters, decode_loot_history
+
+# One-time pull of past seasons' loot history into the local loot store, so lifetime and per-season
+# loot totals (python query_loot.py --totals) come from local data. The running season is stored again
+# on every run. Past seasons are found by probing /v1/loot_history/<id> below the current season id;
+# seasons the guild has no history for answer with an error or an empty list and are remembered as such.
+
+# --- Configuration ---
+API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
+
+# Maximum number of /loot_history requests in flight at once.
+LOOT_BACKFILL_MAX_WORKERS = int(os.getenv('LOOT_BACKFILL_MAX_WORKERS', '4'))
+
+# Oldest season id to probe. When unset, the LOOT_BACKFILL_MAX_SEASONS seasons before the current one are probed.
+LOOT_BACKFILL_FIRST_SEASON = os.getenv('LOOT_BACKFILL_FIRST_SEASON')
+LOOT_BACKFILL_MAX_SEASONS = int(os.getenv('LOOT_BACKFILL_MAX_SEASONS', '12'))
+
+# --- Loot History Exclusion Configuration ---
+EXCLUDED_LOOT_RESPONSE_TYPES = ["tmog", "transmorg", "transmog"]
+
+
+# --- Function to Fetch Past Seasons ---
+def fetch_seasons_loot(api_auth_header, season_ids):
+    """
+    Fetches the loot history of several seasons concurrently, with at most LOOT_BACKFILL_MAX_WORKERS requests
+    in flight. Bodies are decoded on the BulkDecoder pool as they arrive.
+
+    Returns:
+        tuple: ({season_id: [LootEntry, ...]} for every season that answered, including empty ones,
+                set of season ids that failed and should be retried on the next run).
+    """
+    fetched = {}
+    failed = set()
+    bodies = {}
+    with ThreadPoolExecutor(max_workers=LOOT_BACKFILL_MAX_WORKERS) as executor, BulkDecoder() as decoder:
+        futures = {executor.submit(fetch_wowaudit, f"/loot_history/{season_id}", api_auth_header): season_id for season_id in season_ids}
+        decode_futures = {}
+        for future in as_completed(futures):
+            season_id = futures[future]
+            try:
+                bodies[season_id] = future.result()
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    print(f"DEBUG: Season {season_id} has no loot history.")
+                    fetched[season_id] = []
+                else:
+                    print(f"Error: Failed to fetch loot history for season {season_id}: {e}")
+                    failed.add(season_id)
+                continue
+            except requests.exceptions.RequestException as e:
+                print(f"Error: Failed to fetch loot history for season {season_id}: {e}")
+                failed.add(season_id)
+                continue
+            decode_futures[decoder.submit(decode_loot_history, bodies[season_id])] = season_id
+
+        for future in as_completed(decode_futures):
+            season_id = decode_futures[future]
+            try:
+                fetched[season_id] = future.result()
+            except BrokenProcessPool:
+                print(f"Warning: Decoder process for season {season_id} died. Decoding it inline.")
+                fetched[season_id] = decode_loot_history(bodies[season_id])
+            except ValueError as e:
+                print(f"Error: Could not decode loot history for season {season_id}: {e}")
+                failed.add(season_id)
+                continue
+            print(f"DEBUG: Fetched season {season_id} ({len(fetched[season_id])} loot entries).")
+    return fetched, failed
+
+
+# --- Function to Dedupe Entries Across Seasons ---
+def dedupe_loot_entries(fetched, known_ids):
+    """
+    Drops entries without an id and entries whose history item id was already seen, either in the
+    store (known_ids) or in an earlier season of this pull. Seasons are taken newest first.
+
+    Returns:
+        tuple: ({season_id: [LootEntry, ...]}, number of dropped duplicates).
+    """
+    seen = set(known_ids)
+    deduped = {}
+    duplicates = 0
+    for season_id in sorted(fetched, reverse=True):
+        season_entries = []
+        for entry in fetched[season_id]:
+            if not isinstance(entry.id, int):
+                continue
+            if entry.id in seen:
+                duplicates += 1
+                continue
+            seen.add(entry.id)
+            season_entries.append(entry)
+        deduped[season_id] = season_entries
+    return deduped, duplicates
+
+
+# --- Main Script Logic ---
+def main():
+    parser = argparse.ArgumentParser(description="Backfill past seasons' loot history into the local loot store.")
+    parser.add_argument("--refresh", action="store_true", help="Fetch seasons that were backfilled before again")
+    args = parser.parse_args()
+
+    if not API_AUTHORIZATION_HEADER:
+        print("Error: WOWAUDIT_API_KEY environment variable is not set. Please configure it as a GitHub Secret.")
+        exit(1)
+
+    try:
+        current_season_id = (get_period_data(API_AUTHORIZATION_HEADER).get("current_season") or {}).get("keystone_season_id")
+        api_characters = decode_characters(fetch_wowaudit('/characters', API_AUTHORIZATION_HEADER))
+    except requests.exceptions.RequestException as e:
+        print(f"Error: An error occurred while fetching period or character data: {e}")
+        exit(1)
+    if current_season_id is None:
+        print("Error: Could not find 'keystone_season_id' in the current_season data.")
+        exit(1)
+    # Characters who left the guild are not in /characters; their loot is shown as "Ukendt (<id>)"
+    character_map = {character.id: {"name": character.name, "class": character.character_class} for character in api_characters}
+
+    first_season = int(LOOT_BACKFILL_FIRST_SEASON) if LOOT_BACKFILL_FIRST_SEASON else max(current_season_id - LOOT_BACKFILL_MAX_SEASONS, 1)
+    conn = open_loot_store()
+    try:
+        already_backfilled = set() if args.refresh else backfilled_season_ids(conn)
+        season_ids = [s for s in range(first_season, current_season_id) if s not in already_backfilled]
+        if not season_ids:
+            print(f"Seasons {first_season}-{current_season_id - 1} are already backfilled. Nothing to fetch (use --refresh to fetch them again).")
+        else:
+            print(f"Fetching {len(season_ids)} season(s) with up to {LOOT_BACKFILL_MAX_WORKERS} parallel requests "
+                  f"and {BULK_DECODE_WORKERS} decoder process(es): {season_ids}")
+            fetched, failed = fetch_seasons_loot(API_AUTHORIZATION_HEADER, season_ids)
+
+            fetched_ids = set(fetched)
+            placeholders = ", ".join("?" for _ in fetched_ids)
+            known_ids = [row[0] for row in conn.execute(f"SELECT id FROM loot WHERE season_id NOT IN ({placeholders})", list(fetched_ids))]
+            deduped, duplicates = dedupe_loot_entries(fetched, known_ids)
+            if duplicates:
+                print(f"Warning: Skipped {duplicates} loot entries that were already stored under another season.")
+
+            backfilled_at = datetime.now(timezone.utc).isoformat()
+            for season_id in sorted(deduped):
+                if deduped[season_id] and not store_loot_entries(season_id, deduped[season_id], character_map, EXCLUDED_LOOT_RESPONSE_TYPES):
+                    failed.add(season_id) # Not marked as backfilled, so the next run fetches it again
+                    continue
+                mark_season_backfilled(conn, season_id, len(deduped[season_id]), backfilled_at)
+            if failed:
+                print(f"Warning: Season(s) {sorted(failed)} could not be fetched and will be retried on the next run.")
+
+        # The loot reports keep their store in their own state, so the running season is stored here as well
+        # (on every run; it is not marked as backfilled) to keep it in the lifetime view
+        try:
+            current_entries = decode_loot_history(fetch_wowaudit(f"/loot_history/{current_season_id}", API_AUTHORIZATION_HEADER))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Warning: Could not fetch loot history for the current season {current_season_id}: {e}. Its totals are not updated.")
+        else:
+            store_loot_entries(current_season_id, current_entries, character_map, EXCLUDED_LOOT_RESPONSE_TYPES)
+
+        print("\n--- Loot per season ---")
+        print_table(["season", "entries", "backfilled_at"],
+                    conn.execute("SELECT season_id, entry_count, backfilled_at FROM loot_backfilled_seasons WHERE entry_count > 0 ORDER BY season_id").fetchall())
+        columns, rows = query_loot_totals(conn)
+        print(f"\n--- Lifetime loot ({len(rows)} characters) ---")
+        print_table(columns, rows)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
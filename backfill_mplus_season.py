@@ -0,0 +1,274 @@
+import requests
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from check_mplus_requirements import REQUIRED_DUNGEON_OPTION_VALUE, CLASS_IMAGE_MAP, send_discord_webhook
+from report_state import load_state, save_state, compute_fingerprint, fingerprint_unchanged, store_fingerprints
+from bulk_decode import BULK_DECODE_WORKERS, BulkDecoder, pack_period_options, unpack_period_options
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+
+# --- Configuration ---
+API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
+DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL') # Optional; without it the summary is only printed
+
+DISCORD_ID_MAP_FILE = 'discord_id_map.json'
+
+# Maximum number of /historical_data requests in flight at once during a backfill.
+BACKFILL_MAX_WORKERS = int(os.getenv('BACKFILL_MAX_WORKERS', '4'))
+
+# First period of the keystone season. Taken from /v1/period (current_season.first_period_id) when unset.
+SEASON_FIRST_PERIOD = os.getenv('SEASON_FIRST_PERIOD')
+
+# State file holding the character x period matrix for the current season.
+SEASON_MATRIX_STATE = 'mplus_season_matrix'
+
+# --- Compliance Status Codes ---
+# One code per character per period, stored as one digit each ("0012...") in the state file.
+STATUS_COMPLETE = 0
+STATUS_MISSING_ONE = 1
+STATUS_MISSING_TWO = 2
+STATUS_NO_DATA = 3 # Character not in the historical data for that period
+
+
+# --- Function to Turn Vault Options Into a Status Code ---
+def status_code_from_options(options, required_value):
+    """
+    Same rule as check_mplus_requirements: both option_1 and option_2 must equal the required value.
+    `options` is None when the character was not in the data for that period.
+    """
+    if options is None:
+        return STATUS_NO_DATA
+    if options[0] == required_value and options[1] == required_value:
+        return STATUS_COMPLETE
+    if options[0] == required_value:
+        return STATUS_MISSING_ONE
+    return STATUS_MISSING_TWO
+
+
+# --- Function to Load the Stored Season Matrix ---
+def load_season_matrix(season_id, first_period, required_value):
+    """
+    Loads the stored matrix for this season, or an empty one if none is stored or it belongs to
+    another season. Status rows are recomputed from the stored options if the required value changed.
+
+    Returns:
+        dict: {"periods": [period, ...], "rows": {name: bytearray of status codes}, "options": {name: [[o1, o2, o3] or None, ...]}}
+    """
+    stored = load_state(SEASON_MATRIX_STATE)
+    if not stored or stored.get("season_id") != season_id or stored.get("first_period") != first_period:
+        return {"periods": [], "rows": {}, "options": {}}
+
+    matrix = {
+        "periods": stored.get("periods", []),
+        "rows": {name: bytearray(int(digit) for digit in digits) for name, digits in stored.get("statuses", {}).items()},
+        "options": stored.get("options", {}),
+    }
+    if stored.get("required_value") != required_value:
+        print(f"Required value changed from {stored.get('required_value')} to {required_value}. Recomputing statuses from stored options.")
+        for name, option_row in matrix["options"].items():
+            matrix["rows"][name] = bytearray(status_code_from_options(options, required_value) for options in option_row)
+    return matrix
+
+
+# --- Function to Persist the Season Matrix ---
+def save_season_matrix(matrix, season_id, first_period, required_value):
+    save_state(SEASON_MATRIX_STATE, {
+        "season_id": season_id,
+        "first_period": first_period,
+        "required_value": required_value,
+        "periods": matrix["periods"],
+        "statuses": {name: "".join(str(code) for code in row) for name, row in matrix["rows"].items()},
+        "options": matrix["options"],
+    })
+
+
+# --- Function to Append a Period Column ---
+def add_period_to_matrix(matrix, period, period_options, required_value):
+    """
+    Appends one period column. Characters absent that period get STATUS_NO_DATA; characters seen for
+    the first time get STATUS_NO_DATA for all earlier periods.
+    """
+    previous_period_count = len(matrix["periods"])
+    matrix["periods"].append(period)
+
+    for name, options in period_options.items():
+        if name not in matrix["rows"]:
+            matrix["rows"][name] = bytearray([STATUS_NO_DATA] * previous_period_count)
+            matrix["options"][name] = [None] * previous_period_count
+        matrix["rows"][name].append(status_code_from_options(options, required_value))
+        matrix["options"][name].append(options)
+
+    for name, row in matrix["rows"].items():
+        if len(row) < len(matrix["periods"]):
+            row.append(STATUS_NO_DATA)
+            matrix["options"][name].append(None)
+
+
+# --- Function to Compute Per-Character Season Stats ---
+def compute_season_stats(row):
+    """
+    Computes compliance stats from one character's status codes (oldest period first).
+
+    Returns:
+        dict: weeks (periods with data), completed, misses, percentage, current_streak, longest_streak.
+    """
+    weeks = completed = misses = 0
+    current_streak = longest_streak = 0
+    for code in row:
+        if code == STATUS_NO_DATA:
+            continue # Not on the roster that week; neither breaks nor extends a streak
+        weeks += 1
+        if code == STATUS_COMPLETE:
+            completed += 1
+            current_streak += 1
+            longest_streak = max(longest_streak, current_streak)
+        else:
+            misses += 1
+            current_streak = 0
+    percentage = (completed / weeks * 100) if weeks else 0.0
+    return {
+        "weeks": weeks,
+        "completed": completed,
+        "misses": misses,
+        "percentage": percentage,
+        "current_streak": current_streak,
+        "longest_streak": longest_streak,
+    }
+
+
+# --- Function to Backfill the Season Matrix ---
+def backfill_season_matrix(api_auth_header, season_id, first_period, last_period, required_value):
+    """
+    Brings the stored matrix up to date for periods first_period..last_period. Only periods not stored
+    yet are fetched, concurrently with at most BACKFILL_MAX_WORKERS requests in flight.
+    """
+    matrix = load_season_matrix(season_id, first_period, required_value)
+    missing_periods = [p for p in range(first_period, last_period + 1) if p not in matrix["periods"]]
+    if not missing_periods:
+        print(f"Season matrix already covers periods {first_period}-{last_period}. Nothing to fetch.")
+        return matrix
+
+    print(f"Fetching {len(missing_periods)} period(s) with up to {BACKFILL_MAX_WORKERS} parallel requests "
+          f"and {BULK_DECODE_WORKERS} decoder process(es): {missing_periods}")
+    fetched = {}
+    bodies = {}
+    # Fetch threads only download; each body is handed to the decoder pool as soon as it arrives
+    with ThreadPoolExecutor(max_workers=BACKFILL_MAX_WORKERS) as executor, BulkDecoder() as decoder:
+        futures = {executor.submit(fetch_wowaudit, f"/historical_data?period={period}", api_auth_header): period for period in missing_periods}
+        decode_futures = {}
+        for future in as_completed(futures):
+            period = futures[future]
+            try:
+                bodies[period] = future.result()
+            except requests.exceptions.RequestException as e:
+                print(f"Error: Failed to fetch historical data for period {period}: {e}")
+                continue
+            decode_futures[decoder.submit(pack_period_options, bodies[period])] = period
+
+        for future in as_completed(decode_futures):
+            period = decode_futures[future]
+            try:
+                packed = future.result()
+            except BrokenProcessPool:
+                print(f"Warning: Decoder process for period {period} died. Decoding it inline.")
+                packed = pack_period_options(bodies[period])
+            except ValueError as e:
+                print(f"Error: Could not decode historical data for period {period}: {e}")
+                continue
+            fetched[period] = unpack_period_options(packed)
+            print(f"DEBUG: Fetched period {period} ({len(fetched[period])} characters).")
+
+    # Columns must stay in period order, so stop at the first gap and retry it on the next run.
+    for period in missing_periods:
+        if period not in fetched:
+            print(f"Warning: Period {period} is missing; later periods will be added on the next run.")
+            break
+        add_period_to_matrix(matrix, period, fetched[period], required_value)
+
+    save_season_matrix(matrix, season_id, first_period, required_value)
+    return matrix
+
+
+# --- Function to Build the Season Summary Embed ---
+def build_season_summary(matrix, season_id, discord_id_map):
+    """
+    Returns (embed_title, embed_description, embed_color) for the season compliance summary.
+    Only characters present in the newest period are listed, least compliant first.
+    """
+    embed_title = f"M+ Sæsonoversigt: Sæson {season_id}"
+    if not matrix["periods"]:
+        return embed_title, f"Ingen M+ data fundet for sæson {season_id}.", 808080
+
+    player_stats = []
+    for name, row in matrix["rows"].items():
+        if row[-1] == STATUS_NO_DATA:
+            continue # Not on the current roster
+        player_stats.append((name, compute_season_stats(row)))
+    player_stats.sort(key=lambda entry: (entry[1]["percentage"], -entry[1]["misses"], entry[0]))
+
+    embed_description = f"M+ requirement over {len(matrix['periods'])} uger (periode {matrix['periods'][0]}-{matrix['periods'][-1]}):\n\n"
+    for name, stats in player_stats:
+        player_data_from_map = discord_id_map.get(name)
+        player_class = player_data_from_map.get('class', 'Unknown') if isinstance(player_data_from_map, dict) else 'Unknown'
+        class_info = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])
+        class_display = class_info['emoji'] or class_info['abbr']
+        embed_description += (f"{class_display} {name} - {stats['completed']}/{stats['weeks']} uger ({stats['percentage']:.0f}%), "
+                              f"{stats['current_streak']} i træk, {stats['misses']} missede\n")
+
+    embed_color = 3066993 if all(stats["misses"] == 0 for _, stats in player_stats) else 3447003
+    return embed_title, embed_description, embed_color
+
+
+# --- Main Script Logic ---
+def main():
+    if not API_AUTHORIZATION_HEADER:
+        print("Error: WOWAUDIT_API_KEY environment variable is not set. Please configure it as a GitHub Secret.")
+        exit(1)
+
+    try:
+        period_data = get_period_data(API_AUTHORIZATION_HEADER)
+    except requests.exceptions.RequestException as e:
+        print(f"Error: An error occurred while fetching period data: {e}")
+        exit(1)
+
+    current_period = period_data.get("current_period")
+    current_season = period_data.get("current_season") or {}
+    season_id = current_season.get("keystone_season_id")
+    first_period = int(SEASON_FIRST_PERIOD) if SEASON_FIRST_PERIOD else current_season.get("first_period_id")
+    if current_period is None or season_id is None or first_period is None:
+        print("Error: Could not determine current period, keystone_season_id or the season's first period. "
+              "Set SEASON_FIRST_PERIOD if /v1/period does not return current_season.first_period_id.")
+        exit(1)
+
+    # Only finished periods go into the matrix; the running period is covered by the current-period report.
+    last_period = current_period - 1
+    print(f"Backfilling M+ compliance for season {season_id}, periods {first_period}-{last_period}.")
+    matrix = backfill_season_matrix(API_AUTHORIZATION_HEADER, season_id, first_period, last_period, REQUIRED_DUNGEON_OPTION_VALUE)
+
+    discord_id_map = {}
+    try:
+        with open(DISCORD_ID_MAP_FILE, 'r', encoding='utf-8') as f:
+            discord_id_map = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not load Discord ID map: {e}. Player classes may be missing.")
+
+    embed_title, embed_description, embed_color = build_season_summary(matrix, season_id, discord_id_map)
+    print(f"\n--- {embed_title} ---\n{embed_description}")
+
+    if not DISCORD_WEBHOOK_URL:
+        print("Warning: DISCORD_WEBHOOK_URL is not set. Skipping Discord notification.")
+        return
+
+    report_key = f"mplus_season:{season_id}"
+    output_fingerprint = compute_fingerprint(embed_title, embed_description, embed_color)
+    if fingerprint_unchanged(report_key, "output", output_fingerprint):
+        print(f"Season summary unchanged since the last delivered '{report_key}' report. Skipping post.")
+    elif send_discord_webhook(embed_description, DISCORD_WEBHOOK_URL, embed_title, embed_color, report_key=report_key):
+        store_fingerprints(report_key, compute_fingerprint(matrix["periods"]), output_fingerprint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from wowaudit_records import decode_historical_data
+
+# Bulk fetch jobs (season backfills) download many large payloads at once. Decoding them on the fetching
+# threads serializes all JSON parsing on one core, so the raw bytes are handed to a process pool instead.
+# Workers decode (with orjson when installed, see wowaudit_records) and return packed results: names as
+# one NUL-separated string and integers as array bytes, which pickle into a few flat buffers instead of
+# a tree of dicts and lists.
+
+# --- Configuration ---
+# Decoder processes. 0 or 1 decodes on the calling thread (no pool is started).
+BULK_DECODE_WORKERS = int(os.getenv('BULK_DECODE_WORKERS', str(os.cpu_count() or 1)))
+
+# Payloads smaller than this are decoded in the calling process; shipping them to a worker costs more than parsing.
+BULK_DECODE_MIN_BYTES = int(os.getenv('BULK_DECODE_MIN_BYTES', '65536'))
+
+# Stands in for a missing vault option in packed option arrays.
+MISSING_OPTION = -1
+
+
+# --- Function to Pack /v1/historical_data ---
+def pack_period_options(body):
+    """
+    Decodes a /v1/historical_data body into packed vault options. Runs in a decoder process.
+
+    Returns:
+        tuple: (names joined by NUL, array('i') bytes with option_1..option_3 per name; MISSING_OPTION for None).
+    """
+    names = []
+    options = array('i')
+    for snapshot in decode_historical_data(body):
+        if not snapshot.name:
+            continue
+        names.append(snapshot.name)
+        for option in (snapshot.option_1, snapshot.option_2, snapshot.option_3):
+            options.append(option if isinstance(option, int) else MISSING_OPTION)
+    return "\0".join(names), options.tobytes()
+
+
+# --- Function to Unpack Vault Options ---
+def unpack_period_options(packed):
+    """
+    Turns the result of pack_period_options back into {character_name: [option_1, option_2, option_3]}.
+    """
+    names_blob, options_bytes = packed
+    if not names_blob:
+        return {}
+    options = array('i')
+    options.frombytes(options_bytes)
+    values = [None if value == MISSING_OPTION else value for value in options]
+    return {name: values[i * 3:i * 3 + 3] for i, name in enumerate(names_blob.split("\0"))}
+
+
+# --- Process Pool for Decoding ---
+class BulkDecoder:
+    """
+    Runs decode functions on a process pool, or inline for small payloads and when BULK_DECODE_WORKERS <= 1.
+    submit() always returns a Future. Use as a context manager.
+    """
+
+    def __init__(self, max_workers=BULK_DECODE_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+
+    def __enter__(self):
+        if self.max_workers > 1:
+            try:
+                # Workers are started while the fetch threads run; forkserver avoids forking a process that holds their locks
+                context = multiprocessing.get_context("forkserver") if "forkserver" in multiprocessing.get_all_start_methods() else None
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            except (OSError, NotImplementedError) as e:
+                print(f"Warning: Could not start decoder processes ({e}). Decoding on the fetching threads.")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def submit(self, decode, body):
+        """
+        Schedules decode(body) and returns a Future with its result.
+        """
+        if self._pool is not None and len(body) >= BULK_DECODE_MIN_BYTES:
+            try:
+                return self._pool.submit(decode, body)
+            except BrokenProcessPool as e:
+                print(f"Warning: Decoder processes stopped ({e}). Decoding the remaining payloads inline.")
+                self._pool = None
+        future = Future()
+        try:
+            future.set_result(decode(body))
+        except Exception as e:
+            future.set_exception(e)
+        return future
@@ -2,7 +2,22 @@ import requests
 import json
 from datetime import datetime
 import os
-import gspread # Library for Google Sheets API interaction
+
+from discord_delivery import deliver_discord_payload
+from report_profiling import mark_stage, run_entry_point
+from run_metrics import record_zero_loot_players
+from report_state import compute_fingerprint, fingerprint_unchanged, store_fingerprints
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_characters, decode_loot_history
+from loot_priority import LOOT_PRIORITY_WEIGHTS, parse_priority_weights, load_mplus_compliance, compute_priority_scores, format_priority_list
+from loot_store import store_loot_entries
+from loot_timeseries import refresh_loot_matrix, loot_in_period, loot_in_window
+from tier_sheet import GOOGLE_SHEET_LOCAL_FILE, fetch_tier_data_from_sheet
+from tier_progress import parse_tier_table, refresh_tier_progress, tier_gain, weeks_to_set_bonus, format_tier_display
+
+# gspread is imported lazily inside tier_sheet.fetch_tier_data_from_sheet so runs without
+# GOOGLE_SHEETS_CREDENTIALS never load google-auth and its transport stack.
 
 # --- Configuration ---
 API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
@@ -23,6 +38,9 @@ GOOGLE_SHEET_TIER_PIECES_COLUMN = 23 # Column W (1-indexed)
 # The content of this secret should be the JSON key file for your Google Service Account.
 GOOGLE_SHEETS_CREDENTIALS_JSON = os.getenv('GOOGLE_SHEETS_CREDENTIALS')
 
+# Number of resets covered by the rolling-window loot count shown next to the season total
+RECENT_LOOT_WEEKS = 4
+
 
 # --- Class Emoji/Image Mapping (Copied from your existing script) ---
 CLASS_IMAGE_MAP = {
@@ -65,15 +83,17 @@ THUMBNAIL_STATUS_ICONS = {
 
 
 # --- Function to Send Message to Discord Webhook ---
-def send_discord_webhook(message, webhook_url, embed_title="Loot History Report", embed_color=3447003, thumbnail_url=None):
+def send_discord_webhook(message, webhook_url, embed_title="Loot History Report", embed_color=3447003, thumbnail_url=None, report_key=None):
     """
     Sends a message to a Discord webhook as an embed.
+    With a report_key, the message posted for that key on an earlier run is edited in place.
+    Returns True if Discord accepted the message, False otherwise.
     """
     max_message_length = 4096
 
     if not message:
         print("Error: Discord embed description is empty. Not sending.")
-        return
+        return False
 
     if len(message) > max_message_length:
         print(f"Warning: Discord embed description exceeds {max_message_length} characters. It might be truncated or rejected.")
@@ -97,72 +117,24 @@ def send_discord_webhook(message, webhook_url, embed_title="Loot History Report"
     print(f"DEBUG: JSON Payload (string): {json.dumps(payload, indent=2)}")
 
     try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()
+        deliver_discord_payload(webhook_url, payload, report_key)
         print("Discord webhook message (embed) sent successfully.")
+        return True
     except requests.exceptions.RequestException as e:
         print(f"Error: Failed to send Discord webhook message: {e}")
         if e.response is not None:
             print(f"Discord API Error Message: {e.response.text}")
+        return False
 
 
-# --- Function to Fetch Tier Data from Google Sheet ---
-def fetch_tier_data_from_sheet(sheet_url, worksheet_name, player_col, tier_col, credentials_json):
+# --- Function to Get a Player's Class Display ---
+def class_display_for_player(player):
     """
-    Fetches player names and their tier piece counts from a Google Sheet.
-
-    Args:
-        sheet_url (str): The URL of the Google Sheet.
-        worksheet_name (str): The name of the worksheet (tab).
-        player_col (int): The 1-indexed column number for player names.
-        tier_col (int): The 1-indexed column number for tier pieces (e.g., "4/5").
-        credentials_json (str): JSON string of Google Service Account credentials.
-
-    Returns:
-        dict: A dictionary mapping player names to their tier piece strings (e.g., {"PlayerName": "4/5"}).
-              Returns an empty dict if fetching fails.
+    Returns the class emoji (or abbreviation) for a player dict, preferring the class from discord_id_map.json.
     """
-    tier_data = {}
-    try:
-        # Authenticate with Google Sheets using the service account credentials
-        gc = gspread.service_account_from_dict(json.loads(credentials_json))
-        
-        # Open the spreadsheet by URL
-        sh = gc.open_by_url(sheet_url)
-        
-        # Select the worksheet by name
-        worksheet = sh.worksheet(worksheet_name)
-        
-        # Get all values from the player name column and tier pieces column
-        # Using A1 notation to specify the range for better control and efficiency
-        # Assuming data starts from row 1 (header row) and goes down
-        # To get column A and W, we can fetch a range like A:W or A1:W[last_row]
-        # For simplicity, let's fetch all values and process
-        all_values = worksheet.get_all_values()
-        
-        # Skip header row if present (assuming first row is header)
-        data_rows = all_values[1:] 
-        
-        for row in data_rows:
-            if len(row) >= max(player_col, tier_col): # Ensure row has enough columns
-                player_name = row[player_col - 1].strip() # Adjust to 0-indexed
-                tier_piece_info = row[tier_col - 1].strip() # Adjust to 0-indexed
-                
-                if player_name: # Only add if player name is not empty
-                    tier_data[player_name] = tier_piece_info
-        
-        print(f"Successfully fetched tier data for {len(tier_data)} players from Google Sheet.")
-        return tier_data
-
-    except gspread.exceptions.SpreadsheetNotFound:
-        print(f"Error: Google Spreadsheet not found at URL: {sheet_url}")
-    except gspread.exceptions.WorksheetNotFound:
-        print(f"Error: Worksheet '{worksheet_name}' not found in the spreadsheet.")
-    except json.JSONDecodeError:
-        print("Error: GOOGLE_SHEETS_CREDENTIALS environment variable is not valid JSON.")
-    except Exception as e:
-        print(f"Error fetching data from Google Sheet: {e}")
-    return {} # Return empty dict on failure
+    player_class = DISCORD_ID_MAP.get(player['PlayerName'], {}).get('class', player['Class'])
+    class_info = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])
+    return class_info['emoji'] or class_info['abbr']
 
 
 # --- Main Script Logic ---
@@ -190,7 +162,7 @@ def main():
 
     # Fetch tier data from Google Sheet
     tier_pieces_data = {}
-    if GOOGLE_SHEETS_CREDENTIALS_JSON:
+    if GOOGLE_SHEETS_CREDENTIALS_JSON or GOOGLE_SHEET_LOCAL_FILE:
         tier_pieces_data = fetch_tier_data_from_sheet(
             GOOGLE_SHEET_URL,
             GOOGLE_SHEET_WORKSHEET_NAME,
@@ -203,26 +175,24 @@ def main():
         # --- END DEBUGGING ---
     else:
         print("Warning: GOOGLE_SHEETS_CREDENTIALS environment variable is not set. Skipping Google Sheet data fetch.")
+    tier_table = parse_tier_table(tier_pieces_data) # {name: (current, max)}, parsed once for the whole report
 
 
     # Step 1: Get the current keystone_season_id
+    mark_stage("period")
     print("Fetching current period to get keystone_season_id...")
-    period_api_url = 'https://wowaudit.com/v1/period'
-    headers = {
-        "accept": "application/json",
-        "Authorization": API_AUTHORIZATION_HEADER
-    }
-    
     current_season_id = None
+    current_period = None
+    season_first_period = None
     try:
-        response = requests.get(period_api_url, headers=headers)
-        response.raise_for_status()
-        period_data = response.json()
+        period_data = get_period_data(API_AUTHORIZATION_HEADER)
+        current_period = period_data.get("current_period")
         
         # Extract keystone_season_id from current_season
         current_season = period_data.get("current_season")
         if current_season and current_season.get("keystone_season_id"):
             current_season_id = current_season["keystone_season_id"]
+            season_first_period = current_season.get("first_period_id")
             print(f"Retrieved keystone_season_id: {current_season_id}")
         else:
             raise ValueError("Could not find 'keystone_season_id' in the current_season data.")
@@ -237,20 +207,14 @@ def main():
         exit(1)
 
     # Step 2: Get all characters to map IDs to names and classes
+    mark_stage("characters")
     print("Fetching all characters for name and class mapping...")
-    characters_api_url = 'https://wowaudit.com/v1/characters'
     character_map = {} # Maps character_id to {"name": "CharName", "class": "Class"}
     try:
-        response = requests.get(characters_api_url, headers=headers)
-        response.raise_for_status()
-        api_characters_data = response.json()
-        print(f"Successfully fetched {len(api_characters_data)} characters.")
-        for char_data in api_characters_data:
-            char_id = char_data.get('id')
-            char_name = char_data.get('name')
-            char_class = char_data.get('class')
-            if char_id and char_name:
-                character_map[char_id] = {"name": char_name, "class": char_class}
+        api_characters = decode_characters(fetch_wowaudit('/characters', API_AUTHORIZATION_HEADER))
+        print(f"Successfully fetched {len(api_characters)} characters.")
+        for character in api_characters:
+            character_map[character.id] = {"name": character.name, "class": character.character_class}
     except requests.exceptions.RequestException as e:
         print(f"Error: An error occurred while fetching characters data: {e}")
         if e.response is not None:
@@ -258,48 +222,44 @@ def main():
         exit(1)
 
     # Step 3: Get Loot History for the current season
+    mark_stage("loot history")
     print(f"Fetching loot history for season ID: {current_season_id}...")
-    loot_history_url = f"https://wowaudit.com/v1/loot_history/{current_season_id}"
     loot_counts = {} # Maps character_id to loot count
+    loot_cursor = 0 # Highest loot history item id seen, part of the report fingerprint
+    loot_matrix = None # Character x period loot counts, see loot_timeseries.py
 
     try:
-        response = requests.get(loot_history_url, headers=headers)
-        response.raise_for_status()
-        raw_loot_history_response = response.json() # Get the full JSON response
+        # Decode the loot entries from the 'history_items' key into LootEntry records
+        loot_entries = decode_loot_history(fetch_wowaudit(f"/loot_history/{current_season_id}", API_AUTHORIZATION_HEADER))
         
-        # --- DEBUGGING: Print raw loot_history_response ---
-        # print(f"DEBUG: Raw loot_history_response (full): {json.dumps(raw_loot_history_response, indent=2)}")
-        # --- END DEBUGGING ---
-
-        # Access the loot entries from the 'history_items' key
-        loot_history_data = raw_loot_history_response.get('history_items', []) 
-        
-        print(f"Successfully fetched {len(loot_history_data)} loot entries (from 'history_items' key).")
+        print(f"Successfully fetched {len(loot_entries)} loot entries (from 'history_items' key).")
 
         # Define excluded response types (added "transmog" for robustness)
         EXCLUDED_RESPONSE_TYPES = ["tmog", "transmorg", "transmog"]
         
-        for loot_entry in loot_history_data:
-            # Check if loot_entry is a dictionary before trying to use .get()
-            if isinstance(loot_entry, dict):
-                response_type_name = loot_entry.get('response_type', {}).get('name')
-                is_discarded = loot_entry.get('discarded', False) # Default to False if 'discarded' is missing
-                
-                # Only count if response_type_name is NOT in the excluded list AND item is NOT discarded
-                if (response_type_name and response_type_name.lower() not in EXCLUDED_RESPONSE_TYPES) and not is_discarded:
-                    recipient_id = loot_entry.get('character_id') # Loot history uses 'character_id' for recipient
-                    if recipient_id:
-                        loot_counts[recipient_id] = loot_counts.get(recipient_id, 0) + 1
-                else:
-                    reason = []
-                    if response_type_name and response_type_name.lower() in EXCLUDED_RESPONSE_TYPES:
-                        reason.append(f"excluded response type '{response_type_name}'")
-                    if is_discarded:
-                        reason.append("item was discarded")
-                    print(f"DEBUG: Skipping loot entry for item '{loot_entry.get('name')}' (ID: {loot_entry.get('id')}) because: {', '.join(reason)}")
+        for loot_entry in loot_entries:
+            if isinstance(loot_entry.id, int):
+                loot_cursor = max(loot_cursor, loot_entry.id)
+            response_type_name = loot_entry.response_type
+            
+            # Only count if response_type_name is NOT in the excluded list AND item is NOT discarded
+            if (response_type_name and response_type_name.lower() not in EXCLUDED_RESPONSE_TYPES) and not loot_entry.discarded:
+                if loot_entry.character_id:
+                    loot_counts[loot_entry.character_id] = loot_counts.get(loot_entry.character_id, 0) + 1
             else:
-                print(f"Warning: Unexpected loot entry format encountered. Expected dict, got {type(loot_entry)}: {loot_entry}")
+                reason = []
+                if response_type_name and response_type_name.lower() in EXCLUDED_RESPONSE_TYPES:
+                    reason.append(f"excluded response type '{response_type_name}'")
+                if loot_entry.discarded:
+                    reason.append("item was discarded")
+                print(f"DEBUG: Skipping loot entry for item '{loot_entry.name}' (ID: {loot_entry.id}) because: {', '.join(reason)}")
 
+        # Bucket new loot into the per-period matrix for the weekly and rolling-window views
+        if current_period is not None:
+            loot_matrix = refresh_loot_matrix(current_season_id, season_first_period, current_period, loot_entries, EXCLUDED_RESPONSE_TYPES)
+
+        # Keep a local, indexed copy of the history for query_loot.py
+        store_loot_entries(current_season_id, loot_entries, character_map, EXCLUDED_RESPONSE_TYPES)
 
     except requests.exceptions.RequestException as e:
         print(f"Error: An error occurred while fetching loot history: {e}")
@@ -307,12 +267,18 @@ def main():
             print(f"Response Content: {e.response.text}")
         exit(1)
 
+    # Store this period's tier snapshot; weekly gains and time-to-set come from the stored snapshots
+    tier_progress = refresh_tier_progress(current_season_id, season_first_period, current_period, tier_table) if current_period is not None else None
+
     # Step 4: Prepare Report Data
+    mark_stage("report data")
     player_loot_data = []
     for char_id, char_info in character_map.items():
         player_name = char_info["name"]
         player_class = char_info["class"]
         loot_count = loot_counts.get(char_id, 0)
+        week_loot_count = loot_in_period(loot_matrix, char_id, current_period) if loot_matrix else 0
+        recent_loot_count = loot_in_window(loot_matrix, char_id, current_period, RECENT_LOOT_WEEKS) if loot_matrix else 0
         
         # Get tier piece info from Google Sheet data
         tier_pieces_info = tier_pieces_data.get(player_name, "N/A") # Default to "N/A" if not found
@@ -321,20 +287,37 @@ def main():
             "PlayerName": player_name,
             "Class": player_class,
             "LootCount": loot_count,
-            "TierPieces": tier_pieces_info # Add tier pieces info
+            "WeekLootCount": week_loot_count, # Loot in the running period
+            "RecentLootCount": recent_loot_count, # Loot over the last RECENT_LOOT_WEEKS resets
+            "TierPieces": tier_pieces_info, # Add tier pieces info
+            "Tier": tier_table.get(player_name), # (current, max) or None
+            "TierGain": tier_gain(tier_progress, player_name, current_period),
+            "SetBonusWeek": weeks_to_set_bonus(tier_progress, player_name),
         })
 
+    # Priority index from loot counts, tier progress and stored M+ compliance (no extra API calls)
+    ranked_players = compute_priority_scores(player_loot_data, load_mplus_compliance(current_season_id), parse_priority_weights(LOOT_PRIORITY_WEIGHTS))
+
     # Sort players by loot count ascending
     player_loot_data.sort(key=lambda x: x['LootCount'])
+    record_zero_loot_players(player_loot_data)
 
     print("\n--- Loot Report Data ---")
     if player_loot_data:
         for player in player_loot_data:
-            print(f"Player: {player['PlayerName']} (Class: {player['Class']}) - Loot: {player['LootCount']} (Tier: {player['TierPieces']})")
+            print(f"Player: {player['PlayerName']} (Class: {player['Class']}) - Loot: {player['LootCount']} (Tier: {player['TierPieces']}) - Priority: {player['Priority']}")
     else:
         print("No player loot data found for this season.")
 
+    # Skip rendering and posting when nothing changed since the last delivered report
+    report_key = f"loot:{current_season_id}"
+    input_fingerprint = compute_fingerprint(loot_cursor, player_loot_data, DISCORD_ID_MAP)
+    if fingerprint_unchanged(report_key, "inputs", input_fingerprint):
+        print(f"Report inputs unchanged since the last delivered '{report_key}' report. Skipping render and post (set FORCE_REPORT=true to override).")
+        return
+
     # Step 5: Construct and Send Discord Embed
+    mark_stage("render and send")
     embed_description = f"Lootfordeling for sæson {current_season_id} (sorteret efter færrest items):\n\n"
     embed_title = f"Loot Rapport: Sæson {current_season_id}"
     embed_color = 3447003 # Default Discord blue
@@ -347,37 +330,17 @@ def main():
             loot_count = player['LootCount']
             tier_pieces = player['TierPieces'] # Get tier pieces info
             
-            # Determine tier emoji and format the tier string
-            formatted_tier_display = ""
-            if tier_pieces != "N/A" and '/' in tier_pieces:
-                try:
-                    current_tier_str, max_tier_str = tier_pieces.split('/')
-                    current_tier = int(current_tier_str)
-                    max_tier = int(max_tier_str) # Get max tier number
-
-                    # Get the emoji for current_tier, fallback to string if not found
-                    current_tier_emoji = TIER_EMOJI_MAP.get(current_tier, current_tier_str)
-                    
-                    # Get the emoji for max_tier, fallback to string if not found
-                    # Assuming max_tier will usually be 5, so using TIER_EMOJI_MAP.get(5)
-                    max_tier_emoji = TIER_EMOJI_MAP.get(max_tier, max_tier_str)
-                    
-                    formatted_tier_display = f"(Tier: {current_tier_emoji} / {max_tier_emoji})"
-                except ValueError:
-                    formatted_tier_display = f"(Tier: {TIER_EMOJI_FALLBACK} {tier_pieces})" # Fallback if parsing fails
-            else:
-                formatted_tier_display = f"(Tier: {TIER_EMOJI_FALLBACK} {tier_pieces})" # Default for N/A or invalid format
+            formatted_tier_display = format_tier_display(player['Tier'], tier_pieces, TIER_EMOJI_MAP, TIER_EMOJI_FALLBACK,
+                                                         player['TierGain'], player['SetBonusWeek'], "denne uge")
             
             # Get class display (emoji or abbr)
-            player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-            player_class = player_data_from_map.get('class', player['Class']) # Use class from character_map if not in discord_id_map
-            
-            class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
-            if not class_display:
-                class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
+            class_display = class_display_for_player(player)
             
             # Format the player line with class emoji/abbr, loot count, and colored tier pieces
-            embed_description += f"{class_display} {player_name} - {loot_count} items {formatted_tier_display}\n"
+            embed_description += (f"{class_display} {player_name} - {loot_count} items "
+                                  f"({player['WeekLootCount']} denne uge, {player['RecentLootCount']} på {RECENT_LOOT_WEEKS} uger) {formatted_tier_display}\n")
+
+        embed_description += "\n" + format_priority_list(ranked_players, class_display_for_player)
         
         # Set embed color based on some criteria if desired, e.g., if someone has 0 loot
         if any(p['LootCount'] == 0 for p in player_loot_data):
@@ -389,8 +352,16 @@ def main():
         embed_thumbnail_url = THUMBNAIL_STATUS_ICONS['no_loot']
         embed_color = 808080 # Grey color for no data
 
-    send_discord_webhook(embed_description, DISCORD_WEBHOOK_URL, embed_title, embed_color, thumbnail_url=embed_thumbnail_url)
+    output_fingerprint = compute_fingerprint(embed_title, embed_description, embed_color, embed_thumbnail_url)
+    if fingerprint_unchanged(report_key, "output", output_fingerprint):
+        print(f"Rendered '{report_key}' report is identical to the last delivered one. Skipping post.")
+        store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+    elif send_discord_webhook(embed_description, DISCORD_WEBHOOK_URL, embed_title, embed_color, thumbnail_url=embed_thumbnail_url,
+                              report_key=report_key):
+        store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+    else:
+        exit(1) # Fail the job, so a re-run can pick up from the run checkpoint with --resume
 
 
 if __name__ == "__main__":
-    main()
+    run_entry_point(main, "check_loot_history")
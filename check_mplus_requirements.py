@@ -2,6 +2,18 @@ import requests
 import json
 from datetime import datetime
 import os # Import the os module to access environment variables
+import time
+
+from discord_delivery import deliver_discord_payload
+from discord_id_map import update_discord_id_map_file
+from report_profiling import mark_stage, run_entry_point
+from run_budget import start_run_budget
+from run_checkpoint import finish_resume
+from run_metrics import record_vault_compliance
+from report_state import load_state, save_state, compute_fingerprint, fingerprint_unchanged, store_fingerprints
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_historical_data
 
 # --- Configuration ---
 # Your WoW Audit API Authorization header
@@ -33,6 +45,19 @@ USE_PREVIOUS_PERIOD_ENV = os.getenv('USE_PREVIOUS_PERIOD', 'false').lower() == '
 # Set in GitHub Actions workflow to 'current' or 'previous'.
 PERIOD_TYPE = os.getenv('PERIOD_TYPE', 'current').lower() # Default to 'current'
 
+# --- Watch Mode Configuration ---
+# If 'true', the script polls the current period and only posts vault status transitions
+# (newly completed, newly one slot short, new roster members) since the last stored snapshot.
+WATCH_MODE = os.getenv('WATCH_MODE', 'false').lower() == 'true'
+# Minutes between polls. 0 means poll once and exit (use this when a cron schedule drives the runs).
+WATCH_INTERVAL_MINUTES = int(os.getenv('WATCH_INTERVAL_MINUTES', '0'))
+WATCH_SNAPSHOT_STATE = 'mplus_watch_snapshot' # State file holding the last seen status per character
+
+# --- Vault Status Values ---
+VAULT_STATUS_COMPLETE = "Klaret"
+VAULT_STATUS_MISSING_ONE = "Mangler 1 vault slot"
+VAULT_STATUS_MISSING_TWO = "Mangler 2 vault slots"
+
 # --- Class Emoji/Image Mapping ---
 # Map WoW class names to a dictionary containing:
 # 'emoji': The custom Discord emoji string (e.g., "<:paladin:123456789012345678>")
@@ -65,7 +90,7 @@ THUMBNAIL_STATUS_ICONS = {
 
 
 # --- Function to Send Message to Discord Webhook ---
-def send_discord_webhook(message, webhook_url, embed_title="M+ Requirement Update", embed_color=3447003, thumbnail_url=None):
+def send_discord_webhook(message, webhook_url, embed_title="M+ Requirement Update", embed_color=3447003, thumbnail_url=None, report_key=None):
     """
     Sends a message to a Discord webhook as an embed.
 
@@ -75,12 +100,17 @@ def send_discord_webhook(message, webhook_url, embed_title="M+ Requirement Updat
         embed_title (str): The title of the Discord embed.
         embed_color (int): The decimal color code for the embed sidebar.
         thumbnail_url (str, optional): URL for the embed's thumbnail image.
+        report_key (str, optional): Report type + period (e.g., "mplus_current:1021"). When given, the
+            message posted for this key on an earlier run is edited in place instead of reposting.
+
+    Returns:
+        bool: True if Discord accepted the message, False otherwise.
     """
     max_message_length = 4096  # Discord embed description limit
 
     if not message:
         print("Error: Discord embed description is empty. Not sending.")
-        return
+        return False
 
     if len(message) > max_message_length:
         print(f"Warning: Discord embed description exceeds {max_message_length} characters. It might be truncated or rejected.")
@@ -108,106 +138,167 @@ def send_discord_webhook(message, webhook_url, embed_title="M+ Requirement Updat
     print(f"DEBUG: JSON Payload (string): {json.dumps(payload, indent=2)}")
 
     try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+        deliver_discord_payload(webhook_url, payload, report_key)
         print("Discord webhook message (embed) sent successfully.")
+        return True
     except requests.exceptions.RequestException as e:
         print(f"Error: Failed to send Discord webhook message: {e}")
         if e.response is not None:
             print(f"Discord API Error Message: {e.response.text}")
         # In a GitHub Action, you might want to exit with a non-zero code here
         # sys.exit(1)
+        return False
 
-# --- Function to Update Discord ID Mapping File ---
-def update_discord_id_map_file(api_auth_header, map_file_path):
+# --- Function to Evaluate a Character's Dungeon Vault Status ---
+def evaluate_dungeon_vault_status(snapshot):
     """
-    Fetches character names and classes from WoW Audit API and updates the Discord ID map file.
-    New characters are added with a null Discord ID and their class.
-    Existing entries are updated with class info if missing or different, and converted to new format if old.
+    Determines the dungeon vault status of one character from its VaultSnapshot.
+
+    Returns:
+        str: VAULT_STATUS_COMPLETE if option_1 and option_2 both meet REQUIRED_DUNGEON_OPTION_VALUE,
+             VAULT_STATUS_MISSING_ONE if only option_1 does, otherwise VAULT_STATUS_MISSING_TWO.
     """
-    print(f"Attempting to update Discord ID map file: {map_file_path}")
-    characters_api_url = 'https://wowaudit.com/v1/characters'
-    headers = {
-        "accept": "application/json",
-        "Authorization": api_auth_header
-    }
+    if snapshot.option_1 == REQUIRED_DUNGEON_OPTION_VALUE and snapshot.option_2 == REQUIRED_DUNGEON_OPTION_VALUE:
+        return VAULT_STATUS_COMPLETE
 
-    try:
-        response = requests.get(characters_api_url, headers=headers)
-        response.raise_for_status()
-        api_characters_data = response.json()
-        print(f"Successfully fetched {len(api_characters_data)} characters from WoW Audit API.")
-
-        # Load existing map
-        existing_map = {}
-        if os.path.exists(map_file_path):
-            with open(map_file_path, 'r', encoding='utf-8') as f:
-                try:
-                    existing_map = json.load(f)
-                    print(f"Loaded existing Discord ID map with {len(existing_map)} entries.")
-                except json.JSONDecodeError:
-                    print(f"Warning: '{map_file_path}' is not a valid JSON file. Starting with an empty map.")
-                    existing_map = {}
-        else:
-            print(f"'{map_file_path}' not found. A new map will be created.")
+    if snapshot.option_1 == REQUIRED_DUNGEON_OPTION_VALUE:
+        # Option 1 is met, but option 2 is not (or is None)
+        return VAULT_STATUS_MISSING_ONE
+    # Neither option 1 nor option 2 is met (or dungeons object missing/options are None)
+    return VAULT_STATUS_MISSING_TWO
 
-        updated_map = existing_map.copy()
-        changes_made = False
 
-        # Iterate through characters from API and update the map
-        for char_data in api_characters_data:
-            char_name = char_data.get('name')
-            char_class = char_data.get('class') # Get the class from the API response
+# --- Function to Diff Vault Statuses Between Two Polls ---
+def diff_vault_statuses(previous_statuses, current_statuses):
+    """
+    Compares two {character_name: vault_status} snapshots.
 
-            if not char_name:
-                continue # Skip if no name
+    Returns:
+        tuple: (newly_completed, newly_one_slot_short, new_members) where the first two are lists of
+               names and new_members is a list of (name, status) tuples for characters not seen before.
+    """
+    newly_completed = []
+    newly_one_slot_short = []
+    new_members = []
+
+    for name, status in current_statuses.items():
+        previous_status = previous_statuses.get(name)
+        if previous_status is None:
+            new_members.append((name, status))
+        elif status == previous_status:
+            continue
+        elif status == VAULT_STATUS_COMPLETE:
+            newly_completed.append(name)
+        elif status == VAULT_STATUS_MISSING_ONE and previous_status == VAULT_STATUS_MISSING_TWO:
+            newly_one_slot_short.append(name)
+
+    return newly_completed, newly_one_slot_short, new_members
+
+
+# --- Function to Format a Player Line for the Embed ---
+def format_player_line(player_name, tag_player):
+    """
+    Returns "<class emoji> <name or @mention>" for one player, using DISCORD_ID_MAP for class and tag.
+    """
+    player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
+    player_class = player_data_from_map.get('class', 'Unknown')
+    class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
+    if not class_display:
+        class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
+    discord_id = player_data_from_map.get('discord_id')
 
-            if char_name not in updated_map:
-                # New character: add with null discord_id and fetched class
-                updated_map[char_name] = {"discord_id": None, "class": char_class}
-                print(f"Added new character '{char_name}' (Class: {char_class}) to map.")
-                changes_made = True
-            else:
-                # Existing character: check format and update class if needed
-                current_entry = updated_map[char_name]
-                if isinstance(current_entry, str):
-                    # Old format (just Discord ID string), convert to new dict format
-                    updated_map[char_name] = {"discord_id": current_entry, "class": char_class}
-                    print(f"Converted '{char_name}' to new map format, added Class: {char_class}.")
-                    changes_made = True
-                elif isinstance(current_entry, dict):
-                    # New format, check if class needs update
-                    if current_entry.get("class") != char_class:
-                        updated_map[char_name]["class"] = char_class
-                        print(f"Updated class for '{char_name}' to: {char_class}.")
-                        changes_made = True
-                    # If discord_id is missing but class is present, ensure discord_id is None
-                    if "discord_id" not in current_entry:
-                        updated_map[char_name]["discord_id"] = None
-                        changes_made = True
-                else:
-                    print(f"Warning: Unexpected format for '{char_name}' in map. Skipping class update.")
+    if tag_player and discord_id is not None:
+        return f"{class_display} <@{discord_id}>"
+    return f"{class_display} {player_name}"
 
 
-        if changes_made:
-            # Write the updated map back to the file
-            with open(map_file_path, 'w', encoding='utf-8') as f:
-                json.dump(updated_map, f, indent=2, ensure_ascii=False)
-            print(f"Discord ID map '{map_file_path}' updated successfully.")
-            print("Remember to manually update the 'discord_id' for new/updated entries in this file.")
-            return True # Indicate that the map was updated
-        else:
-            print("No changes needed for the Discord ID map.")
-            return False # Indicate no update was needed
+# --- Function to Run One Watch Poll ---
+def watch_current_period_once(api_auth_header, webhook_url):
+    """
+    Polls /v1/historical_data for the current period, diffs every character's vault status against the
+    stored snapshot and posts only the transitions. The snapshot is saved after a successful post.
+
+    When the period changed since the last snapshot, every known character is treated as starting the
+    new week with 2 missing slots, so progress made before the first poll of the week is still reported.
+    """
+    try:
+        current_period = get_period_data(api_auth_header).get("current_period")
+        if current_period is None:
+            print("Error: Could not find 'current_period' in the /v1/period response. Skipping this poll.")
+            return
 
+        snapshots = decode_historical_data(fetch_wowaudit(f"/historical_data?period={current_period}", api_auth_header))
     except requests.exceptions.RequestException as e:
-        print(f"Error: Failed to fetch characters from WoW Audit API for map update: {e}")
+        print(f"Error: Watch poll failed: {e}")
         if e.response is not None:
             print(f"Response Content: {e.response.text}")
-        return False
-    except Exception as e:
-        print(f"Error: An unexpected error occurred during map update: {e}")
-        return False
+        return
+
+    current_statuses = {}
+    for snapshot in snapshots:
+        if snapshot.name:
+            current_statuses[snapshot.name] = evaluate_dungeon_vault_status(snapshot)
+
+    snapshot = load_state(WATCH_SNAPSHOT_STATE)
+    if snapshot is None:
+        print(f"No watch snapshot found. Storing baseline for period {current_period} with {len(current_statuses)} characters; nothing to post.")
+        save_state(WATCH_SNAPSHOT_STATE, {"period": current_period, "statuses": current_statuses})
+        return
+
+    previous_statuses = snapshot.get("statuses", {})
+    if snapshot.get("period") != current_period:
+        print(f"Period changed from {snapshot.get('period')} to {current_period}. Vault progress starts over.")
+        previous_statuses = {name: VAULT_STATUS_MISSING_TWO for name in previous_statuses}
+
+    newly_completed, newly_one_slot_short, new_members = diff_vault_statuses(previous_statuses, current_statuses)
+    print(f"DEBUG: Watch diff for period {current_period}: {len(newly_completed)} newly completed, "
+          f"{len(newly_one_slot_short)} newly one slot short, {len(new_members)} new members.")
+
+    if not (newly_completed or newly_one_slot_short or new_members):
+        print("No vault status transitions since the last poll. Nothing to post.")
+        save_state(WATCH_SNAPSHOT_STATE, {"period": current_period, "statuses": current_statuses})
+        return
+
+    embed_description = ""
+    if newly_completed:
+        embed_description += ":white_check_mark: **Har nu klaret deres m+ requirement:**\n"
+        for player_name in newly_completed:
+            embed_description += format_player_line(player_name, tag_player=False) + "\n"
+    if newly_one_slot_short:
+        if embed_description:
+            embed_description += "\n"
+        # Tagged once, on the transition itself; later polls do not ping again.
+        embed_description += ":yellow_circle: **Mangler nu kun 1 vault slot:**\n"
+        for player_name in newly_one_slot_short:
+            embed_description += format_player_line(player_name, tag_player=True) + "\n"
+    if new_members:
+        if embed_description:
+            embed_description += "\n"
+        embed_description += ":new: **Nye spillere på holdet:**\n"
+        for player_name, status in new_members:
+            embed_description += f"{format_player_line(player_name, tag_player=False)} - {status}\n"
+
+    embed_color = 3066993 if newly_completed else 3447003 # Green when someone finished, blue otherwise
+    if send_discord_webhook(embed_description, webhook_url, "M+ Fremskridt", embed_color, thumbnail_url=THUMBNAIL_STATUS_ICONS['incomplete']):
+        save_state(WATCH_SNAPSHOT_STATE, {"period": current_period, "statuses": current_statuses})
+    else:
+        print("Warning: Watch update was not delivered. Snapshot left unchanged so the transitions are retried next poll.")
+
+
+# --- Function to Run Watch Mode ---
+def run_watch_mode(api_auth_header, webhook_url):
+    """
+    Runs watch polls every WATCH_INTERVAL_MINUTES, or a single poll when the interval is 0.
+    """
+    while True:
+        start_run_budget() # Each poll gets the full run deadline
+        watch_current_period_once(api_auth_header, webhook_url)
+        finish_resume() # Only the first poll of a resumed run reads the checkpoints
+        if WATCH_INTERVAL_MINUTES <= 0:
+            break
+        print(f"Next watch poll in {WATCH_INTERVAL_MINUTES} minutes.")
+        time.sleep(WATCH_INTERVAL_MINUTES * 60)
+
 
 # --- Main Script Logic ---
 def main():
@@ -225,7 +316,7 @@ def main():
 
     # Load Discord ID mapping if it's the current period report
     # And attempt to update the map file if it's the current period check
-    if PERIOD_TYPE == 'current':
+    if PERIOD_TYPE == 'current' and not WATCH_MODE:
         map_updated = update_discord_id_map_file(API_AUTHORIZATION_HEADER, DISCORD_ID_MAP_FILE)
         
         try:
@@ -250,25 +341,23 @@ def main():
         except Exception as e:
             print(f"Warning: An unexpected error occurred while loading Discord ID map: {e}. Players will not be tagged.")
 
+    if WATCH_MODE:
+        run_watch_mode(API_AUTHORIZATION_HEADER, DISCORD_WEBHOOK_URL)
+        return
 
     period_to_use = None
 
     # Step 1: Determine the period to use
+    mark_stage("period")
     if TEST_PERIOD is not None:
         period_to_use = TEST_PERIOD
         print(f"Using specified test period: {period_to_use}")
     else:
         print("Fetching current period from API...")
         period_api_url = 'https://wowaudit.com/v1/period'
-        headers = {
-            "accept": "application/json",
-            "Authorization": API_AUTHORIZATION_HEADER
-        }
 
         try:
-            response = requests.get(period_api_url, headers=headers)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            period_data = response.json()
+            period_data = get_period_data(API_AUTHORIZATION_HEADER) # Raises on HTTP errors
 
             current_period_from_api = period_data.get("current_period")
 
@@ -292,64 +381,35 @@ def main():
             exit(1) # Exit the script on critical error
 
     # Step 2: Use the determined period to get historical data
+    mark_stage("historical data")
     print(f"Fetching historical data for period: {period_to_use}")
-    historical_data_url = f"https://wowaudit.com/v1/historical_data?period={period_to_use}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": API_AUTHORIZATION_HEADER
-    }
 
     try:
-        response = requests.get(historical_data_url, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        historical_data_response = response.json()
+        snapshots = decode_historical_data(fetch_wowaudit(f"/historical_data?period={period_to_use}", API_AUTHORIZATION_HEADER)) # Raises on HTTP errors
 
         print("API Call for Historical Data Successful!")
-        # print(f"--- Historical Data Response ---\n{json.dumps(historical_data_response, indent=2)}") # Uncomment for full raw response
+        # print(f"--- Historical Data Response ---\n{snapshots}") # Uncomment for full decoded response
 
         # Step 3: Filter the historical data based on vault_options
         print("\n--- Filtering Data ---")
         players_to_report = []
 
-        # Access the array of data items from the 'characters' property.
-        data_items = historical_data_response.get("characters", [])
-
-        print(f"DEBUG: Processed {len(data_items)} total player items.")
-
-        for item in data_items:
-            name = item.get("name")
-            dungeon_vault_option = None
-
-            # Check if 'data', 'vault_options', and 'dungeons' exist
-            if item.get("data") and item["data"].get("vault_options") and item["data"]["vault_options"].get("dungeons"):
-                dungeon_vault_option = item["data"]["vault_options"]["dungeons"]
+        print(f"DEBUG: Processed {len(snapshots)} total player items.")
 
-            report_player = True
-            status_details = None
+        for snapshot in snapshots:
+            name = snapshot.name
+            status_details = evaluate_dungeon_vault_status(snapshot)
 
-            # Determine if the player needs to be reported and their status
-            if dungeon_vault_option and \
-               dungeon_vault_option.get("option_1") == REQUIRED_DUNGEON_OPTION_VALUE and \
-               dungeon_vault_option.get("option_2") == REQUIRED_DUNGEON_OPTION_VALUE:
-                # Player met the full requirement, do not report
-                report_player = False
-            else:
-                # Player did NOT meet the full requirement, report them
-                report_player = True
-
-                if dungeon_vault_option and dungeon_vault_option.get("option_1") == REQUIRED_DUNGEON_OPTION_VALUE:
-                    # Option 1 is met, but option 2 is not (or is None)
-                    status_details = "Mangler 1 vault slot"
-                else:
-                    # Neither option 1 nor option 2 is met (or dungeons object missing/options are None)
-                    status_details = "Mangler 2 vault slots"
-
-            if report_player:
+            # Player did NOT meet the full requirement, report them
+            if status_details != VAULT_STATUS_COMPLETE:
                 players_to_report.append({
                     "PlayerName": name,
                     "DungeonVaultStatus": status_details
                 })
 
+        record_vault_compliance(PERIOD_TYPE, len(snapshots),
+                                sum(1 for p in players_to_report if p['DungeonVaultStatus'] == VAULT_STATUS_MISSING_ONE),
+                                sum(1 for p in players_to_report if p['DungeonVaultStatus'] == VAULT_STATUS_MISSING_TWO))
         print(f"DEBUG: Found {len(players_to_report)} players who do NOT have 'dungeons' vault option_1 and option_2 both set to {REQUIRED_DUNGEON_OPTION_VALUE}.")
 
         print(f"\nPlayers who do NOT have 'dungeons' vault option_1 and option_2 both set to {REQUIRED_DUNGEON_OPTION_VALUE} (Console Output):")
@@ -364,7 +424,15 @@ def main():
         else:
             print(f"All players in the data have at least one 'dungeons' vault option with both option_1 and option_2 set to {REQUIRED_DUNGEON_OPTION_VALUE}, or no data was processed.")
 
+        # Skip rendering and posting when nothing changed since the last delivered report
+        report_key = f"mplus_{PERIOD_TYPE}:{period_to_use}"
+        input_fingerprint = compute_fingerprint(REQUIRED_DUNGEON_OPTION_VALUE, players_to_report, DISCORD_ID_MAP)
+        if fingerprint_unchanged(report_key, "inputs", input_fingerprint):
+            print(f"Report inputs unchanged since the last delivered '{report_key}' report. Skipping render and post (set FORCE_REPORT=true to override).")
+            return
+
         # Step 4: Prepare and Send Discord Webhook Message (as an Embed)
+        mark_stage("render and send")
         if DISCORD_WEBHOOK_URL: # Check if it's not empty/None
             # Customize embed title and initial description based on PERIOD_TYPE
             if PERIOD_TYPE == 'previous':
@@ -390,25 +458,15 @@ def main():
 
             if players_to_report:
                 # Separate players by slot requirement
-                players_two_slots = [p for p in players_to_report if p['DungeonVaultStatus'] == "Mangler 2 vault slots"]
-                players_one_slot = [p for p in players_to_report if p['DungeonVaultStatus'] == "Mangler 1 vault slot"]
+                players_two_slots = [p for p in players_to_report if p['DungeonVaultStatus'] == VAULT_STATUS_MISSING_TWO]
+                players_one_slot = [p for p in players_to_report if p['DungeonVaultStatus'] == VAULT_STATUS_MISSING_ONE]
 
                 # Add players needing 2 slots
                 if players_two_slots:
                     embed_description += ":red_circle: **Mangler 2 vault slots:**\n\n" # Red circle with bold text and extra newline
                     for player in players_two_slots:
-                        player_name = player['PlayerName']
-                        player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-                        player_class = player_data_from_map.get('class', 'Unknown')
-                        class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
-                        if not class_display:
-                            class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
-                        discord_id = player_data_from_map.get('discord_id')
-
-                        if PERIOD_TYPE == 'current' and discord_id is not None:
-                            embed_description += f"{class_display} <@{discord_id}>\n" # Only emoji and tag
-                        else:
-                            embed_description += f"{class_display} {player_name}\n" # Only emoji and name
+                        # Only emoji and tag for the current period, emoji and name otherwise
+                        embed_description += format_player_line(player['PlayerName'], tag_player=PERIOD_TYPE == 'current') + "\n"
                 
                 # Add separator and players needing 1 slot
                 if players_one_slot:
@@ -417,18 +475,7 @@ def main():
                         embed_description += "\n"
                     embed_description += ":yellow_circle: **Mangler kun 1 vault slot:**\n\n" # Separator with emoji and extra newline
                     for player in players_one_slot:
-                        player_name = player['PlayerName']
-                        player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-                        player_class = player_data_from_map.get('class', 'Unknown')
-                        class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
-                        if not class_display:
-                            class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
-                        discord_id = player_data_from_map.get('discord_id')
-
-                        if PERIOD_TYPE == 'current' and discord_id is not None:
-                            embed_description += f"{class_display} <@{discord_id}>\n" # Only emoji and tag
-                        else:
-                            embed_description += f"{class_display} {player_name}\n" # Only emoji and name
+                        embed_description += format_player_line(player['PlayerName'], tag_player=PERIOD_TYPE == 'current') + "\n"
                         
                 embed_color = 15548997 # Red color (decimal) for incomplete
             else:
@@ -440,7 +487,15 @@ def main():
                 # Thumbnail is already set to 'complete' icon above
 
 
-            send_discord_webhook(embed_description, DISCORD_WEBHOOK_URL, embed_title, embed_color, thumbnail_url=embed_thumbnail_url)
+            output_fingerprint = compute_fingerprint(embed_title, embed_description, embed_color, embed_thumbnail_url)
+            if fingerprint_unchanged(report_key, "output", output_fingerprint):
+                print(f"Rendered '{report_key}' report is identical to the last delivered one. Skipping post.")
+                store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+            elif send_discord_webhook(embed_description, DISCORD_WEBHOOK_URL, embed_title, embed_color, thumbnail_url=embed_thumbnail_url,
+                                      report_key=report_key):
+                store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+            else:
+                exit(1) # Fail the job, so a re-run can pick up from the run checkpoint with --resume
         else:
             print("Warning: Discord webhook URL is not configured. Skipping Discord notification.")
 
@@ -451,4 +506,4 @@ def main():
         exit(1) # Exit the script on critical error
 
 if __name__ == "__main__":
-    main()
+    run_entry_point(main, "check_mplus_requirements")
@@ -0,0 +1,99 @@
+import subprocess
+import sys
+import os
+import statistics
+
+# --- Configuration ---
+# Import-time budget per report script, in milliseconds. Measured with `python -X importtime`,
+# which reports the cumulative time spent importing the module and everything it imports.
+# The M+ script only needs `requests`; the sheet-aware scripts must not pay for gspread/google-auth
+# at startup since those are imported lazily when GOOGLE_SHEETS_CREDENTIALS is set.
+STARTUP_BUDGET_MS = {
+    "check_mplus_requirements": float(os.getenv('STARTUP_BUDGET_MPLUS_MS', '250')),
+    "check_loot_history": float(os.getenv('STARTUP_BUDGET_LOOT_MS', '300')),
+    "combined_report": float(os.getenv('STARTUP_BUDGET_COMBINED_MS', '300')),
+}
+
+# Modules that must never be imported just by loading a report script.
+FORBIDDEN_STARTUP_IMPORTS = ["gspread", "google.auth", "google.oauth2", "googleapiclient"]
+
+# Number of fresh interpreter runs per script; the median is compared against the budget
+# to keep a single slow CI runner tick from failing the check.
+STARTUP_SAMPLE_RUNS = int(os.getenv('STARTUP_SAMPLE_RUNS', '5'))
+
+
+# --- Function to Measure Import Time ---
+def measure_import_time(module_name):
+    """
+    Imports a module in a fresh interpreter with `-X importtime` and parses the report.
+
+    Args:
+        module_name (str): The module to import (e.g., "check_mplus_requirements").
+
+    Returns:
+        tuple: (cumulative import time of the module in ms, set of all imported module names).
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    # Clear the report secrets so we measure the cold path a run without credentials takes.
+    env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_SHEETS_CREDENTIALS", "WOWAUDIT_API_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=script_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing '{module_name}' failed:\n{result.stderr}")
+
+    cumulative_us = None
+    imported_modules = set()
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue # Header line
+        name = parts[2].strip()
+        imported_modules.add(name)
+        if name == module_name:
+            cumulative_us = int(parts[1].strip())
+
+    if cumulative_us is None:
+        raise RuntimeError(f"No import time reported for '{module_name}'.")
+    return cumulative_us / 1000.0, imported_modules
+
+
+# --- Main Script Logic ---
+def main():
+    failures = []
+
+    for module_name, budget_ms in STARTUP_BUDGET_MS.items():
+        samples = []
+        imported_modules = set()
+        for _ in range(STARTUP_SAMPLE_RUNS):
+            elapsed_ms, imported_modules = measure_import_time(module_name)
+            samples.append(elapsed_ms)
+        median_ms = statistics.median(samples)
+
+        status = "OK" if median_ms <= budget_ms else "OVER BUDGET"
+        print(f"{module_name}: median {median_ms:.1f} ms over {len(samples)} runs (budget {budget_ms:.0f} ms) - {status}")
+        if median_ms > budget_ms:
+            failures.append(f"{module_name} took {median_ms:.1f} ms to import (budget {budget_ms:.0f} ms).")
+
+        for forbidden in FORBIDDEN_STARTUP_IMPORTS:
+            if any(name == forbidden or name.startswith(forbidden + ".") for name in imported_modules):
+                failures.append(f"{module_name} imports '{forbidden}' at startup; it must be imported lazily.")
+
+    if failures:
+        print("\nStartup budget check failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        exit(1)
+
+    print("\nAll report scripts are within their startup budget.")
+
+
+if __name__ == "__main__":
+    main()
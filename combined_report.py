@@ -2,7 +2,24 @@ import requests
 import json
 from datetime import datetime
 import os
-import gspread # Library for Google Sheets API interaction
+
+from discord_delivery import deliver_discord_payload
+from discord_id_map import update_discord_id_map_file
+from report_profiling import mark_stage, run_entry_point
+from run_metrics import record_vault_compliance, record_zero_loot_players
+from report_state import compute_fingerprint, fingerprint_unchanged, store_fingerprints
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit, stale_sources
+from wowaudit_records import decode_characters, decode_historical_data, decode_loot_history
+from loot_priority import LOOT_PRIORITY_WEIGHTS, parse_priority_weights, load_mplus_compliance, compute_priority_scores, format_priority_list
+from loot_store import store_loot_entries
+from sheet_writeback import configured_writeback_columns, write_back_to_sheet
+from loot_timeseries import refresh_loot_matrix, loot_in_period, loot_in_window
+from tier_sheet import fetch_tier_data_from_sheet
+from tier_progress import parse_tier_table, refresh_tier_progress, tier_gain, weeks_to_set_bonus, format_tier_display
+
+# gspread is imported lazily inside tier_sheet.fetch_tier_data_from_sheet so runs without
+# GOOGLE_SHEETS_CREDENTIALS never load google-auth and its transport stack.
 
 # --- Configuration ---
 API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
@@ -24,6 +41,9 @@ REQUIRED_DUNGEON_OPTION_VALUE = 707
 # --- Loot History Exclusion Configuration ---
 EXCLUDED_LOOT_RESPONSE_TYPES = ["tmog", "transmorg", "transmog"]
 
+# Number of resets covered by the rolling-window loot count shown next to the season total
+RECENT_LOOT_WEEKS = 4
+
 # --- Class Emoji/Image Mapping ---
 CLASS_IMAGE_MAP = {
     "Death Knight": {"emoji": "<:dk:1397596583801131069>", "url": "https://wow.zamimg.com/images/wow/icons/large/classicon_deathknight.jpg", "abbr": "DK"},
@@ -63,15 +83,17 @@ THUMBNAIL_STATUS_ICONS = {
 
 
 # --- Function to Send Message to Discord Webhook ---
-def send_discord_webhook(message, webhook_url, embed_title="Report", embed_color=3447003, thumbnail_url=None):
+def send_discord_webhook(message, webhook_url, embed_title="Report", embed_color=3447003, thumbnail_url=None, report_key=None):
     """
     Sends a message to a Discord webhook as an embed.
+    With a report_key, the message posted for that key on an earlier run is edited in place.
+    Returns True if Discord accepted the message, False otherwise.
     """
     max_message_length = 4096
 
     if not message:
         print("Error: Discord embed description is empty. Not sending.")
-        return
+        return False
 
     if len(message) > max_message_length:
         print(f"Warning: Discord embed description exceeds {max_message_length} characters. It might be truncated or rejected.")
@@ -95,194 +117,71 @@ def send_discord_webhook(message, webhook_url, embed_title="Report", embed_color
     print(f"DEBUG: JSON Payload (string): {json.dumps(payload, indent=2)}")
 
     try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()
+        deliver_discord_payload(webhook_url, payload, report_key)
         print("Discord webhook message (embed) sent successfully.")
+        return True
     except requests.exceptions.RequestException as e:
         print(f"Error: Failed to send Discord webhook message: {e}")
         if e.response is not None:
             print(f"Discord API Error Message: {e.response.text}")
+        return False
 
 
-# --- Function to Update Discord ID Mapping File ---
-def update_discord_id_map_file(api_auth_header, map_file_path):
+# --- Function to Get a Player's Class Display ---
+def class_display_for_player(player):
     """
-    Fetches character names and classes from WoW Audit API and updates the Discord ID map file.
-    New characters are added with a null Discord ID and their class.
-    Existing entries are updated with class info if missing or different, and converted to new format if old.
+    Returns the class emoji (or abbreviation) for a player dict, preferring the class from discord_id_map.json.
     """
-    print(f"Attempting to update Discord ID map file: {map_file_path}")
-    characters_api_url = 'https://wowaudit.com/v1/characters'
-    headers = {
-        "accept": "application/json",
-        "Authorization": api_auth_header
-    }
-
-    try:
-        response = requests.get(characters_api_url, headers=headers)
-        response.raise_for_status()
-        api_characters_data = response.json()
-        print(f"Successfully fetched {len(api_characters_data)} characters from WoW Audit API.")
-
-        # Load existing map
-        existing_map = {}
-        if os.path.exists(map_file_path):
-            with open(map_file_path, 'r', encoding='utf-8') as f:
-                try:
-                    existing_map = json.load(f)
-                    print(f"Loaded existing Discord ID map with {len(existing_map)} entries.")
-                except json.JSONDecodeError:
-                    print(f"Warning: '{map_file_path}' is not a valid JSON file. Starting with an empty map.")
-                    existing_map = {}
-        else:
-            print(f"'{map_file_path}' not found. A new map will be created.")
-
-        updated_map = existing_map.copy()
-        changes_made = False
-
-        # Iterate through characters from API and update the map
-        for char_data in api_characters_data:
-            char_name = char_data.get('name')
-            char_class = char_data.get('class') # Get the class from the API response
-
-            if not char_name:
-                continue # Skip if no name
-
-            if char_name not in updated_map:
-                # New character: add with null discord_id and fetched class
-                updated_map[char_name] = {"discord_id": None, "class": char_class}
-                print(f"Added new character '{char_name}' (Class: {char_class}) to map.")
-                changes_made = True
-            else:
-                # Existing character: check format and update class if needed
-                current_entry = updated_map[char_name]
-                if isinstance(current_entry, str):
-                    # Old format (just Discord ID string), convert to new dict format
-                    updated_map[char_name] = {"discord_id": current_entry, "class": char_class}
-                    print(f"Converted '{char_name}' to new map format, added Class: {char_class}.")
-                    changes_made = True
-                elif isinstance(current_entry, dict):
-                    # New format, check if class needs update
-                    if current_entry.get("class") != char_class:
-                        updated_map[char_name]["class"] = char_class
-                        print(f"Updated class for '{char_name}' to: {char_class}.")
-                        changes_made = True
-                    # If discord_id is missing but class is present, ensure discord_id is None
-                    if "discord_id" not in current_entry:
-                        updated_map[char_name]["discord_id"] = None
-                        changes_made = True
-                else:
-                    print(f"Warning: Unexpected format for '{char_name}' in map. Skipping class update.")
-
-
-        if changes_made:
-            # Write the updated map back to the file
-            with open(map_file_path, 'w', encoding='utf-8') as f:
-                json.dump(updated_map, f, indent=2, ensure_ascii=False)
-            print(f"Discord ID map '{map_file_path}' updated successfully.")
-            print("Remember to manually update the 'discord_id' for new/updated entries in this file.")
-            return True # Indicate that the map was updated
-        else:
-            print("No changes needed for the Discord ID map.")
-            return False # Indicate no update was needed
+    player_class = DISCORD_ID_MAP.get(player['PlayerName'], {}).get('class', player['Class'])
+    class_info = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])
+    return class_info['emoji'] or class_info['abbr']
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Failed to fetch characters from WoW Audit API for map update: {e}")
-        if e.response is not None:
-            print(f"Response Content: {e.response.text}")
-        return False
-    except Exception as e:
-        print(f"Error: An unexpected error occurred during map update: {e}")
-        return False
 
-# --- Function to Fetch Tier Data from Google Sheet ---
-def fetch_tier_data_from_sheet(sheet_url, worksheet_name, player_col, tier_col, credentials_json):
+# --- Function to Evaluate a Player's M+ Vault Status ---
+def mplus_vault_status(snapshot):
     """
-    Fetches player names and their tier piece counts from a Google Sheet.
+    Returns "Klaret", "Mangler 1 vault slot" or "Mangler 2 vault slots" for one /historical_data snapshot.
     """
-    tier_data = {}
-    if not credentials_json:
-        print("Warning: GOOGLE_SHEETS_CREDENTIALS environment variable is not set. Skipping Google Sheet data fetch.")
-        return {}
-
-    try:
-        gc = gspread.service_account_from_dict(json.loads(credentials_json))
-        sh = gc.open_by_url(sheet_url)
-        worksheet = sh.worksheet(worksheet_name)
-        all_values = worksheet.get_all_values()
-        
-        data_rows = all_values[1:] # Skip header row
-        
-        for row in data_rows:
-            if len(row) >= max(player_col, tier_col):
-                player_name = row[player_col - 1].strip() # Adjust to 0-indexed
-                tier_piece_info = row[tier_col - 1].strip() # Adjust to 0-indexed
-                
-                if player_name: # Only add if player name is not empty
-                    tier_data[player_name] = tier_piece_info
-        
-        print(f"Successfully fetched tier data for {len(tier_data)} players from Google Sheet.")
-        return tier_data
-
-    except gspread.exceptions.SpreadsheetNotFound:
-        print(f"Error: Google Spreadsheet not found at URL: {sheet_url}")
-    except gspread.exceptions.WorksheetNotFound:
-        print(f"Error: Worksheet '{worksheet_name}' not found in the spreadsheet.")
-    except json.JSONDecodeError:
-        print("Error: GOOGLE_SHEETS_CREDENTIALS environment variable is not valid JSON.")
-    except Exception as e:
-        print(f"Error fetching data from Google Sheet: {e}")
-    return {}
-
+    if snapshot.option_1 == REQUIRED_DUNGEON_OPTION_VALUE and snapshot.option_2 == REQUIRED_DUNGEON_OPTION_VALUE:
+        return "Klaret"
+    if snapshot.option_1 == REQUIRED_DUNGEON_OPTION_VALUE:
+        return "Mangler 1 vault slot"
+    return "Mangler 2 vault slots"
 
-# --- Main Script Logic ---
-def main():
-    global DISCORD_ID_MAP
-    global character_map # Declare character_map as global here
-    character_map = {} # Initialize it at the very top of main
 
-    if not API_AUTHORIZATION_HEADER:
-        print("Error: WOWAUDIT_API_KEY environment variable is not set. Please configure it as a GitHub Secret.")
-        exit(1)
-    if not DISCORD_WEBHOOK_URL:
-        print("Error: DISCORD_WEBHOOK_URL environment variable is not set. Please configure it as a GitHub Secret.")
-        exit(1)
+# --- Report Data Providers ---
+# Each provider fetches or computes one piece of report data and is only called when a configured
+# section needs it (see require_report_data). Providers load the data they depend on themselves.
+def require_report_data(report_data, name):
+    """
+    Returns report_data[name], calling its provider from REPORT_DATA_PROVIDERS the first time it is needed.
 
-    # Update and load Discord ID map
-    update_discord_id_map_file(API_AUTHORIZATION_HEADER, DISCORD_ID_MAP_FILE)
-    try:
-        with open(DISCORD_ID_MAP_FILE, 'r', encoding='utf-8') as f:
-            DISCORD_ID_MAP = json.load(f)
-    except Exception as e:
-        print(f"Error loading Discord ID map after update attempt: {e}. Player classes/tags may be missing.")
+    Args:
+        report_data (dict): Data loaded so far in this run. "sections" holds the configured section names.
+        name (str): A key of REPORT_DATA_PROVIDERS.
+    """
+    if name not in report_data:
+        report_data[name] = REPORT_DATA_PROVIDERS[name](report_data)
+    return report_data[name]
 
-    # Fetch tier data from Google Sheet
-    tier_pieces_data = fetch_tier_data_from_sheet(
-        GOOGLE_SHEET_URL,
-        GOOGLE_SHEET_WORKSHEET_NAME,
-        GOOGLE_SHEET_PLAYER_NAME_COLUMN,
-        GOOGLE_SHEET_TIER_PIECES_COLUMN,
-        GOOGLE_SHEETS_CREDENTIALS_JSON
-    )
-    print(f"DEBUG: Tier pieces data fetched from Google Sheet: {tier_pieces_data}")
 
+def load_period_data(report_data):
+    """
+    Fetches the current period and keystone season. Exits if they cannot be determined.
 
-    # --- Fetch current period and season ID ---
+    Returns:
+        dict: {"current_period", "season_id", "first_period"}.
+    """
+    mark_stage("period")
     print("Fetching current period to get keystone_season_id...")
-    period_api_url = 'https://wowaudit.com/v1/period'
-    headers = {"accept": "application/json", "Authorization": API_AUTHORIZATION_HEADER}
-    
-    current_period_from_api = None
-    current_season_id = None
     try:
-        response = requests.get(period_api_url, headers=headers)
-        response.raise_for_status()
-        period_data = response.json()
-        
+        period_data = get_period_data(API_AUTHORIZATION_HEADER)
+
         current_period_from_api = period_data.get("current_period")
         current_season = period_data.get("current_season")
         if current_season and current_season.get("keystone_season_id"):
             current_season_id = current_season["keystone_season_id"]
+            season_first_period = current_season.get("first_period_id")
             print(f"Retrieved current_period: {current_period_from_api}, keystone_season_id: {current_season_id}")
         else:
             raise ValueError("Could not find 'keystone_season_id' in the current_season data.")
@@ -294,249 +193,477 @@ def main():
         print(f"Error: {e}")
         exit(1)
 
-    # --- Step 2: Get all characters to map IDs to names and classes ---
-    # This block populates the global character_map
+    return {"current_period": current_period_from_api, "season_id": current_season_id, "first_period": season_first_period}
+
+
+def load_character_map(report_data):
+    """
+    Fetches all characters. Exits if they cannot be fetched.
+
+    Returns:
+        dict: {character_id: {"name": ..., "class": ...}}.
+    """
+    mark_stage("characters")
     print("Fetching all characters for name and class mapping...")
-    characters_api_url = 'https://wowaudit.com/v1/characters'
+    character_map = {}
     try:
-        response = requests.get(characters_api_url, headers=headers)
-        response.raise_for_status()
-        api_characters_data = response.json()
-        print(f"Successfully fetched {len(api_characters_data)} characters.")
-        # Populate the global character_map
-        for char_data in api_characters_data:
-            char_id = char_data.get('id')
-            char_name = char_data.get('name')
-            char_class = char_data.get('class')
-            if char_id and char_name:
-                character_map[char_id] = {"name": char_name, "class": char_class}
+        api_characters = decode_characters(fetch_wowaudit('/characters', API_AUTHORIZATION_HEADER))
+        print(f"Successfully fetched {len(api_characters)} characters.")
+        for character in api_characters:
+            character_map[character.id] = {"name": character.name, "class": character.character_class}
     except requests.exceptions.RequestException as e:
         print(f"Error: An error occurred while fetching characters data: {e}")
         if e.response is not None:
             print(f"Response Content: {e.response.text}")
         exit(1)
+    return character_map
+
+
+def load_tier_data(report_data):
+    """
+    Reads tier pieces from the Google Sheet and stores this period's tier snapshot; weekly gains and
+    time-to-set come from the stored snapshots.
+
+    Returns:
+        dict: {"pieces": {name: "x/y"}, "table": {name: (current, max)}, "progress": see tier_progress.load_tier_progress}.
+    """
+    period_data = require_report_data(report_data, "period")
+    mark_stage("tier sheet")
+    tier_pieces_data = fetch_tier_data_from_sheet(
+        GOOGLE_SHEET_URL,
+        GOOGLE_SHEET_WORKSHEET_NAME,
+        GOOGLE_SHEET_PLAYER_NAME_COLUMN,
+        GOOGLE_SHEET_TIER_PIECES_COLUMN,
+        GOOGLE_SHEETS_CREDENTIALS_JSON
+    )
+    print(f"DEBUG: Tier pieces data fetched from Google Sheet: {tier_pieces_data}")
+    tier_table = parse_tier_table(tier_pieces_data) # {name: (current, max)}, parsed once for the whole report
+    tier_progress = refresh_tier_progress(period_data["season_id"], period_data["first_period"], period_data["current_period"], tier_table)
+    return {"pieces": tier_pieces_data, "table": tier_table, "progress": tier_progress}
 
 
-    # --- M+ Requirement Check (Previous Period) ---
-    mplus_report_period = current_period_from_api - 1
-    print(f"\n--- Running M+ Requirement Check for period: {mplus_report_period} ---")
-    mplus_historical_data_url = f"https://wowaudit.com/v1/historical_data?period={mplus_report_period}"
-    
+def load_mplus_statuses(period, period_label):
+    """
+    Fetches /historical_data for a period and evaluates every player's M+ vault status.
+
+    Returns:
+        dict: {"players": [players missing requirements], "statuses": {name: status},
+               "options": {name: [option_1, option_2, option_3]}, "available": bool}.
+    """
+    print(f"\n--- Running M+ Requirement Check for period: {period} ---")
     mplus_players_to_report = []
+    mplus_vault_statuses = {}
     try:
-        response = requests.get(mplus_historical_data_url, headers=headers)
-        response.raise_for_status()
-        mplus_raw_data = response.json()
-        mplus_data_items = mplus_raw_data.get('characters', [])
-
-        for item in mplus_data_items:
-            # Safely check if item is a dictionary before proceeding
-            if not isinstance(item, dict):
-                print(f"Warning: M+ data item is not a dictionary. Skipping: {item}")
-                continue
+        mplus_snapshots = decode_historical_data(fetch_wowaudit(f"/historical_data?period={period}", API_AUTHORIZATION_HEADER))
+    except requests.exceptions.RequestException as e:
+        print(f"Error: M+ report - An error occurred fetching historical data: {e}")
+        return {"players": [], "statuses": {}, "options": {}, "available": False}
+
+    for snapshot in mplus_snapshots:
+        status_details = mplus_vault_status(snapshot)
+        mplus_vault_statuses[snapshot.name] = status_details
+        if status_details != "Klaret":
+            mplus_players_to_report.append({"PlayerName": snapshot.name, "DungeonVaultStatus": status_details})
+
+    print(f"DEBUG: M+ report found {len(mplus_players_to_report)} players missing requirements.")
+    record_vault_compliance(period_label, len(mplus_snapshots),
+                            sum(1 for p in mplus_players_to_report if p['DungeonVaultStatus'] == "Mangler 1 vault slot"),
+                            sum(1 for p in mplus_players_to_report if p['DungeonVaultStatus'] == "Mangler 2 vault slots"))
+    mplus_options = {snapshot.name: [snapshot.option_1, snapshot.option_2, snapshot.option_3] for snapshot in mplus_snapshots if snapshot.name}
+    return {"players": mplus_players_to_report, "statuses": mplus_vault_statuses, "options": mplus_options, "available": True}
 
-            # Safely get nested dictionaries, providing empty dict as default
-            # Check if 'data' key exists and is a dictionary
-            data_content = item.get("data")
-            # Ensure data_content is a dictionary before proceeding
-            if not isinstance(data_content, dict):
-                data_content = {} 
-
-            # Check if 'vault_options' key exists and is a dictionary
-            vault_options_content = data_content.get("vault_options")
-            # Ensure vault_options_content is a dictionary before proceeding
-            if not isinstance(vault_options_content, dict):
-                vault_options_content = {} 
-
-            dungeon_vault_option = vault_options_content.get("dungeons")
-
-            name = item.get("name") # Get name after ensuring item is a dict
-
-            report_player = True
-            status_details = None
-
-            if dungeon_vault_option and \
-               dungeon_vault_option.get("option_1") == REQUIRED_DUNGEON_OPTION_VALUE and \
-               dungeon_vault_option.get("option_2") == REQUIRED_DUNGEON_OPTION_VALUE:
-                report_player = False
-            else:
-                if dungeon_vault_option and dungeon_vault_option.get("option_1") == REQUIRED_DUNGEON_OPTION_VALUE:
-                    status_details = "Mangler 1 vault slot"
-                else:
-                    status_details = "Mangler 2 vault slots"
-
-            if report_player:
-                mplus_players_to_report.append({"PlayerName": name, "DungeonVaultStatus": status_details})
-        
-        print(f"DEBUG: M+ report found {len(mplus_players_to_report)} players missing requirements.")
 
+def load_mplus_previous(report_data):
+    period_data = require_report_data(report_data, "period")
+    mark_stage("mplus check")
+    return load_mplus_statuses(period_data["current_period"] - 1, "previous")
+
+
+def load_mplus_current(report_data):
+    period_data = require_report_data(report_data, "period")
+    mark_stage("mplus current check")
+    return load_mplus_statuses(period_data["current_period"], "current")
+
+
+def load_loot_data(report_data):
+    """
+    Fetches the season's loot history and joins it with the characters (and tier data when the tier section is configured).
+
+    Returns:
+        dict: {"players": player dicts sorted by loot count, "ranked": priority ranking, "cursor": highest loot id, "available": bool}.
+    """
+    period_data = require_report_data(report_data, "period")
+    character_map = require_report_data(report_data, "characters")
+    tier_data = require_report_data(report_data, "tier") if "tier" in report_data["sections"] else None
+    current_season_id = period_data["season_id"]
+    reported_period = period_data["current_period"] - 1 # The weekly report looks at last week, like the M+ section
+
+    mark_stage("loot history")
+    print(f"\n--- Running Loot History Report for season ID: {current_season_id} ---")
+    loot_counts = {}
+    loot_cursor = 0 # Highest loot history item id seen, part of the report fingerprint
+    player_loot_data = [] # To store combined player info and loot count
+
+    try:
+        loot_entries = decode_loot_history(fetch_wowaudit(f"/loot_history/{current_season_id}", API_AUTHORIZATION_HEADER))
     except requests.exceptions.RequestException as e:
-        print(f"Error: M+ report - An error occurred fetching historical data: {e}")
-        mplus_players_to_report = [] # Ensure it's empty on error
+        print(f"Error: Loot report - An error occurred fetching loot history: {e}")
+        return {"players": [], "ranked": [], "cursor": loot_cursor, "available": False}
 
-    mplus_embed_description_part = "Følgende spillere nåede ikke deres m+ mål i sidste uge:\n\n"
-    mplus_embed_color = 3066993 # Green default
-    mplus_thumbnail_url = THUMBNAIL_STATUS_ICONS['mplus_complete']
+    for loot_entry in loot_entries:
+        if isinstance(loot_entry.id, int):
+            loot_cursor = max(loot_cursor, loot_entry.id)
+        response_type_name = loot_entry.response_type
 
+        if (response_type_name and response_type_name.lower() not in EXCLUDED_LOOT_RESPONSE_TYPES) and not loot_entry.discarded:
+            if loot_entry.character_id:
+                loot_counts[loot_entry.character_id] = loot_counts.get(loot_entry.character_id, 0) + 1
+        else:
+            reason = []
+            if response_type_name and response_type_name.lower() in EXCLUDED_LOOT_RESPONSE_TYPES:
+                reason.append(f"excluded response type '{response_type_name}'")
+            if loot_entry.discarded:
+                reason.append("item was discarded")
+            print(f"DEBUG: Skipping loot entry for item '{loot_entry.name}' (ID: {loot_entry.id}) because: {', '.join(reason)}")
+
+    # Bucket new loot into the per-period matrix
+    loot_matrix = refresh_loot_matrix(current_season_id, period_data["first_period"], period_data["current_period"], loot_entries, EXCLUDED_LOOT_RESPONSE_TYPES)
+
+    # Keep a local, indexed copy of the history for query_loot.py
+    store_loot_entries(current_season_id, loot_entries, character_map, EXCLUDED_LOOT_RESPONSE_TYPES)
+
+    print(f"DEBUG: character_map content before iterating for loot report: {character_map}")
+
+    for char_id, char_info in character_map.items():
+        player_name = char_info["name"]
+        player_loot_data.append({
+            "PlayerName": player_name,
+            "Class": char_info["class"],
+            "LootCount": loot_counts.get(char_id, 0),
+            "WeekLootCount": loot_in_period(loot_matrix, char_id, reported_period), # Loot in the reported (previous) period
+            "RecentLootCount": loot_in_window(loot_matrix, char_id, reported_period, RECENT_LOOT_WEEKS), # Loot over the last RECENT_LOOT_WEEKS resets
+            "TierPieces": tier_data["pieces"].get(player_name, "N/A") if tier_data else "N/A",
+            "Tier": tier_data["table"].get(player_name) if tier_data else None, # (current, max) or None
+            "TierGain": tier_gain(tier_data["progress"], player_name, period_data["current_period"]) if tier_data else None,
+            "SetBonusWeek": weeks_to_set_bonus(tier_data["progress"], player_name) if tier_data else None,
+        })
+
+    # Priority index from loot counts, tier progress and stored M+ compliance (no extra API calls). Last week's
+    # M+ result is added from the M+ section when it ran and the stored matrix does not have that week yet.
+    mplus_previous = report_data.get("mplus_previous")
+    latest_met = None
+    if mplus_previous and mplus_previous["available"]:
+        latest_met = {name: status == "Klaret" for name, status in mplus_previous["statuses"].items()}
+    mplus_compliance = load_mplus_compliance(current_season_id, reported_period, latest_met)
+    ranked_players = compute_priority_scores(player_loot_data, mplus_compliance, parse_priority_weights(LOOT_PRIORITY_WEIGHTS))
+    player_loot_data.sort(key=lambda x: x['LootCount']) # Sort by loot count
+    record_zero_loot_players(player_loot_data)
+    return {"players": player_loot_data, "ranked": ranked_players, "cursor": loot_cursor, "available": True}
+
+
+def load_season_matrix_data(report_data):
+    """
+    Loads the M+ season matrix stored by backfill_mplus_season.py. No API calls: when the M+ section ran and the
+    stored matrix ends the week before, last week's options are added to the loaded copy (not saved).
+    """
+    # Imported here so reports without the season section do not load the backfill (and M+ report) modules
+    from backfill_mplus_season import add_period_to_matrix, load_season_matrix
+
+    period_data = require_report_data(report_data, "period")
+    mark_stage("season matrix")
+    matrix = load_season_matrix(period_data["season_id"], period_data["first_period"], REQUIRED_DUNGEON_OPTION_VALUE)
+    previous_period = period_data["current_period"] - 1
+    mplus_previous = report_data.get("mplus_previous")
+    if matrix["periods"] and matrix["periods"][-1] == previous_period - 1 and mplus_previous and mplus_previous["available"]:
+        add_period_to_matrix(matrix, previous_period, mplus_previous["options"], REQUIRED_DUNGEON_OPTION_VALUE)
+    return matrix
+
+
+REPORT_DATA_PROVIDERS = {
+    "period": load_period_data,
+    "characters": load_character_map,
+    "tier": load_tier_data,
+    "mplus_previous": load_mplus_previous,
+    "mplus_current": load_mplus_current,
+    "loot": load_loot_data,
+    "season_matrix": load_season_matrix_data,
+}
+
+
+# --- Report Section Renderers ---
+# Each renderer gets the loaded report data and returns the section's part of the embed:
+# {"description", "color", "thumbnail", "alert" (the section wants the embed's color), "available"}.
+MPLUS_SECTION_TEXTS = {
+    "mplus_previous": {
+        "warning": ":warning:Følgende spillere nåede ikke deres m+ mål i sidste uge:\n\n",
+        "two_slots": ":red_circle: **Manglede 2 vault slots:**\n\n",
+        "one_slot": ":yellow_circle: **Manglede 1 vault slot:**\n\n",
+        "unavailable": ":hourglass: M+ data for sidste uge kunne ikke hentes i tide.",
+        "complete": "Alle spillere nåede deres m+ mål i sidste uge. Godt arbejde!",
+    },
+    "mplus_current": {
+        "warning": ":warning:Følgende spillere mangler stadig deres m+ mål denne uge:\n\n",
+        "two_slots": ":red_circle: **Mangler 2 vault slots:**\n\n",
+        "one_slot": ":yellow_circle: **Mangler 1 vault slot:**\n\n",
+        "unavailable": ":hourglass: M+ data for denne uge kunne ikke hentes i tide.",
+        "complete": "Alle spillere har nået deres m+ mål denne uge. Godt arbejde!",
+    },
+}
+
+
+def render_mplus_section(mplus_data, texts):
+    """
+    Renders the players missing M+ vault slots, grouped by how many slots they miss.
+    """
+    mplus_players_to_report = mplus_data["players"]
     if mplus_players_to_report:
-        mplus_embed_description_part = ":warning:Følgende spillere nåede ikke deres m+ mål i sidste uge:\n\n"
+        mplus_embed_description_part = texts["warning"]
         # Separate players by slot requirement for M+ report
         players_two_slots = [p for p in mplus_players_to_report if p['DungeonVaultStatus'] == "Mangler 2 vault slots"]
         players_one_slot = [p for p in mplus_players_to_report if p['DungeonVaultStatus'] == "Mangler 1 vault slot"]
 
-        if players_two_slots:
-            mplus_embed_description_part += ":red_circle: **Manglede 2 vault slots:**\n\n"
-            for player in players_two_slots:
-                player_name = player['PlayerName']
-                player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-                player_class = player_data_from_map.get('class', 'Unknown')
-                class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
-                if not class_display:
-                    class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
-                # Removed Discord tagging for M+ report
-                mplus_embed_description_part += f"{class_display} {player_name}\n"
-        
-        if players_one_slot:
-            if players_two_slots:
+        for heading, players in ((texts["two_slots"], players_two_slots), (texts["one_slot"], players_one_slot)):
+            if not players:
+                continue
+            if players is players_one_slot and players_two_slots:
                 mplus_embed_description_part += "\n"
-            mplus_embed_description_part += ":yellow_circle: **Manglede 1 vault slot:**\n\n"
-            for player in players_one_slot:
+            mplus_embed_description_part += heading
+            for player in players:
                 player_name = player['PlayerName']
-                player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-                player_class = player_data_from_map.get('class', 'Unknown')
+                player_class = DISCORD_ID_MAP.get(player_name, {}).get('class', 'Unknown')
                 class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
                 if not class_display:
                     class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
                 # Removed Discord tagging for M+ report
                 mplus_embed_description_part += f"{class_display} {player_name}\n"
-        
-        mplus_embed_color = 15548997 # Red for incomplete
-        mplus_thumbnail_url = THUMBNAIL_STATUS_ICONS['mplus_incomplete']
-    else:
-        mplus_embed_description_part = "Alle spillere nåede deres m+ mål i sidste uge. Godt arbejde!"
-        mplus_embed_color = 3066993 # Green for complete
-        mplus_thumbnail_url = THUMBNAIL_STATUS_ICONS['mplus_complete']
 
+        return {"description": mplus_embed_description_part, "color": 15548997, # Red for incomplete
+                "thumbnail": THUMBNAIL_STATUS_ICONS['mplus_incomplete'], "alert": True, "available": True}
+    if not mplus_data["available"]:
+        return {"description": texts["unavailable"], "color": 808080, # Grey color for no data
+                "thumbnail": THUMBNAIL_STATUS_ICONS['loot_report'], "alert": False, "available": False}
+    return {"description": texts["complete"], "color": 3066993, # Green for complete
+            "thumbnail": THUMBNAIL_STATUS_ICONS['mplus_complete'], "alert": False, "available": True}
 
-    # --- Loot History Report ---
-    print(f"\n--- Running Loot History Report for season ID: {current_season_id} ---")
-    loot_history_url = f"https://wowaudit.com/v1/loot_history/{current_season_id}"
-    loot_counts = {}
-    player_loot_data = [] # To store combined player info and loot count
 
-    try:
-        response = requests.get(loot_history_url, headers=headers)
-        response.raise_for_status()
-        raw_loot_history_response = response.json()
-        loot_history_data = raw_loot_history_response.get('history_items', [])
-        
-        for loot_entry in loot_history_data:
-            if isinstance(loot_entry, dict):
-                response_type_name = loot_entry.get('response_type', {}).get('name')
-                is_discarded = loot_entry.get('discarded', False)
-                
-                if (response_type_name and response_type_name.lower() not in EXCLUDED_LOOT_RESPONSE_TYPES) and not is_discarded:
-                    recipient_id = loot_entry.get('character_id')
-                    if recipient_id:
-                        loot_counts[recipient_id] = loot_counts.get(recipient_id, 0) + 1
-                else:
-                    reason = []
-                    if response_type_name and response_type_name.lower() in EXCLUDED_LOOT_RESPONSE_TYPES:
-                        reason.append(f"excluded response type '{response_type_name}'")
-                    if is_discarded:
-                        reason.append("item was discarded")
-                    print(f"DEBUG: Skipping loot entry for item '{loot_entry.get('name')}' (ID: {loot_entry.get('id')}) because: {', '.join(reason)}")
-            else:
-                print(f"Warning: Unexpected loot entry format encountered. Expected dict, got {type(loot_entry)}: {loot_entry}")
-
-        # Combine character_map with loot_counts and tier_pieces_data
-        # character_map is now a global variable
-        # DEBUG: Check character_map content before iterating for loot report
-        print(f"DEBUG: character_map content before iterating for loot report: {character_map}")
-
-        for char_id, char_info in character_map.items():
-            player_name = char_info["name"]
-            player_class = char_info["class"]
-            loot_count = loot_counts.get(char_id, 0)
-            tier_pieces_info = tier_pieces_data.get(player_name, "N/A")
-            
-            player_loot_data.append({
-                "PlayerName": player_name,
-                "Class": player_class,
-                "LootCount": loot_count,
-                "TierPieces": tier_pieces_info
-            })
-        
-        player_loot_data.sort(key=lambda x: x['LootCount']) # Sort by loot count
+def render_mplus_previous_section(report_data):
+    return render_mplus_section(report_data["mplus_previous"], MPLUS_SECTION_TEXTS["mplus_previous"])
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Loot report - An error occurred fetching loot history: {e}")
-        player_loot_data = [] # Ensure it's empty on error
 
-    loot_embed_description_part = "\n\n**Lootfordeling for denne sæson (sorteret efter færrest items):**\n\n" # Removed "---"
-    loot_embed_color = 3447003 # Default Discord blue
+def render_mplus_current_section(report_data):
+    return render_mplus_section(report_data["mplus_current"], MPLUS_SECTION_TEXTS["mplus_current"])
+
+
+def render_loot_section(report_data):
+    """
+    Renders the season's loot per player (with tier pieces when the tier section is configured) and the priority list.
+    """
+    loot_data = report_data["loot"]
+    player_loot_data = loot_data["players"]
+    show_tier = "tier" in report_data["sections"]
+    loot_embed_description_part = "**Lootfordeling for denne sæson (sorteret efter færrest items):**\n\n"
 
     if player_loot_data:
         for player in player_loot_data:
-            player_name = player['PlayerName']
-            loot_count = player['LootCount']
-            tier_pieces = player['TierPieces']
-            
-            formatted_tier_display = ""
-            if tier_pieces != "N/A" and '/' in tier_pieces:
-                try:
-                    current_tier_str, max_tier_str = tier_pieces.split('/')
-                    current_tier = int(current_tier_str)
-                    max_tier = int(max_tier_str)
-
-                    # Get the emoji for current_tier, fallback to string if not found
-                    current_tier_emoji = TIER_EMOJI_MAP.get(current_tier, current_tier_str)
-                    
-                    # Get the emoji for max_tier, fallback to string if not found
-                    max_tier_emoji = TIER_EMOJI_MAP.get(max_tier, max_tier_str)
-                    
-                    formatted_tier_display = f"(Tier: {current_tier_emoji} / {max_tier_emoji})"
-                except ValueError:
-                    formatted_tier_display = f"(Tier: {TIER_EMOJI_FALLBACK} {tier_pieces})"
-            else:
-                formatted_tier_display = f"(Tier: {TIER_EMOJI_FALLBACK} {tier_pieces})"
-            
-            player_data_from_map = DISCORD_ID_MAP.get(player_name, {})
-            player_class = player_data_from_map.get('class', player['Class'])
-            class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['emoji']
-            if not class_display:
-                class_display = CLASS_IMAGE_MAP.get(player_class, CLASS_IMAGE_MAP['Unknown'])['abbr']
-            
-            loot_embed_description_part += f"{class_display} {player_name} - {loot_count} items {formatted_tier_display}\n"
-        
-        if any(p['LootCount'] == 0 for p in player_loot_data):
-            loot_embed_color = 15548997 # Red if someone has 0 loot
-        else:
-            loot_embed_color = 3066993 # Green if everyone has loot
+            loot_embed_description_part += (f"{class_display_for_player(player)} {player['PlayerName']} - {player['LootCount']} items "
+                                            f"({player['WeekLootCount']} sidste uge, {player['RecentLootCount']} på {RECENT_LOOT_WEEKS} uger)")
+            if show_tier:
+                loot_embed_description_part += " " + format_tier_display(player['Tier'], player['TierPieces'], TIER_EMOJI_MAP, TIER_EMOJI_FALLBACK,
+                                                                         player['TierGain'], player['SetBonusWeek'], "sidste uge")
+            loot_embed_description_part += "\n"
+
+        loot_embed_description_part += "\n" + format_priority_list(loot_data["ranked"], class_display_for_player)
+
+        zero_loot = any(p['LootCount'] == 0 for p in player_loot_data)
+        return {"description": loot_embed_description_part,
+                "color": 15548997 if zero_loot else 3066993, # Red if someone has 0 loot, green if everyone has loot
+                "thumbnail": THUMBNAIL_STATUS_ICONS['loot_report'], "alert": zero_loot, "available": True}
+    if not loot_data["available"]:
+        loot_embed_description_part += ":hourglass: Loot data kunne ikke hentes i tide."
     else:
-        loot_embed_description_part += f"Ingen loot data fundet for sæson {current_season_id}."
-        loot_embed_color = 808080 # Grey color for no data
+        loot_embed_description_part += f"Ingen loot data fundet for sæson {report_data['period']['season_id']}."
+    return {"description": loot_embed_description_part, "color": 808080, # Grey color for no data
+            "thumbnail": THUMBNAIL_STATUS_ICONS['loot_report'], "alert": False, "available": loot_data["available"]}
 
 
+def render_tier_section(report_data):
+    """
+    Renders tier pieces per player, fewest first. With the loot section configured, tier pieces are
+    shown on the loot lines instead and this section adds nothing.
+    """
+    if "loot" in report_data["sections"]:
+        return None
+    tier_data = report_data["tier"]
+    tier_embed_description_part = "**Tier status (sorteret efter færrest dele):**\n\n"
+    if not tier_data["table"]:
+        tier_embed_description_part += "Ingen tier data fundet i Google Sheet."
+        return {"description": tier_embed_description_part, "color": 808080, # Grey color for no data
+                "thumbnail": THUMBNAIL_STATUS_ICONS['loot_report'], "alert": False, "available": False}
+
+    current_period = report_data["period"]["current_period"]
+    for player_name, tier_pieces in sorted(tier_data["table"].items(), key=lambda item: (item[1][0], item[0])):
+        class_display = class_display_for_player({"PlayerName": player_name, "Class": "Unknown"})
+        formatted_tier_display = format_tier_display(tier_pieces, tier_data["pieces"].get(player_name), TIER_EMOJI_MAP, TIER_EMOJI_FALLBACK,
+                                                     tier_gain(tier_data["progress"], player_name, current_period),
+                                                     weeks_to_set_bonus(tier_data["progress"], player_name), "denne uge")
+        tier_embed_description_part += f"{class_display} {player_name} {formatted_tier_display}\n"
+    return {"description": tier_embed_description_part, "color": 3447003, # Default Discord blue
+            "thumbnail": THUMBNAIL_STATUS_ICONS['loot_report'], "alert": False, "available": True}
+
+
+def render_season_summary_section(report_data):
+    """
+    Renders the season's M+ compliance per player from the season matrix (see backfill_mplus_season.py).
+    """
+    from backfill_mplus_season import build_season_summary
+
+    _, summary_description, summary_color = build_season_summary(report_data["season_matrix"], report_data["period"]["season_id"], DISCORD_ID_MAP)
+    return {"description": f"**M+ sæsonoversigt:**\n\n{summary_description}", "color": summary_color,
+            "thumbnail": THUMBNAIL_STATUS_ICONS['mplus_complete'], "alert": False,
+            "available": bool(report_data["season_matrix"]["periods"])}
+
+
+# --- Report Section Registry ---
+# Sections in REPORT_SECTIONS are rendered in the configured order. Only the data they list is loaded,
+# so e.g. REPORT_SECTIONS=mplus_previous sends an M+ reminder without touching loot history or the Google Sheet.
+# "sheet_writeback" renders nothing; it writes the loot counts and vault statuses of the selected sections back to the sheet.
+REPORT_SECTION_REGISTRY = {
+    "mplus_previous": {"data": ("mplus_previous",), "render": render_mplus_previous_section, "label": "M+"},
+    "mplus_current": {"data": ("mplus_current",), "render": render_mplus_current_section, "label": "M+ denne uge"},
+    "loot": {"data": ("loot",), "render": render_loot_section, "label": "loot"},
+    "tier": {"data": ("tier",), "render": render_tier_section, "label": "tier"},
+    "season_summary": {"data": ("season_matrix",), "render": render_season_summary_section, "label": "sæsonoversigt"},
+    "sheet_writeback": {"data": (), "render": None, "label": "sheet write-back"},
+}
+
+DEFAULT_REPORT_SECTIONS = ["mplus_previous", "loot", "tier", "sheet_writeback"]
+
+# Comma-separated section names, e.g. "mplus_previous" or "mplus_current,season_summary". Empty means the default.
+REPORT_SECTIONS = os.getenv('REPORT_SECTIONS')
+
+
+# --- Function to Parse the Configured Sections ---
+def parse_report_sections(spec):
+    """
+    Turns a REPORT_SECTIONS value into a list of known section names. Exits on unknown names.
+    """
+    if not spec or not spec.strip():
+        return list(DEFAULT_REPORT_SECTIONS)
+    sections = []
+    for name in (part.strip().lower() for part in spec.split(',')):
+        if not name or name in sections:
+            continue
+        if name not in REPORT_SECTION_REGISTRY:
+            print(f"Error: Unknown report section '{name}' in REPORT_SECTIONS. Known sections: {', '.join(REPORT_SECTION_REGISTRY)}.")
+            exit(1)
+        sections.append(name)
+    if not any(REPORT_SECTION_REGISTRY[name]["render"] for name in sections):
+        print(f"Error: REPORT_SECTIONS '{spec}' has no section that renders anything.")
+        exit(1)
+    return sections
+
+
+# --- Main Script Logic ---
+def main():
+    global DISCORD_ID_MAP
+
+    if not API_AUTHORIZATION_HEADER:
+        print("Error: WOWAUDIT_API_KEY environment variable is not set. Please configure it as a GitHub Secret.")
+        exit(1)
+    if not DISCORD_WEBHOOK_URL:
+        print("Error: DISCORD_WEBHOOK_URL environment variable is not set. Please configure it as a GitHub Secret.")
+        exit(1)
+
+    sections = parse_report_sections(REPORT_SECTIONS)
+    print(f"Report sections: {', '.join(sections)}")
+
+    # Update and load Discord ID map
+    update_discord_id_map_file(API_AUTHORIZATION_HEADER, DISCORD_ID_MAP_FILE)
+    try:
+        with open(DISCORD_ID_MAP_FILE, 'r', encoding='utf-8') as f:
+            DISCORD_ID_MAP = json.load(f)
+    except Exception as e:
+        print(f"Error loading Discord ID map after update attempt: {e}. Player classes/tags may be missing.")
+
+    # Load only the data the configured sections need
+    report_data = {"sections": sections}
+    require_report_data(report_data, "period")
+    for section_name in sections:
+        for data_name in REPORT_SECTION_REGISTRY[section_name]["data"]:
+            require_report_data(report_data, data_name)
+    current_period_from_api = report_data["period"]["current_period"]
+
+    # --- Write Season Loot Count and Last Week's Vault Status Back to the Google Sheet ---
+    # Only when selected, so the lightweight section sets do no sheet I/O at all
+    writeback_values = {}
+    if "sheet_writeback" in sections and "loot" in report_data:
+        writeback_values["loot_count"] = {player["PlayerName"]: player["LootCount"] for player in report_data["loot"]["players"]}
+    if "sheet_writeback" in sections and "mplus_previous" in report_data:
+        writeback_values["vault_status"] = report_data["mplus_previous"]["statuses"]
+    if writeback_values:
+        mark_stage("sheet write-back")
+        write_back_to_sheet(
+            GOOGLE_SHEET_URL,
+            GOOGLE_SHEET_WORKSHEET_NAME,
+            GOOGLE_SHEET_PLAYER_NAME_COLUMN,
+            configured_writeback_columns(writeback_values),
+            GOOGLE_SHEETS_CREDENTIALS_JSON
+        )
+
+    # --- Skip rendering and posting when nothing changed since the last delivered report ---
+    mark_stage("render and send")
+    report_key = f"combined:{current_period_from_api}"
+    if sections != DEFAULT_REPORT_SECTIONS:
+        report_key += f":{'+'.join(sections)}" # Other section sets get their own message
+    # Which sections are missing or served from cache is part of the inputs, so a later complete run re-renders
+    input_fingerprint = compute_fingerprint(report_data, DISCORD_ID_MAP, sorted(stale_sources()))
+    if fingerprint_unchanged(report_key, "inputs", input_fingerprint):
+        print(f"Report inputs unchanged since the last delivered '{report_key}' report. Skipping render and post (set FORCE_REPORT=true to override).")
+        return
+
+    rendered_sections = []
+    for section_name in sections:
+        render = REPORT_SECTION_REGISTRY[section_name]["render"]
+        rendered = render(report_data) if render else None
+        if rendered is not None:
+            rendered_sections.append((section_name, rendered))
+
     # --- Final Combined Discord Embed ---
-    final_embed_description = mplus_embed_description_part + loot_embed_description_part
+    final_embed_description = "\n\n".join(rendered["description"] for _, rendered in rendered_sections)
+
+    # Staleness marker: the report went out on time, but not everything upstream answered
+    missing_sections = [REPORT_SECTION_REGISTRY[name]["label"] for name, rendered in rendered_sections if not rendered["available"]]
+    cached_sources = sorted(stale_sources())
+    if missing_sections or cached_sources:
+        staleness_notes = []
+        if missing_sections:
+            staleness_notes.append(f"mangler {' og '.join(missing_sections)}")
+        if cached_sources:
+            staleness_notes.append(f"data fra tidligere kørsel for {', '.join(cached_sources)}")
+        final_embed_description += f"\n\n:warning: *Delvis rapport ({'; '.join(staleness_notes)}). Opdateres ved næste kørsel.*"
     final_embed_title = "Ugentlig Rapport"
-    final_embed_color = mplus_embed_color # Prioritize M+ status for overall color
-    final_thumbnail_url = mplus_thumbnail_url # Prioritize M+ status for overall thumbnail
 
-    # If M+ is complete but loot has issues, adjust color/thumbnail
-    if not mplus_players_to_report and any(p['LootCount'] == 0 for p in player_loot_data):
-        final_embed_color = loot_embed_color # Use loot color if M+ is green but loot is red
-        final_thumbnail_url = THUMBNAIL_STATUS_ICONS['loot_report'] # Use loot icon if loot is the issue
+    # The first section with something to act on sets the color and thumbnail, otherwise the first section
+    lead_section = next((rendered for _, rendered in rendered_sections if rendered["alert"]), rendered_sections[0][1])
+    final_embed_color = lead_section["color"]
+    final_thumbnail_url = lead_section["thumbnail"]
 
-    send_discord_webhook(
+    output_fingerprint = compute_fingerprint(final_embed_title, final_embed_description, final_embed_color, final_thumbnail_url)
+    if fingerprint_unchanged(report_key, "output", output_fingerprint):
+        print(f"Rendered '{report_key}' report is identical to the last delivered one. Skipping post.")
+        store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+    elif send_discord_webhook(
         final_embed_description,
         DISCORD_WEBHOOK_URL,
         embed_title=final_embed_title,
         embed_color=final_embed_color,
-        thumbnail_url=final_thumbnail_url
-    )
+        thumbnail_url=final_thumbnail_url,
+        report_key=report_key
+    ):
+        store_fingerprints(report_key, input_fingerprint, output_fingerprint)
+    else:
+        exit(1) # Fail the job, so a re-run can pick up from the run checkpoint with --resume
 
 
 if __name__ == "__main__":
-    main()
+    run_entry_point(main, "combined_report")
@@ -0,0 +1,106 @@
+import requests
+import json
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from report_state import load_state, save_state
+from run_budget import delivery_timeout_seconds
+from run_metrics import inc_counter, set_gauge
+from run_checkpoint import load_json_checkpoint, save_json_checkpoint
+
+# --- Configuration ---
+# State file mapping a report key (report type + period) to the Discord message that shows it.
+DISCORD_MESSAGES_STATE = 'discord_messages'
+
+
+# --- Function to Extract the Webhook ID From a Webhook URL ---
+def webhook_id_from_url(webhook_url):
+    """
+    Returns the webhook id from a URL like https://discord.com/api/webhooks/{id}/{token}, or None.
+    """
+    path_parts = [part for part in urlsplit(webhook_url).path.split('/') if part]
+    if 'webhooks' in path_parts:
+        index = path_parts.index('webhooks')
+        if len(path_parts) > index + 1:
+            return path_parts[index + 1]
+    return None
+
+
+# --- Function to Build a Webhook URL With Extra Path/Query ---
+def _webhook_url(webhook_url, extra_path="", extra_query=None):
+    """
+    Appends a path suffix and query parameters to a webhook URL, keeping any query it already has
+    (e.g., thread_id, which Discord needs on both the POST and the PATCH).
+    """
+    parts = urlsplit(webhook_url)
+    query = parse_qsl(parts.query)
+    query.extend((extra_query or {}).items())
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/') + extra_path, urlencode(query), parts.fragment))
+
+
+# --- Function to Post or Edit a Report Message ---
+def deliver_discord_payload(webhook_url, payload, report_key=None):
+    """
+    Delivers a webhook payload, keeping one live message per report key.
+
+    Without a report_key the payload is simply posted. With a report_key, the message id stored for that
+    key is edited in place (PATCH /webhooks/{id}/{token}/messages/{message_id}). If there is no stored
+    message, it belongs to another webhook, or it was deleted in Discord, a new message is posted with
+    ?wait=true and its id is stored for the next run.
+
+    The payload and, after delivery, a receipt are checkpointed per report key. A resumed run sends the
+    payload exactly as first rendered, and does not deliver again once a receipt exists.
+
+    Returns:
+        str: The id of the message that now shows the payload (None if Discord did not return one).
+
+    Raises:
+        requests.exceptions.RequestException: If Discord rejects the request.
+    """
+    if report_key:
+        receipt = load_json_checkpoint("delivery", report_key)
+        if receipt is not None:
+            print(f"Report '{report_key}' was already delivered in this run (message {receipt['message_id']}). Not sending it again.")
+            return receipt["message_id"]
+        rendered = load_json_checkpoint("embeds", report_key)
+        if rendered is not None:
+            print(f"DEBUG: Delivering the payload for '{report_key}' as rendered by the earlier attempt.")
+            payload = rendered
+        save_json_checkpoint("embeds", report_key, payload)
+
+    set_gauge("discord_payload_bytes", "Size of the last Discord payload per report type", len(json.dumps(payload).encode('utf-8')),
+              report=report_key.split(':')[0] if report_key else "none")
+    message_id = _post_or_edit(webhook_url, payload, report_key)
+    if report_key:
+        save_json_checkpoint("delivery", report_key, {"message_id": message_id})
+    return message_id
+
+
+def _post_or_edit(webhook_url, payload, report_key):
+    webhook_id = webhook_id_from_url(webhook_url)
+    messages = load_state(DISCORD_MESSAGES_STATE, {}) if report_key else {}
+    stored = messages.get(report_key) if report_key else None
+
+    if stored and stored.get("webhook_id") == webhook_id and stored.get("message_id"):
+        message_id = stored["message_id"]
+        print(f"DEBUG: Editing existing Discord message {message_id} for report '{report_key}'.")
+        response = requests.patch(_webhook_url(webhook_url, f"/messages/{message_id}"), json=payload, timeout=delivery_timeout_seconds())
+        inc_counter("discord_requests", "Discord webhook requests by method and HTTP status", method="PATCH", status=str(response.status_code))
+        if response.status_code == 404:
+            print(f"Warning: Discord message {message_id} for report '{report_key}' no longer exists. Posting a new one.")
+        else:
+            response.raise_for_status()
+            return message_id
+
+    response = requests.post(_webhook_url(webhook_url, extra_query={"wait": "true"}), json=payload, timeout=delivery_timeout_seconds())
+    inc_counter("discord_requests", "Discord webhook requests by method and HTTP status", method="POST", status=str(response.status_code))
+    response.raise_for_status()
+    message_id = None
+    try:
+        message_id = response.json().get("id")
+    except ValueError:
+        print("Warning: Discord did not return the created message. It cannot be edited on later runs.")
+
+    if report_key and message_id:
+        messages[report_key] = {"webhook_id": webhook_id, "message_id": message_id}
+        save_state(DISCORD_MESSAGES_STATE, messages)
+    return message_id
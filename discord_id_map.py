@@ -0,0 +1,217 @@
+import requests
+import argparse
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_characters
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Not available on Windows; the map is then updated without a file lock
+
+# Several report jobs update discord_id_map.json. Instead of rewriting the file from the roster, each
+# job computes a field-level changeset against the map it read and merges it three-way into the current
+# file: a field is only written if it still holds the value the changeset was computed from. Manually
+# entered discord_id values are never overwritten. The changeset is also written next to the map, so the
+# workflows can re-apply it on top of a freshly pulled map when their push races another job.
+
+
+# --- Function to Build the Changeset Path ---
+def changeset_path(map_file_path):
+    """
+    Returns the changeset file written next to the map, e.g. discord_id_map.changeset.json.
+    """
+    return f"{os.path.splitext(map_file_path)[0]}.changeset.json"
+
+
+# --- Function to Lock the Map File ---
+@contextmanager
+def map_file_lock(map_file_path):
+    """
+    Holds an exclusive lock on <map>.lock for the duration of a read-merge-write cycle.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{map_file_path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# --- Function to Load the Map ---
+def load_discord_id_map(map_file_path):
+    """
+    Loads the map, or returns an empty one if the file is missing or invalid.
+    """
+    if not os.path.exists(map_file_path):
+        print(f"'{map_file_path}' not found. A new map will be created.")
+        return {}
+    with open(map_file_path, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print(f"Warning: '{map_file_path}' is not a valid JSON file. Starting with an empty map.")
+            return {}
+
+
+# --- Function to Write a JSON File Atomically ---
+def write_json_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- Function to Get a Field From a Map Entry ---
+def _entry_field(entry, field):
+    """
+    Reads a field from a map entry. Old-format entries are a bare Discord ID string.
+    A missing entry or field reads as None.
+    """
+    if isinstance(entry, str):
+        return entry if field == "discord_id" else None
+    if isinstance(entry, dict):
+        return entry.get(field)
+    return None
+
+
+# --- Function to Diff the Map Against the Roster ---
+def compute_map_changeset(base_map, api_characters):
+    """
+    Computes the field-level changes that bring the map in line with the roster.
+    New characters get a null discord_id and their class; existing characters get their class updated.
+
+    Returns:
+        list: Changes as {"name", "field", "base", "value"}, where "base" is the value the change was computed from.
+    """
+    changeset = []
+    for character in api_characters:
+        entry = base_map.get(character.name)
+        if entry is not None and not isinstance(entry, (str, dict)):
+            print(f"Warning: Unexpected format for '{character.name}' in map. Skipping class update.")
+            continue
+        if not isinstance(entry, dict) or "discord_id" not in entry:
+            # New character, old string format or missing key: make sure the entry has a discord_id field
+            current_id = _entry_field(entry, "discord_id")
+            changeset.append({"name": character.name, "field": "discord_id", "base": current_id, "value": current_id})
+        if _entry_field(entry, "class") != character.character_class:
+            changeset.append({"name": character.name, "field": "class", "base": _entry_field(entry, "class"), "value": character.character_class})
+    return changeset
+
+
+# --- Function to Merge a Changeset Into the Current Map ---
+def apply_map_changeset(current_map, changeset):
+    """
+    Three-way merge of a changeset into the current map. A change is applied when the field still
+    holds its base value; if someone else changed the field in the meantime, their value is kept.
+
+    Returns:
+        tuple: (merged map, number of applied changes, number of conflicts kept as-is).
+    """
+    merged = dict(current_map)
+    applied = conflicts = 0
+    for change in changeset:
+        name, field = change["name"], change["field"]
+        entry = merged.get(name)
+        current_value = _entry_field(entry, field)
+        present = isinstance(entry, dict) and field in entry
+
+        if present and current_value == change["value"]:
+            continue # Already in the desired state
+        if current_value != change["base"]:
+            conflicts += 1
+            print(f"Keeping concurrent edit of '{name}'.{field} ({current_value!r}) instead of {change['value']!r}.")
+            continue
+
+        if isinstance(entry, str):
+            entry = {"discord_id": entry} # Convert old format to the dict format
+        elif not isinstance(entry, dict):
+            entry = {}
+        merged[name] = {**entry, field: change["value"]}
+        applied += 1
+        print(f"Set '{name}'.{field} = {change['value']!r}.")
+    return merged, applied, conflicts
+
+
+# --- Function to Merge a Changeset Into the Map File ---
+def merge_changeset_into_file(map_file_path, changeset):
+    """
+    Applies a changeset to the map file under the file lock.
+
+    Returns:
+        bool: True if the file was changed.
+    """
+    with map_file_lock(map_file_path):
+        merged, applied, conflicts = apply_map_changeset(load_discord_id_map(map_file_path), changeset)
+        if applied:
+            write_json_atomic(map_file_path, merged)
+    print(f"Merged Discord ID map changeset: {applied} applied, {conflicts} kept from concurrent edits.")
+    return applied > 0
+
+
+# --- Function to Update Discord ID Mapping File ---
+def update_discord_id_map_file(api_auth_header, map_file_path):
+    """
+    Fetches character names and classes from WoW Audit API and merges them into the Discord ID map file.
+    New characters are added with a null Discord ID and their class.
+    Existing entries are updated with class info if missing or different, and converted to new format if old.
+    The changeset is written next to the map (see changeset_path) for the workflow's push retry.
+    """
+    print(f"Attempting to update Discord ID map file: {map_file_path}")
+
+    try:
+        api_characters = decode_characters(fetch_wowaudit('/characters', api_auth_header))
+        print(f"Successfully fetched {len(api_characters)} characters from WoW Audit API.")
+
+        # Diff against the map as read now; the merge below re-reads it under the lock
+        changeset = compute_map_changeset(load_discord_id_map(map_file_path), api_characters)
+        if not changeset:
+            if os.path.exists(changeset_path(map_file_path)):
+                os.remove(changeset_path(map_file_path))
+            print("No changes needed for the Discord ID map.")
+            return False
+
+        write_json_atomic(changeset_path(map_file_path), changeset)
+        changes_made = merge_changeset_into_file(map_file_path, changeset)
+        if changes_made:
+            print(f"Discord ID map '{map_file_path}' updated successfully.")
+            print("Remember to manually update the 'discord_id' for new/updated entries in this file.")
+        return changes_made
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error: Failed to fetch characters from WoW Audit API for map update: {e}")
+        if e.response is not None:
+            print(f"Response Content: {e.response.text}")
+        return False
+    except Exception as e:
+        print(f"Error: An unexpected error occurred during map update: {e}")
+        return False
+
+
+# --- Command Line: Re-apply a Changeset ---
+def main():
+    parser = argparse.ArgumentParser(description="Merge a Discord ID map changeset into the map file.")
+    parser.add_argument("map_file", help="Path to discord_id_map.json")
+    parser.add_argument("changeset_file", help="Changeset written by update_discord_id_map_file")
+    args = parser.parse_args()
+
+    with open(args.changeset_file, 'r', encoding='utf-8') as f:
+        changeset = json.load(f)
+    merge_changeset_into_file(args.map_file, changeset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import requests
+import csv
+import os
+import shutil
+import tempfile
+from bisect import bisect_right
+from itertools import islice
+
+from loot_timeseries import build_period_starts, parse_awarded_at
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_characters, decode_historical_data, decode_loot_history
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None # Parquet output is optional; CSV is always written
+
+# --- Configuration ---
+API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
+
+# Output directory. CSV and Parquet go to separate trees with the same hive-style partitions:
+#   exports/csv/vault/season_id=14/period=1001/part-0.csv
+#   exports/parquet/vault/season_id=14/period=1001/part-0.parquet
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+
+# Rows are written in chunks of this size, so no dataset is ever held in memory as a whole.
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+
+# First period of the keystone season. Taken from /v1/period (current_season.first_period_id) when unset.
+SEASON_FIRST_PERIOD = os.getenv('SEASON_FIRST_PERIOD')
+
+# Columns per dataset as (name, pyarrow type factory). Partition columns (season_id, period) are part of the
+# directory name; they are repeated in the CSV files for spreadsheet users but left out of Parquet files,
+# where readers take them from the hive partition path.
+EXPORT_COLUMNS = {
+    "roster": [("character_id", "int64"), ("name", "string"), ("class", "string")],
+    "vault": [("season_id", "int64"), ("period", "int64"), ("character_id", "int64"), ("name", "string"),
+              ("option_1", "int64"), ("option_2", "int64"), ("option_3", "int64")],
+    "loot": [("season_id", "int64"), ("period", "int64"), ("id", "int64"), ("character_id", "int64"), ("item_id", "int64"),
+             ("name", "string"), ("response_type", "string"), ("discarded", "bool_"), ("difficulty", "string"),
+             ("slot", "string"), ("awarded_at", "string")],
+}
+PARTITION_COLUMNS = ("season_id", "period")
+
+
+# --- Function to Build a Partition Directory Path ---
+def partition_dir(file_format, dataset, partition):
+    """
+    Returns the directory of one partition, e.g. exports/csv/vault/season_id=14/period=1001.
+
+    Args:
+        file_format (str): "csv" or "parquet".
+        dataset (str): Key of EXPORT_COLUMNS.
+        partition (dict): Partition values in order, e.g. {"season_id": 14, "period": 1001}. Empty for unpartitioned data.
+    """
+    return os.path.join(EXPORT_DIR, file_format, dataset, *(f"{key}={value}" for key, value in partition.items()))
+
+
+# --- Function to List the Output Formats ---
+def export_formats():
+    """
+    Returns the formats this environment can write: CSV always, Parquet when pyarrow is installed.
+    """
+    return ["csv", "parquet"] if pyarrow is not None else ["csv"]
+
+
+# --- Function to List Formats Still Missing for a Partition ---
+def missing_formats(dataset, partition):
+    """
+    Returns the output formats for which a partition has not been written yet.
+    """
+    return [file_format for file_format in export_formats() if not os.path.isdir(partition_dir(file_format, dataset, partition))]
+
+
+# --- Function to Stream Rows Into a Partition ---
+def write_partition(dataset, partition, rows, formats=None, replace=False):
+    """
+    Writes rows to one partition in chunks of EXPORT_CHUNK_ROWS. Each format is written to a temporary
+    directory and moved into place at the end, so an interrupted run never leaves a partial partition
+    that a later run would mistake for a finished one.
+
+    Args:
+        dataset (str): Key of EXPORT_COLUMNS.
+        partition (dict): Partition values, see partition_dir.
+        rows (iterable): Tuples in EXPORT_COLUMNS order. Consumed lazily.
+        formats (list, optional): Formats to write. Defaults to the ones missing for this partition.
+        replace (bool): Overwrite a partition that already exists (used for the unpartitioned roster).
+
+    Returns:
+        int: Number of rows written.
+    """
+    formats = formats if formats is not None else missing_formats(dataset, partition)
+    if not formats:
+        return 0
+
+    columns = EXPORT_COLUMNS[dataset]
+    parquet_indexes = [i for i, (name, _) in enumerate(columns) if name not in PARTITION_COLUMNS]
+    staging = {}
+    csv_file = csv_writer = parquet_writer = None
+    for file_format in formats:
+        final_dir = partition_dir(file_format, dataset, partition)
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        staging[file_format] = tempfile.mkdtemp(dir=os.path.dirname(final_dir), prefix=".tmp-")
+
+    row_count = 0
+    try:
+        if "csv" in staging:
+            csv_file = open(os.path.join(staging["csv"], "part-0.csv"), 'w', newline='', encoding='utf-8')
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow([name for name, _ in columns])
+        if "parquet" in staging:
+            schema = pyarrow.schema([(columns[i][0], getattr(pyarrow, columns[i][1])()) for i in parquet_indexes])
+            parquet_writer = pyarrow.parquet.ParquetWriter(os.path.join(staging["parquet"], "part-0.parquet"), schema)
+
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, EXPORT_CHUNK_ROWS))
+            if not chunk:
+                break
+            row_count += len(chunk)
+            if csv_writer:
+                csv_writer.writerows(chunk)
+            if parquet_writer:
+                arrays = [pyarrow.array([row[i] for row in chunk], type=schema.field(j).type) for j, i in enumerate(parquet_indexes)]
+                parquet_writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+    except BaseException:
+        for staging_dir in staging.values():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    finally:
+        if csv_file:
+            csv_file.close()
+        if parquet_writer:
+            parquet_writer.close()
+
+    for file_format, staging_dir in staging.items():
+        final_dir = partition_dir(file_format, dataset, partition)
+        if replace and os.path.isdir(final_dir):
+            shutil.rmtree(final_dir)
+        os.replace(staging_dir, final_dir)
+    return row_count
+
+
+# --- Row Generators ---
+def roster_rows(characters):
+    for character in characters:
+        yield (character.id, character.name, character.character_class)
+
+
+def vault_rows(season_id, period, snapshots):
+    for snapshot in snapshots:
+        yield (season_id, period, snapshot.character_id, snapshot.name, snapshot.option_1, snapshot.option_2, snapshot.option_3)
+
+
+def loot_rows(season_id, period, loot_entries):
+    for entry in loot_entries:
+        yield (season_id, period, entry.id, entry.character_id, entry.item_id, entry.name, entry.response_type,
+               entry.discarded, entry.difficulty, entry.slot, entry.awarded_at)
+
+
+# --- Function to Group Loot Entries by Period ---
+def loot_entries_by_period(loot_entries, first_period, current_period):
+    """
+    Assigns each loot entry to its period from its awarded_at timestamp.
+
+    Returns:
+        dict: {period: [LootEntry, ...]}. Entries without a timestamp or before first_period are dropped.
+    """
+    starts = build_period_starts(first_period, current_period)
+    by_period = {}
+    for entry in loot_entries:
+        awarded_ts = parse_awarded_at(entry.awarded_at)
+        if awarded_ts is None:
+            continue
+        period_index = bisect_right(starts, awarded_ts) - 1
+        if period_index >= 0:
+            by_period.setdefault(first_period + period_index, []).append(entry)
+    return by_period
+
+
+# --- Main Script Logic ---
+def main():
+    if not API_AUTHORIZATION_HEADER:
+        print("Error: WOWAUDIT_API_KEY environment variable is not set. Please configure it as a GitHub Secret.")
+        exit(1)
+    if pyarrow is None:
+        print("Warning: pyarrow is not installed. Only CSV files will be written.")
+
+    try:
+        period_data = get_period_data(API_AUTHORIZATION_HEADER)
+    except requests.exceptions.RequestException as e:
+        print(f"Error: An error occurred while fetching period data: {e}")
+        exit(1)
+
+    current_period = period_data.get("current_period")
+    current_season = period_data.get("current_season") or {}
+    season_id = current_season.get("keystone_season_id")
+    first_period = int(SEASON_FIRST_PERIOD) if SEASON_FIRST_PERIOD else current_season.get("first_period_id")
+    if current_period is None or season_id is None or first_period is None:
+        print("Error: Could not determine current period, keystone_season_id or the season's first period. "
+              "Set SEASON_FIRST_PERIOD if /v1/period does not return current_season.first_period_id.")
+        exit(1)
+
+    # Only finished periods are exported; their data no longer changes, so each partition is written once.
+    finished_periods = range(first_period, current_period)
+
+    # Roster: small and always current, so it is rewritten on every run.
+    try:
+        characters = decode_characters(fetch_wowaudit('/characters', API_AUTHORIZATION_HEADER))
+        written = write_partition("roster", {}, roster_rows(characters), formats=export_formats(), replace=True)
+        print(f"Exported {written} roster rows.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error: An error occurred while fetching characters data: {e}")
+        exit(1)
+
+    # Vault options: one partition per period, fetched one period at a time.
+    for period in finished_periods:
+        partition = {"season_id": season_id, "period": period}
+        formats = missing_formats("vault", partition)
+        if not formats:
+            continue
+        try:
+            snapshots = decode_historical_data(fetch_wowaudit(f"/historical_data?period={period}", API_AUTHORIZATION_HEADER))
+        except requests.exceptions.RequestException as e:
+            print(f"Error: Failed to fetch historical data for period {period}: {e}. It will be retried on the next run.")
+            continue
+        written = write_partition("vault", partition, vault_rows(season_id, period, snapshots), formats)
+        print(f"Exported {written} vault rows for period {period} ({', '.join(formats)}).")
+
+    # Loot history: one request for the season, split into period partitions.
+    pending_loot_periods = [p for p in finished_periods if missing_formats("loot", {"season_id": season_id, "period": p})]
+    if not pending_loot_periods:
+        print("All finished loot periods are already exported.")
+        return
+    try:
+        loot_entries = decode_loot_history(fetch_wowaudit(f"/loot_history/{season_id}", API_AUTHORIZATION_HEADER))
+    except requests.exceptions.RequestException as e:
+        print(f"Error: An error occurred while fetching loot history: {e}")
+        exit(1)
+
+    loot_by_period = loot_entries_by_period(loot_entries, first_period, current_period)
+    for period in pending_loot_periods:
+        partition = {"season_id": season_id, "period": period}
+        written = write_partition("loot", partition, loot_rows(season_id, period, loot_by_period.get(period, [])))
+        print(f"Exported {written} loot rows for period {period}.")
+
+
+if __name__ == "__main__":
+    main()
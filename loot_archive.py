@@ -0,0 +1,382 @@
+import requests
+import argparse
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+
+from loot_store import LOOT_STORE_NAME, load_stored_season, open_loot_store, stored_season_ids
+from loot_timeseries import parse_awarded_at
+from report_state import REPORT_STATE_DIR, state_file_path
+from period_calendar import get_period_data
+from wowaudit_api import fetch_wowaudit
+from wowaudit_records import decode_characters, decode_loot_history
+
+# Finished seasons' loot history never changes, so it is packed once into a compact binary file per season
+# in REPORT_STATE_DIR. The files are opened with mmap and their columns read through memoryviews, so a
+# query over every archived season only touches the pages it reads instead of parsing JSON into dicts.
+#
+# File layout (little-endian):
+#   header      magic b"WALOOT01", version, row count, season id, dictionary length (HEADER_STRUCT)
+#   columns     one fixed-width array per ARCHIVE_COLUMNS entry, each starting on an 8-byte boundary
+#   dictionary  UTF-8 JSON with the strings the code columns index into, plus character and item names
+#
+# Examples:
+#   python loot_archive.py                  # Archive every finished season in the loot store, and the previous season
+#   python loot_archive.py --season 13 14   # Archive specific seasons (downloaded if the loot store lacks them)
+#   python query_loot.py --archived --group-by season difficulty
+
+# --- Configuration ---
+API_AUTHORIZATION_HEADER = os.getenv('WOWAUDIT_API_KEY')
+
+ARCHIVE_MAGIC = b"WALOOT01"
+ARCHIVE_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sIIII")
+ARCHIVE_ALIGNMENT = 8
+
+# Fixed-width columns in file order as (name, array typecode). Code columns are indexes into the
+# dictionary list of the same name; code 0 is always "no value". awarded_at is UTC seconds, 0 if unknown.
+ARCHIVE_COLUMNS = (
+    ("character_id", "i"),
+    ("item_id", "i"),
+    ("awarded_at", "q"),
+    ("response_type", "B"),
+    ("difficulty", "B"),
+    ("slot", "B"),
+    ("discarded", "B"),
+)
+CODE_COLUMNS = ("response_type", "difficulty", "slot")
+
+ARCHIVE_NAME_PATTERN = re.compile(r"loot_archive_season_(\d+)\.bin$")
+
+
+# --- Function to Build an Archive Path ---
+def archive_path(season_id):
+    """
+    Returns the archive file of a season, e.g. report_state/loot_archive_season_13.bin.
+    """
+    return state_file_path(f"loot_archive_season_{season_id}", extension="bin")
+
+
+# --- Function to List Archived Seasons ---
+def archived_season_ids():
+    """
+    Returns the ids of all seasons with an archive file, oldest first.
+    """
+    season_ids = []
+    for path in glob.glob(os.path.join(REPORT_STATE_DIR, "loot_archive_season_*.bin")):
+        match = ARCHIVE_NAME_PATTERN.search(os.path.basename(path))
+        if match:
+            season_ids.append(int(match.group(1)))
+    return sorted(season_ids)
+
+
+# --- Function to Pack a Season Into an Archive ---
+def write_loot_archive(season_id, loot_entries, character_names):
+    """
+    Packs a season's loot entries into its archive file. The file is written next to the target and
+    moved into place, so readers never see a partial archive.
+
+    Args:
+        season_id (int): The finished keystone season.
+        loot_entries (list): LootEntry records of the whole season.
+        character_names (dict): {character_id: name} for the recipients.
+
+    Returns:
+        str: Path of the written archive.
+
+    Raises:
+        ValueError: If a code column has more distinct values than fit in one byte.
+    """
+    dictionary = {column: [None] for column in CODE_COLUMNS}
+    code_lookup = {column: {None: 0} for column in CODE_COLUMNS}
+    columns = {name: array(typecode) for name, typecode in ARCHIVE_COLUMNS}
+    item_names = {}
+
+    for entry in loot_entries:
+        columns["character_id"].append(entry.character_id if isinstance(entry.character_id, int) else 0)
+        columns["item_id"].append(entry.item_id if isinstance(entry.item_id, int) else 0)
+        columns["awarded_at"].append(int(parse_awarded_at(entry.awarded_at) or 0))
+        columns["discarded"].append(int(bool(entry.discarded)))
+        for column in CODE_COLUMNS:
+            value = getattr(entry, column)
+            code = code_lookup[column].get(value)
+            if code is None:
+                code = len(dictionary[column])
+                if code > 255:
+                    raise ValueError(f"Season {season_id} has more than 255 distinct {column} values.")
+                code_lookup[column][value] = code
+                dictionary[column].append(value)
+            columns[column].append(code)
+        if isinstance(entry.item_id, int) and entry.name:
+            item_names[str(entry.item_id)] = entry.name
+
+    recipient_ids = set(columns["character_id"])
+    dictionary["characters"] = {str(char_id): name for char_id, name in character_names.items() if char_id in recipient_ids}
+    dictionary["items"] = item_names
+    dictionary_bytes = json.dumps(dictionary, ensure_ascii=False).encode('utf-8')
+
+    path = archive_path(season_id)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER_STRUCT.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(loot_entries), season_id, len(dictionary_bytes)))
+            for name, _ in ARCHIVE_COLUMNS:
+                f.write(b"\0" * (-f.tell() % ARCHIVE_ALIGNMENT))
+                data = columns[name]
+                if sys.byteorder != "little":
+                    data.byteswap()
+                data.tofile(f)
+            f.write(dictionary_bytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+# --- Memory-Mapped Reader for One Season ---
+class LootArchive:
+    """
+    Read-only view of one season's archive. Columns are memoryviews over the mapped file, so opening an
+    archive reads only the header and dictionary; column pages are loaded by the OS as they are scanned.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = None
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.row_count, self.season_id, dictionary_length = HEADER_STRUCT.unpack_from(self._mmap, 0)
+            if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+                raise ValueError(f"'{path}' is not a version {ARCHIVE_VERSION} loot archive.")
+
+            self._views = []
+            self.columns = {}
+            offset = HEADER_STRUCT.size
+            for name, typecode in ARCHIVE_COLUMNS:
+                offset += -offset % ARCHIVE_ALIGNMENT
+                size = array(typecode).itemsize * self.row_count
+                raw = memoryview(self._mmap)[offset:offset + size]
+                self._views.append(raw)
+                if sys.byteorder == "little":
+                    column = raw.cast(typecode)
+                    self._views.append(column)
+                else:
+                    column = array(typecode) # Big-endian hosts get a swapped copy instead of a view
+                    column.frombytes(raw)
+                    column.byteswap()
+                self.columns[name] = column
+                offset += size
+            self.dictionary = json.loads(bytes(self._mmap[offset:offset + dictionary_length]).decode('utf-8'))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.row_count
+
+    def close(self):
+        # Views must be released before the map can be closed
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        self.columns = {}
+        if self._mmap is not None and not self._mmap.closed:
+            self._mmap.close()
+
+    # --- Value Decoding ---
+    def character_name(self, character_id):
+        return self.dictionary["characters"].get(str(character_id)) or f"Ukendt ({character_id})"
+
+    def item_name(self, item_id):
+        return self.dictionary["items"].get(str(item_id))
+
+    def code_value(self, column, code):
+        return self.dictionary[column][code]
+
+    def codes_matching(self, column, value):
+        """
+        Returns the codes of a code column whose value equals `value`, ignoring case.
+        """
+        wanted = str(value).lower()
+        return {code for code, text in enumerate(self.dictionary[column]) if text is not None and text.lower() == wanted}
+
+    # --- Scanning ---
+    def matching_rows(self, character=None, item_id=None, slot=None, difficulty=None, response_type=None, discarded=None):
+        """
+        Yields the row indexes matching all given filters (same meaning as in loot_store.query_loot).
+        Filters are turned into integer sets up front, so the scan compares fixed-width values only.
+        """
+        checks = []
+        if character is not None:
+            wanted = character.lower()
+            ids = {int(char_id) for char_id, name in self.dictionary["characters"].items() if name.lower() == wanted}
+            checks.append((self.columns["character_id"], ids))
+        if item_id is not None:
+            checks.append((self.columns["item_id"], {item_id}))
+        for column, value in (("slot", slot), ("difficulty", difficulty), ("response_type", response_type)):
+            if value is not None:
+                checks.append((self.columns[column], self.codes_matching(column, value)))
+        if discarded is not None:
+            checks.append((self.columns["discarded"], {int(discarded)}))
+
+        if any(not allowed for _, allowed in checks):
+            return # A filter value that never occurs in this season
+        for row in range(self.row_count):
+            if all(column[row] in allowed for column, allowed in checks):
+                yield row
+
+    def group_value(self, key, row):
+        """
+        Returns the value of a LOOT_GROUP_COLUMNS key for one row, decoded like the loot store shows it.
+        """
+        if key == "season":
+            return self.season_id
+        if key == "character":
+            return self.character_name(self.columns["character_id"][row])
+        if key == "item":
+            return self.item_name(self.columns["item_id"][row])
+        if key == "discarded":
+            return self.columns["discarded"][row]
+        return self.code_value(key, self.columns[key][row])
+
+    def row_values(self, row):
+        """
+        Returns one row in the column order of query_loot's listing (season instead of the loot id).
+        """
+        awarded_at = self.columns["awarded_at"][row]
+        item_id = self.columns["item_id"][row]
+        return (
+            self.season_id,
+            datetime.fromtimestamp(awarded_at, timezone.utc).isoformat() if awarded_at else None,
+            self.character_name(self.columns["character_id"][row]),
+            item_id or None,
+            self.item_name(item_id),
+            self.code_value("slot", self.columns["slot"][row]),
+            self.code_value("difficulty", self.columns["difficulty"][row]),
+            self.code_value("response_type", self.columns["response_type"][row]),
+            self.columns["discarded"][row],
+        )
+
+
+# --- Function to Query the Archives ---
+def query_loot_archives(season_id=None, group_by=None, **filters):
+    """
+    Queries the archived seasons with the same filters and result shape as loot_store.query_loot.
+
+    Args:
+        season_id (int, optional): Only this archived season. Defaults to all archived seasons.
+        group_by (list, optional): Keys of LOOT_GROUP_COLUMNS to count by instead of listing entries.
+        **filters: character, item_id, slot, difficulty, response_type, discarded.
+
+    Returns:
+        tuple: (column names, list of result rows).
+    """
+    season_ids = [season_id] if season_id is not None else archived_season_ids()
+    counts = Counter()
+    rows = []
+    for archived_season in season_ids:
+        path = archive_path(archived_season)
+        if not os.path.exists(path):
+            continue
+        with LootArchive(path) as archive:
+            for row in archive.matching_rows(**filters):
+                if group_by:
+                    counts[tuple(archive.group_value(key, row) for key in group_by)] += 1
+                else:
+                    rows.append(archive.row_values(row))
+
+    if group_by:
+        ordered = sorted(counts.items(), key=lambda item: (-item[1], tuple("" if v is None else str(v) for v in item[0])))
+        return list(group_by) + ["count"], [group + (count,) for group, count in ordered]
+    columns = ["season", "awarded_at", "character", "item_id", "item", "slot", "difficulty", "response_type", "discarded"]
+    return columns, rows
+
+
+# --- Function to Load a Season for Compaction ---
+def load_season_for_archive(season_id, conn, store_seasons, character_names):
+    """
+    Returns a season's (loot entries, character names), read from the loot store when it has the
+    season and downloaded from /v1/loot_history/{season_id} otherwise.
+    """
+    if season_id in store_seasons:
+        print(f"Reading season {season_id} from the local loot store.")
+        return load_stored_season(conn, season_id)
+
+    if not API_AUTHORIZATION_HEADER:
+        raise requests.exceptions.RequestException(f"Season {season_id} is not in the loot store and WOWAUDIT_API_KEY is not set.")
+    print(f"Downloading loot history for season {season_id}.")
+    loot_entries = decode_loot_history(fetch_wowaudit(f"/loot_history/{season_id}", API_AUTHORIZATION_HEADER))
+    if not character_names:
+        character_names.update({c.id: c.name for c in decode_characters(fetch_wowaudit('/characters', API_AUTHORIZATION_HEADER))})
+    return loot_entries, character_names
+
+
+# --- Main Script Logic ---
+def main():
+    parser = argparse.ArgumentParser(description="Pack finished seasons' loot history into memory-mapped archives.")
+    parser.add_argument("--season", type=int, nargs="+", help="Season ids to archive. Defaults to every finished season in the loot store and the previous season.")
+    parser.add_argument("--force", action="store_true", help="Rewrite archives that already exist")
+    args = parser.parse_args()
+
+    current_season_id = None
+    if API_AUTHORIZATION_HEADER:
+        try:
+            current_season_id = (get_period_data(API_AUTHORIZATION_HEADER).get("current_season") or {}).get("keystone_season_id")
+        except requests.exceptions.RequestException as e:
+            print(f"Warning: Could not fetch period data: {e}.")
+    if current_season_id is None and not args.season:
+        print("Error: Could not determine the current season. Set WOWAUDIT_API_KEY or pass --season.")
+        exit(1)
+
+    store_path = state_file_path(LOOT_STORE_NAME, extension="sqlite")
+    conn = open_loot_store(store_path)
+    try:
+        store_seasons = set(stored_season_ids(conn))
+        if args.season:
+            season_ids = args.season
+        else:
+            season_ids = sorted({s for s in store_seasons if s < current_season_id} | {current_season_id - 1})
+        if current_season_id in season_ids:
+            print(f"Error: Season {current_season_id} is still running and cannot be archived.")
+            exit(1)
+
+        character_names = {}
+        for season_id in season_ids:
+            if not args.force and os.path.exists(archive_path(season_id)):
+                print(f"Season {season_id} is already archived.")
+                continue
+            try:
+                loot_entries, names = load_season_for_archive(season_id, conn, store_seasons, character_names)
+            except requests.exceptions.RequestException as e:
+                print(f"Error: Could not load loot history for season {season_id}: {e}")
+                continue
+            if not loot_entries:
+                print(f"Season {season_id} has no loot entries. Nothing to archive.")
+                continue
+            path = write_loot_archive(season_id, loot_entries, names)
+            print(f"Archived {len(loot_entries)} loot entries for season {season_id} in '{path}' ({os.path.getsize(path)} bytes).")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
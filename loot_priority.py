@@ -0,0 +1,134 @@
+import os
+
+from report_state import load_state
+
+# --- Configuration ---
+# Weights of the priority components, e.g. "loot=1,tier=1,recent=1,mplus=0.5". Missing keys keep their default.
+#   loot:   fewer items this season  -> higher priority
+#   tier:   fewer tier pieces (x/5)  -> higher priority
+#   recent: fewer items in the last RECENT_LOOT_WEEKS resets -> higher priority
+#   mplus:  higher M+ vault compliance this season -> higher priority
+DEFAULT_PRIORITY_WEIGHTS = {"loot": 1.0, "tier": 1.0, "recent": 1.0, "mplus": 0.5}
+LOOT_PRIORITY_WEIGHTS = os.getenv('LOOT_PRIORITY_WEIGHTS', '')
+
+# Number of players shown in the ranked priority list of the loot embed.
+LOOT_PRIORITY_LIST_SIZE = int(os.getenv('LOOT_PRIORITY_LIST_SIZE', '10'))
+
+# State written by backfill_mplus_season.py; one status digit per finished period ("0" complete, "3" no data).
+SEASON_MATRIX_STATE = 'mplus_season_matrix'
+
+# Used for players whose tier pieces or M+ history are unknown, so missing data neither helps nor hurts.
+NEUTRAL_COMPONENT = 0.5
+
+
+# --- Function to Parse the Weight Configuration ---
+def parse_priority_weights(spec):
+    """
+    Parses "name=value,..." into a weights dict on top of DEFAULT_PRIORITY_WEIGHTS. Invalid entries are ignored.
+    """
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    for part in spec.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in weights:
+            print(f"Warning: Unknown loot priority weight '{name}'. Expected one of {sorted(weights)}.")
+            continue
+        try:
+            weights[name] = float(value)
+        except ValueError:
+            print(f"Warning: Invalid value '{value}' for loot priority weight '{name}'. Keeping {weights[name]}.")
+    return weights
+
+
+# --- Function to Get the Tier Fraction ---
+def tier_fraction(tier_pieces):
+    """
+    Turns parsed tier pieces like (4, 5) into 0.8. Returns None when the pieces are unknown.
+    """
+    if tier_pieces is None:
+        return None
+    current_tier, max_tier = tier_pieces
+    return min(current_tier / max_tier, 1.0) if max_tier > 0 else None
+
+
+# --- Function to Load Season M+ Compliance ---
+def load_mplus_compliance(season_id, latest_period=None, latest_met=None):
+    """
+    Reads the season matrix stored by backfill_mplus_season.py without any API calls.
+
+    Args:
+        season_id (int): The running keystone season.
+        latest_period (int, optional): A finished period the report evaluated itself this run.
+        latest_met (dict, optional): {character_name: requirement met} for latest_period. Counted on top of
+            the stored matrix when it does not cover that period yet.
+
+    Returns:
+        dict: {character_name: share of periods with data where the vault requirement was met (0..1)}.
+              Empty (neutral for everyone) if no matrix is stored for this season.
+    """
+    stored = load_state(SEASON_MATRIX_STATE)
+    if not stored or stored.get("season_id") != season_id:
+        return {}
+    tallies = {} # {name: [weeks met, weeks with data]}
+    for name, digits in stored.get("statuses", {}).items():
+        tallies[name] = [digits.count("0"), len(digits) - digits.count("3")]
+    if latest_met and latest_period not in stored.get("periods", []):
+        for name, met in latest_met.items():
+            tally = tallies.setdefault(name, [0, 0])
+            tally[0] += int(met)
+            tally[1] += 1
+    return {name: met / weeks for name, (met, weeks) in tallies.items() if weeks}
+
+
+# --- Function to Score the Roster ---
+def compute_priority_scores(player_loot_data, mplus_compliance, weights):
+    """
+    Computes a 0-100 priority index per player in one pass over column lists of the roster.
+    Loot counts are scaled by the roster maximum, so the index is relative to the rest of the raid.
+    Each player dict gets a "Priority" key.
+
+    Args:
+        player_loot_data (list): Player dicts with PlayerName, LootCount, RecentLootCount and Tier (see tier_progress.parse_tier_table).
+        mplus_compliance (dict): {character_name: 0..1} from load_mplus_compliance.
+        weights (dict): Component weights from parse_priority_weights.
+
+    Returns:
+        list: The player dicts, highest priority first.
+    """
+    if not player_loot_data:
+        return []
+
+    loot_column = [player["LootCount"] for player in player_loot_data]
+    recent_column = [player.get("RecentLootCount", 0) for player in player_loot_data]
+    tier_column = [tier_fraction(player.get("Tier")) for player in player_loot_data]
+    mplus_column = [mplus_compliance.get(player["PlayerName"]) for player in player_loot_data]
+
+    max_loot = max(loot_column) or 1
+    max_recent = max(recent_column) or 1
+    total_weight = sum(weights.values()) or 1.0
+
+    for player, loot, recent, tier, mplus in zip(player_loot_data, loot_column, recent_column, tier_column, mplus_column):
+        score = (weights["loot"] * (1 - loot / max_loot)
+                 + weights["recent"] * (1 - recent / max_recent)
+                 + weights["tier"] * (1 - tier if tier is not None else NEUTRAL_COMPONENT)
+                 + weights["mplus"] * (mplus if mplus is not None else NEUTRAL_COMPONENT))
+        player["Priority"] = round(100 * score / total_weight, 1)
+
+    return sorted(player_loot_data, key=lambda player: (-player["Priority"], player["LootCount"], player["PlayerName"]))
+
+
+# --- Function to Format the Ranked List ---
+def format_priority_list(ranked_players, class_display_for, limit=LOOT_PRIORITY_LIST_SIZE):
+    """
+    Returns the ranked priority list for the loot embed.
+
+    Args:
+        ranked_players (list): Output of compute_priority_scores.
+        class_display_for (callable): Returns the class emoji/abbreviation for a player dict.
+        limit (int): Number of players to list.
+    """
+    lines = [f"{rank}. {class_display_for(player)} {player['PlayerName']} - {player['Priority']:.1f}"
+             for rank, player in enumerate(ranked_players[:limit], start=1)]
+    return "**Loot prioritet:**\n" + "\n".join(lines) + "\n"
@@ -0,0 +1,268 @@
+import sqlite3
+
+from report_state import state_file_path
+from wowaudit_records import LootEntry
+
+# --- Configuration ---
+# SQLite database in REPORT_STATE_DIR holding every loot history entry seen by the loot reports.
+# It is filled on each report run, so query_loot.py can answer questions without network access.
+LOOT_STORE_NAME = 'loot_history'
+
+# Columns that can be filtered on and grouped by, mapped to their SQL expression.
+# Every filterable column on the loot table has its own index.
+LOOT_GROUP_COLUMNS = {
+    "season": "loot.season_id",
+    "character": "COALESCE(characters.name, 'Ukendt (' || loot.character_id || ')')",
+    "item": "loot.name",
+    "slot": "loot.slot",
+    "difficulty": "loot.difficulty",
+    "response_type": "loot.response_type",
+    "discarded": "loot.discarded",
+}
+
+LOOT_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loot (
+    id INTEGER PRIMARY KEY,
+    season_id INTEGER NOT NULL,
+    character_id INTEGER,
+    item_id INTEGER,
+    name TEXT,
+    response_type TEXT COLLATE NOCASE,
+    discarded INTEGER NOT NULL DEFAULT 0,
+    difficulty TEXT COLLATE NOCASE,
+    slot TEXT COLLATE NOCASE,
+    awarded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS loot_season_idx ON loot (season_id);
+CREATE INDEX IF NOT EXISTS loot_character_idx ON loot (character_id);
+CREATE INDEX IF NOT EXISTS loot_item_idx ON loot (item_id);
+CREATE INDEX IF NOT EXISTS loot_slot_idx ON loot (slot);
+CREATE INDEX IF NOT EXISTS loot_difficulty_idx ON loot (difficulty);
+CREATE INDEX IF NOT EXISTS loot_response_type_idx ON loot (response_type);
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL COLLATE NOCASE,
+    class TEXT
+);
+CREATE INDEX IF NOT EXISTS characters_name_idx ON characters (name);
+CREATE TABLE IF NOT EXISTS loot_season_totals (
+    season_id INTEGER NOT NULL,
+    character_id INTEGER NOT NULL,
+    loot_count INTEGER NOT NULL,
+    entry_count INTEGER NOT NULL,
+    PRIMARY KEY (season_id, character_id)
+);
+CREATE TABLE IF NOT EXISTS loot_backfilled_seasons (
+    season_id INTEGER PRIMARY KEY,
+    entry_count INTEGER NOT NULL,
+    backfilled_at TEXT NOT NULL
+);
+"""
+
+
+# --- Function to Open the Loot Store ---
+def open_loot_store(path=None):
+    """
+    Opens (and creates, if needed) the loot store database.
+
+    Args:
+        path (str, optional): Database file to open. Defaults to the loot store in REPORT_STATE_DIR.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    conn = sqlite3.connect(path or state_file_path(LOOT_STORE_NAME, extension="sqlite"))
+    conn.executescript(LOOT_STORE_SCHEMA)
+    return conn
+
+
+# --- Function to Persist Loot Entries ---
+def store_loot_entries(season_id, loot_entries, character_map, excluded_response_types=()):
+    """
+    Inserts or updates the season's loot entries and the character names they refer to, and refreshes
+    the season's per-character totals. Entries are keyed on their loot history id, so storing the same
+    history twice is a no-op.
+
+    Args:
+        season_id (int): The keystone season the entries belong to.
+        loot_entries (list): LootEntry records from decode_loot_history.
+        character_map (dict): {character_id: {"name": ..., "class": ...}} from /v1/characters.
+        excluded_response_types (list): Response types the reports do not count as loot (e.g., transmog).
+
+    Returns:
+        bool: True if the entries were stored, False if the store could not be updated.
+    """
+    conn = open_loot_store()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO characters (id, name, class) VALUES (?, ?, ?)",
+                [(char_id, char_info["name"], char_info.get("class")) for char_id, char_info in character_map.items()],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO loot (id, season_id, character_id, item_id, name, response_type, discarded, difficulty, slot, awarded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(entry.id, season_id, entry.character_id, entry.item_id, entry.name, entry.response_type,
+                  int(entry.discarded), entry.difficulty, entry.slot, entry.awarded_at)
+                 for entry in loot_entries if isinstance(entry.id, int)],
+            )
+            refresh_season_totals(conn, season_id, excluded_response_types)
+        print(f"DEBUG: Stored {len(loot_entries)} loot entries for season {season_id} in the local loot store.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Warning: Could not update the local loot store: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+# --- Function to Query the Loot Store ---
+def query_loot(conn, season_id=None, character=None, item_id=None, slot=None, difficulty=None,
+               response_type=None, discarded=None, group_by=None):
+    """
+    Queries the loot store. All filters are optional and combined with AND; text filters ignore case.
+
+    Args:
+        conn (sqlite3.Connection): Connection from open_loot_store.
+        season_id (int, optional): Only entries from this season.
+        character (str, optional): Only entries awarded to this character name.
+        item_id (int, optional): Only entries of this item.
+        slot (str, optional): Only entries for this slot (e.g., "head").
+        difficulty (str, optional): Only entries from this difficulty (e.g., "mythic").
+        response_type (str, optional): Only entries with this response type (e.g., "BiS").
+        discarded (bool, optional): Only discarded (True) or kept (False) entries.
+        group_by (list, optional): Keys of LOOT_GROUP_COLUMNS to count by instead of listing entries.
+
+    Returns:
+        tuple: (column names, list of result rows).
+    """
+    conditions = []
+    params = []
+    if season_id is not None:
+        conditions.append("loot.season_id = ?")
+        params.append(season_id)
+    if character is not None:
+        conditions.append("loot.character_id IN (SELECT id FROM characters WHERE name = ?)")
+        params.append(character)
+    if item_id is not None:
+        conditions.append("loot.item_id = ?")
+        params.append(item_id)
+    for column, value in (("slot", slot), ("difficulty", difficulty), ("response_type", response_type)):
+        if value is not None:
+            conditions.append(f"loot.{column} = ?")
+            params.append(value)
+    if discarded is not None:
+        conditions.append("loot.discarded = ?")
+        params.append(int(discarded))
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    if group_by:
+        group_expressions = [LOOT_GROUP_COLUMNS[key] for key in group_by]
+        columns = list(group_by) + ["count"]
+        sql = (f"SELECT {', '.join(group_expressions)}, COUNT(*) FROM loot LEFT JOIN characters ON characters.id = loot.character_id"
+               f"{where} GROUP BY {', '.join(group_expressions)} ORDER BY COUNT(*) DESC, {', '.join(group_expressions)}")
+    else:
+        columns = ["id", "awarded_at", "character", "item_id", "item", "slot", "difficulty", "response_type", "discarded"]
+        sql = (f"SELECT loot.id, loot.awarded_at, {LOOT_GROUP_COLUMNS['character']}, loot.item_id, loot.name, loot.slot, "
+               f"loot.difficulty, loot.response_type, loot.discarded FROM loot LEFT JOIN characters ON characters.id = loot.character_id"
+               f"{where} ORDER BY loot.id")
+    return columns, conn.execute(sql, params).fetchall()
+
+
+# --- Function to List Stored Seasons ---
+def stored_season_ids(conn):
+    """
+    Returns the ids of all seasons with entries in the loot store, oldest first.
+    """
+    return [row[0] for row in conn.execute("SELECT DISTINCT season_id FROM loot ORDER BY season_id")]
+
+
+# --- Function to Read a Season Back From the Store ---
+def load_stored_season(conn, season_id):
+    """
+    Reads a season's entries back as LootEntry records, together with the names of their characters.
+
+    Returns:
+        tuple: (list of LootEntry ordered by id, {character_id: name}).
+    """
+    loot_entries = [
+        LootEntry(row[0], row[1], row[2], row[3], row[4], bool(row[5]), row[6], row[7], row[8])
+        for row in conn.execute(
+            "SELECT id, character_id, item_id, name, response_type, discarded, difficulty, slot, awarded_at "
+            "FROM loot WHERE season_id = ? ORDER BY id", (season_id,))
+    ]
+    character_names = dict(conn.execute(
+        "SELECT id, name FROM characters WHERE id IN (SELECT DISTINCT character_id FROM loot WHERE season_id = ?)", (season_id,)))
+    return loot_entries, character_names
+
+
+# --- Function to Refresh a Season's Totals ---
+def refresh_season_totals(conn, season_id, excluded_response_types=()):
+    """
+    Recomputes the per-character totals of one season from its stored entries. loot_count follows the
+    reports' rule (not discarded, with a response type that is not excluded); entry_count counts everything.
+    Runs inside the caller's transaction.
+    """
+    placeholders = ", ".join("?" for _ in excluded_response_types)
+    counted = "loot.discarded = 0 AND loot.response_type IS NOT NULL"
+    if excluded_response_types:
+        counted += f" AND loot.response_type NOT IN ({placeholders})" # NOCASE column, so the comparison ignores case
+    conn.execute("DELETE FROM loot_season_totals WHERE season_id = ?", (season_id,))
+    conn.execute(
+        f"INSERT INTO loot_season_totals (season_id, character_id, loot_count, entry_count) "
+        f"SELECT loot.season_id, loot.character_id, SUM(CASE WHEN {counted} THEN 1 ELSE 0 END), COUNT(*) "
+        f"FROM loot WHERE loot.season_id = ? AND loot.character_id IS NOT NULL GROUP BY loot.character_id",
+        list(excluded_response_types) + [season_id],
+    )
+
+
+# --- Functions to Track Backfilled Seasons ---
+def backfilled_season_ids(conn):
+    """
+    Returns the ids of past seasons already pulled by backfill_loot_history.py, including seasons without loot.
+    """
+    return {row[0] for row in conn.execute("SELECT season_id FROM loot_backfilled_seasons")}
+
+
+def mark_season_backfilled(conn, season_id, entry_count, backfilled_at):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO loot_backfilled_seasons (season_id, entry_count, backfilled_at) VALUES (?, ?, ?)",
+                     (season_id, entry_count, backfilled_at))
+
+
+# --- Function to Query Loot Totals ---
+def query_loot_totals(conn, season_id=None, character=None, by_season=False):
+    """
+    Reads loot totals per character from the stored season totals, without touching the loot entries.
+
+    Args:
+        conn (sqlite3.Connection): Connection from open_loot_store.
+        season_id (int, optional): Only this season's totals; all stored seasons (lifetime) otherwise.
+        character (str, optional): Only this character name (case-insensitive).
+        by_season (bool): One row per character and season instead of one per character.
+
+    Returns:
+        tuple: (column names, list of result rows), most loot first.
+    """
+    conditions = []
+    params = []
+    if season_id is not None:
+        conditions.append("totals.season_id = ?")
+        params.append(season_id)
+    if character is not None:
+        conditions.append("totals.character_id IN (SELECT id FROM characters WHERE name = ?)")
+        params.append(character)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    character_expression = LOOT_GROUP_COLUMNS["character"].replace("loot.", "totals.")
+
+    if by_season:
+        columns = ["season", "character", "loot", "entries"]
+        sql = (f"SELECT totals.season_id, {character_expression}, totals.loot_count, totals.entry_count "
+               f"FROM loot_season_totals AS totals LEFT JOIN characters ON characters.id = totals.character_id"
+               f"{where} ORDER BY totals.season_id, totals.loot_count DESC, 2")
+    else:
+        columns = ["character", "seasons", "loot", "entries"]
+        sql = (f"SELECT {character_expression}, COUNT(*), SUM(totals.loot_count), SUM(totals.entry_count) "
+               f"FROM loot_season_totals AS totals LEFT JOIN characters ON characters.id = totals.character_id"
+               f"{where} GROUP BY totals.character_id ORDER BY SUM(totals.loot_count) DESC, 1")
+    return columns, conn.execute(sql, params).fetchall()
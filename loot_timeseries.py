@@ -0,0 +1,195 @@
+import os
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+from report_state import load_state, save_state
+
+# --- Configuration ---
+# Weekly reset per region as (weekday, hour in UTC), weekday 0 = Monday.
+RESET_SCHEDULE = {
+    "eu": (2, 4), # Wednesday 04:00 UTC
+    "us": (1, 15), # Tuesday 15:00 UTC
+}
+WOW_REGION = os.getenv('WOW_REGION', 'eu').lower()
+
+# How far back to bucket loot when the season's first period is unknown.
+LOOT_MATRIX_FALLBACK_WEEKS = int(os.getenv('LOOT_MATRIX_FALLBACK_WEEKS', '52'))
+
+# State file holding the character x period loot count matrix for the current season.
+LOOT_MATRIX_STATE = 'loot_period_matrix'
+
+WEEK_SECONDS = 7 * 24 * 3600
+
+
+# --- Function to Find the Start of the Running Period ---
+def current_period_start(now=None):
+    """
+    Returns the UTC timestamp (seconds) of the most recent weekly reset for WOW_REGION.
+    """
+    now = now or datetime.now(timezone.utc)
+    reset_weekday, reset_hour = RESET_SCHEDULE.get(WOW_REGION, RESET_SCHEDULE["eu"])
+    reset = (now - timedelta(days=(now.weekday() - reset_weekday) % 7)).replace(hour=reset_hour, minute=0, second=0, microsecond=0)
+    if reset > now:
+        reset -= timedelta(days=7)
+    return reset.timestamp()
+
+
+# --- Function to Count Resets Since a Point in Time ---
+def resets_since(timestamp, now=None):
+    """
+    Returns how many weekly resets happened between a UTC timestamp (seconds) and now.
+    """
+    then_start = current_period_start(datetime.fromtimestamp(timestamp, timezone.utc))
+    return round((current_period_start(now) - then_start) / WEEK_SECONDS)
+
+
+# --- Function to Build the Period Boundary Index ---
+def build_period_starts(first_period, current_period, now=None):
+    """
+    Returns the sorted start timestamps of periods first_period..current_period.
+    Index i of the list is period first_period + i.
+    """
+    running_start = current_period_start(now)
+    return [running_start - (current_period - period) * WEEK_SECONDS for period in range(first_period, current_period + 1)]
+
+
+# --- Function to Parse a Loot Timestamp ---
+def parse_awarded_at(awarded_at):
+    """
+    Parses an ISO 8601 timestamp from the loot history into UTC seconds, or None if it is missing/invalid.
+    """
+    if not awarded_at:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(awarded_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+# --- Function to Load the Loot Matrix ---
+def load_loot_matrix(season_id, first_period, current_period):
+    """
+    Loads the stored matrix for this season (or an empty one) and extends it up to current_period.
+    When first_period is unknown, the stored matrix keeps the first period it was started with; a new
+    matrix tracks the last LOOT_MATRIX_FALLBACK_WEEKS periods.
+
+    Returns:
+        dict: {"first_period", "starts": [period start timestamps], "cursor": highest processed loot id,
+               "counts": {character_id (str): [count per period]},
+               "entries": {loot id (str): [signature, [character_id (str), period index] or None]}}
+    """
+    stored = load_state(LOOT_MATRIX_STATE)
+    if first_period is None:
+        if stored and stored.get("season_id") == season_id:
+            first_period = stored.get("first_period") # The fallback chosen on the first run, so the matrix is not rebuilt weekly
+        else:
+            first_period = current_period - LOOT_MATRIX_FALLBACK_WEEKS + 1
+    # Matrices stored before "entries" was kept cannot recount edited entries and are rebuilt once
+    if not stored or stored.get("season_id") != season_id or stored.get("first_period") != first_period or "entries" not in stored:
+        stored = {"season_id": season_id, "first_period": first_period, "starts": [], "cursor": 0, "counts": {}, "entries": {}}
+
+    period_count = current_period - first_period + 1
+    if len(stored["starts"]) != period_count:
+        stored["starts"] = build_period_starts(first_period, current_period)
+        for row in stored["counts"].values():
+            row.extend([0] * (period_count - len(row)))
+    return stored
+
+
+def _loot_signature(loot_entry):
+    # The fields that decide whether and where an entry is counted
+    return f"{loot_entry.character_id}|{loot_entry.response_type}|{int(bool(loot_entry.discarded))}|{loot_entry.awarded_at}"
+
+
+def _loot_cell(starts, loot_entry, excluded_response_types):
+    # [character_id, period index] the entry is counted in, or None if it does not count
+    if not loot_entry.response_type or loot_entry.response_type.lower() in excluded_response_types or loot_entry.discarded:
+        return None
+    awarded_ts = parse_awarded_at(loot_entry.awarded_at)
+    if awarded_ts is None:
+        return None
+    period_index = bisect_right(starts, awarded_ts) - 1
+    if period_index < 0:
+        return None # Awarded before the first tracked period
+    return [str(loot_entry.character_id), period_index]
+
+
+def _add_to_cell(matrix, cell, amount):
+    if cell is not None:
+        character_key, period_index = cell
+        matrix["counts"].setdefault(character_key, [0] * len(matrix["starts"]))[period_index] += amount
+
+
+# --- Function to Add New Loot to the Matrix ---
+def update_loot_matrix(matrix, loot_entries, excluded_response_types):
+    """
+    Buckets new loot entries into their period with bisect over the period start index. Entries are
+    counted with the same rule as the season totals (not excluded, not discarded). Entries counted on
+    an earlier run are only looked at again when their character, response type, discarded flag or
+    award time changed (e.g., marked as discarded later); they are then moved to their new cell.
+
+    Returns:
+        tuple: (new entries processed, earlier entries recounted).
+    """
+    starts = matrix["starts"]
+    entries = matrix["entries"]
+    added = recounted = 0
+    for loot_entry in loot_entries:
+        if not isinstance(loot_entry.id, int) or not loot_entry.character_id:
+            continue
+        entry_key = str(loot_entry.id)
+        signature = _loot_signature(loot_entry)
+        known = entries.get(entry_key)
+        if known is not None:
+            if known[0] == signature:
+                continue # Unchanged since it was counted
+            _add_to_cell(matrix, known[1], -1)
+            recounted += 1
+        else:
+            added += 1
+        cell = _loot_cell(starts, loot_entry, excluded_response_types)
+        _add_to_cell(matrix, cell, 1)
+        entries[entry_key] = [signature, cell]
+        matrix["cursor"] = max(matrix["cursor"], loot_entry.id)
+    return added, recounted
+
+
+# --- Function to Persist the Loot Matrix ---
+def save_loot_matrix(matrix):
+    save_state(LOOT_MATRIX_STATE, matrix)
+
+
+# --- Function to Read One Cell ---
+def loot_in_period(matrix, character_id, period):
+    """
+    Returns the loot count of a character in one period.
+    """
+    index = period - matrix["first_period"]
+    row = matrix["counts"].get(str(character_id))
+    if row is None or not 0 <= index < len(row):
+        return 0
+    return row[index]
+
+
+# --- Function to Read a Rolling Window ---
+def loot_in_window(matrix, character_id, last_period, weeks):
+    """
+    Returns the loot count of a character over `weeks` periods ending with last_period.
+    """
+    return sum(loot_in_period(matrix, character_id, period) for period in range(last_period - weeks + 1, last_period + 1))
+
+
+# --- Function to Update the Season Matrix in One Call ---
+def refresh_loot_matrix(season_id, first_period, current_period, loot_entries, excluded_response_types):
+    """
+    Loads the matrix for the season, adds new and changed loot and saves it.
+    When first_period is unknown, the last LOOT_MATRIX_FALLBACK_WEEKS periods are tracked (see load_loot_matrix).
+    """
+    matrix = load_loot_matrix(season_id, first_period, current_period)
+    added, recounted = update_loot_matrix(matrix, loot_entries, excluded_response_types)
+    print(f"DEBUG: Added {added} new and recounted {recounted} changed loot entries in the period matrix (cursor now {matrix['cursor']}).")
+    save_loot_matrix(matrix)
+    return matrix
@@ -0,0 +1,133 @@
+import argparse
+import time
+
+from backfill_mplus_season import SEASON_MATRIX_STATE
+from bulk_decode import MISSING_OPTION
+from check_mplus_requirements import REQUIRED_DUNGEON_OPTION_VALUE
+from query_loot import print_table
+from report_state import load_state
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Only this simulator needs numpy; the reports run without it
+
+# Answers "what if the M+ requirement were different" from the vault options stored by backfill_mplus_season.py,
+# without network access. Every combination of threshold and required slot count is evaluated at once.
+#
+# Examples:
+#   python mplus_whatif.py --thresholds 707 710 --weeks 8      # Who would have failed at 710 over the last 8 weeks?
+#   python mplus_whatif.py --slots 1 2 3 --players             # 1, 2 or 3 slots at the current value, with names
+#
+# A slot counts when its vault option is at least the threshold, and "N slots" means option_1..option_N.
+# With the configured value and 2 slots this is the report's rule, as long as no option exceeds the required value.
+
+# --- Configuration ---
+# Players listed per grid cell with --players, most misses first.
+WHATIF_MAX_LISTED_PLAYERS = 15
+
+
+# --- Function to Load the Option Array ---
+def load_option_array(weeks=None):
+    """
+    Loads the stored season matrix into a character x period x slot array.
+
+    Args:
+        weeks (int, optional): Only the last `weeks` stored periods; all of them when None.
+
+    Returns:
+        tuple: (names, periods, options, present) where options is an int32 array of shape
+               (characters, periods, 3) with MISSING_OPTION for empty slots, and present is a bool
+               array of shape (characters, periods) that is False where a character had no data.
+               None if no season matrix is stored.
+    """
+    stored = load_state(SEASON_MATRIX_STATE)
+    if not stored or not stored.get("periods"):
+        return None
+
+    periods = stored["periods"]
+    start = max(len(periods) - weeks, 0) if weeks else 0
+    periods = periods[start:]
+    names = sorted(stored.get("options", {}))
+
+    options = numpy.full((len(names), len(periods), 3), MISSING_OPTION, dtype=numpy.int32)
+    present = numpy.zeros((len(names), len(periods)), dtype=bool)
+    for i, name in enumerate(names):
+        for j, period_options in enumerate(stored["options"][name][start:]):
+            if period_options is None:
+                continue
+            present[i, j] = True
+            options[i, j] = [option if isinstance(option, int) else MISSING_OPTION for option in period_options[:3]]
+    return names, periods, options, present
+
+
+# --- Function to Evaluate a Requirement Grid ---
+def simulate_requirements(options, present, thresholds, slot_counts):
+    """
+    Evaluates every (threshold, slot count) requirement for every character and period in one pass.
+
+    Args:
+        options (numpy.ndarray): (characters, periods, 3) vault options, see load_option_array.
+        present (numpy.ndarray): (characters, periods) mask of periods with data.
+        thresholds (list): Required option values.
+        slot_counts (list): Required slot counts (1-3).
+
+    Returns:
+        numpy.ndarray: int32 array of shape (thresholds, slot counts, characters) with each character's missed periods.
+    """
+    # (thresholds, characters, periods, slots): does the slot reach the threshold?
+    reached = options[numpy.newaxis] >= numpy.asarray(thresholds, dtype=numpy.int32)[:, numpy.newaxis, numpy.newaxis, numpy.newaxis]
+    # Slot k is met only if slots 1..k all reach it; pick the required slot count
+    met = numpy.logical_and.accumulate(reached, axis=-1)[..., numpy.asarray(slot_counts) - 1]
+    # (thresholds, characters, periods, slot counts) -> (thresholds, slot counts, characters, periods)
+    missed = ~met.transpose(0, 3, 1, 2) & present
+    return missed.sum(axis=-1, dtype=numpy.int32)
+
+
+# --- Main Script Logic ---
+def main():
+    parser = argparse.ArgumentParser(description="Simulate M+ vault requirements against the stored season matrix.")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[REQUIRED_DUNGEON_OPTION_VALUE], help="Required vault option values")
+    parser.add_argument("--slots", type=int, nargs="+", choices=[1, 2, 3], default=[2], help="Required vault slot counts")
+    parser.add_argument("--weeks", type=int, help="Only the last N stored periods (default: the whole season)")
+    parser.add_argument("--players", action="store_true", help="List the players who would miss each requirement")
+    args = parser.parse_args()
+
+    if numpy is None:
+        print("Error: The what-if simulator needs numpy. Install it with 'pip install numpy'.")
+        exit(1)
+
+    loaded = load_option_array(args.weeks)
+    if loaded is None:
+        print(f"Error: No stored season matrix found ('{SEASON_MATRIX_STATE}'). Run backfill_mplus_season.py first.")
+        exit(1)
+    names, periods, options, present = loaded
+
+    start = time.perf_counter()
+    misses = simulate_requirements(options, present, args.thresholds, args.slots)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(names)} character(s) over {len(periods)} period(s) ({periods[0]}-{periods[-1]}).\n")
+    columns = ["threshold", "slots", "players_failing", "missed_weeks"]
+    rows = []
+    for t, threshold in enumerate(args.thresholds):
+        for s, slot_count in enumerate(args.slots):
+            rows.append([threshold, slot_count, int((misses[t, s] > 0).sum()), int(misses[t, s].sum())])
+    print_table(columns, rows)
+
+    if args.players:
+        for t, threshold in enumerate(args.thresholds):
+            for s, slot_count in enumerate(args.slots):
+                failing = numpy.flatnonzero(misses[t, s])
+                failing = failing[numpy.argsort(-misses[t, s, failing], kind="stable")]
+                print(f"\n{threshold} x {slot_count} slot(s): {len(failing)} player(s)")
+                for i in failing[:WHATIF_MAX_LISTED_PLAYERS]:
+                    print(f"  {names[i]} - {misses[t, s, i]}/{int(present[i].sum())} weeks missed")
+                if len(failing) > WHATIF_MAX_LISTED_PLAYERS:
+                    print(f"  ... and {len(failing) - WHATIF_MAX_LISTED_PLAYERS} more")
+
+    print(f"\n{len(rows)} requirement(s) evaluated in {elapsed_ms:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
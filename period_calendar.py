@@ -0,0 +1,104 @@
+import requests
+import os
+import time
+
+from loot_timeseries import WEEK_SECONDS, WOW_REGION, current_period_start, parse_awarded_at, resets_since
+from report_state import load_state, save_state
+from wowaudit_api import get_wowaudit_json, stale_sources
+
+# Periods are weekly intervals between the region's resets, so once one period number and its start
+# are known, the current period follows from the clock. The calendar stores such an anchor together
+# with the running season, and scripts ask it instead of GET /v1/period. The API is only asked again
+# when there is no calendar or the calendar may have crossed into a new season.
+
+# --- Configuration ---
+# Set to false to ask /v1/period on every run; the calendar is then only used when the API fails.
+PERIOD_CALENDAR_ENABLED = os.getenv('PERIOD_CALENDAR', 'true').lower() == 'true'
+
+# State file holding the anchor period, its start and the seasons seen so far.
+PERIOD_CALENDAR_STATE = 'period_calendar'
+
+# Weeks the calendar is trusted after the period it was validated in, when /v1/period does not say when
+# the season ends. A known season end date always takes precedence. Seasons run for months, so the
+# default only revalidates about once a month; 0 revalidates on the first run after every reset.
+PERIOD_CALENDAR_TRUST_WEEKS = int(os.getenv('PERIOD_CALENDAR_TRUST_WEEKS', '4'))
+
+
+# --- Function to Project the Calendar to Now ---
+def _projected_period_data(calendar, now=None):
+    """
+    Returns a /v1/period-shaped dict for the running period, counted forward from the calendar's anchor.
+    """
+    return {
+        "current_period": calendar["period"] + resets_since(calendar["period_start"], now),
+        "current_season": calendar["season"],
+    }
+
+
+def _usable(calendar):
+    return bool(calendar) and calendar.get("region") == WOW_REGION and calendar.get("season")
+
+
+# --- Function to Store a Validated Period ---
+def _store_calendar(calendar, period_data):
+    """
+    Anchors the calendar on a fresh /v1/period answer and decides how long it can be trusted.
+    """
+    period_start = current_period_start()
+    current_season = period_data.get("current_season") or {}
+    season_end = parse_awarded_at(current_season.get("end_date"))
+    valid_until = season_end if season_end and season_end > period_start else period_start + (1 + PERIOD_CALENDAR_TRUST_WEEKS) * WEEK_SECONDS
+
+    seasons = (calendar or {}).get("seasons", {}) if _usable(calendar) else {}
+    if current_season.get("keystone_season_id") is not None:
+        seasons[str(current_season["keystone_season_id"])] = current_season.get("first_period_id")
+    save_state(PERIOD_CALENDAR_STATE, {
+        "region": WOW_REGION,
+        "period": period_data["current_period"],
+        "period_start": period_start,
+        "season": current_season,
+        "seasons": seasons, # {keystone_season_id: first_period_id} of every season seen
+        "valid_until": valid_until,
+        "validated_at": time.time(),
+    })
+
+
+# --- Function to Get the Current Period ---
+def get_period_data(api_auth_header):
+    """
+    Drop-in replacement for get_wowaudit_json('/period', ...). Answers from the local period calendar while
+    it is valid and revalidates against /v1/period otherwise. If the API fails, a stored calendar is
+    projected to the current period instead.
+
+    Returns:
+        dict: {"current_period": int, "current_season": {...}} as returned by /v1/period.
+
+    Raises:
+        requests.exceptions.RequestException: If there is no calendar and /v1/period could not be fetched.
+    """
+    calendar = load_state(PERIOD_CALENDAR_STATE)
+    if PERIOD_CALENDAR_ENABLED and _usable(calendar) and time.time() < calendar.get("valid_until", 0):
+        period_data = _projected_period_data(calendar)
+        print(f"DEBUG: Period {period_data['current_period']} taken from the local period calendar.")
+        return period_data
+
+    try:
+        period_data = get_wowaudit_json('/period', api_auth_header)
+    except requests.exceptions.RequestException as e:
+        if not _usable(calendar):
+            raise
+        print(f"Warning: /period could not be fetched ({e}). Using the local period calendar.")
+        return _projected_period_data(calendar)
+
+    # A cached /period answer is from an earlier run; move it forward by the resets since then
+    period_fetched_at = stale_sources().get('/period')
+    if period_fetched_at and period_data.get("current_period") is not None:
+        if _usable(calendar):
+            return _projected_period_data(calendar)
+        missed_resets = resets_since(period_fetched_at)
+        print(f"Warning: Using cached period data, advanced by {missed_resets} reset(s).")
+        return dict(period_data, current_period=period_data.get("current_period") + missed_resets)
+
+    if period_data.get("current_period") is not None:
+        _store_calendar(calendar, period_data)
+    return period_data
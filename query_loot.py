@@ -0,0 +1,91 @@
+import argparse
+import os
+import time
+
+from loot_archive import archived_season_ids, query_loot_archives
+from loot_store import LOOT_GROUP_COLUMNS, LOOT_STORE_NAME, open_loot_store, query_loot, query_loot_totals
+from report_state import state_file_path
+
+# Answers loot council questions from the local loot store (filled by the loot reports), without network access.
+#
+# Examples:
+#   python query_loot.py --slot head                        # Who has received a head piece?
+#   python query_loot.py --character Rissler --group-by difficulty   # Heroic vs Mythic drops for one player
+#   python query_loot.py --discarded --season 14            # Everything discarded this season
+#   python query_loot.py --archived --group-by season       # Drops per finished season (see loot_archive.py)
+#   python query_loot.py --totals                           # Lifetime loot per character (see backfill_loot_history.py)
+#   python query_loot.py --totals --by-season --character Rissler   # One player's loot per season
+
+
+# --- Function to Print Rows as a Table ---
+def print_table(columns, rows):
+    """
+    Prints result rows as a left-aligned plain text table.
+    """
+    text_rows = [["" if value is None else str(value) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in text_rows]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in text_rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+# --- Main Script Logic ---
+def main():
+    parser = argparse.ArgumentParser(description="Query the local loot history store.")
+    parser.add_argument("--season", type=int, help="Keystone season id")
+    parser.add_argument("--character", help="Character name (case-insensitive)")
+    parser.add_argument("--item-id", type=int, help="Item id")
+    parser.add_argument("--slot", help="Item slot, e.g. head")
+    parser.add_argument("--difficulty", help="Raid difficulty, e.g. mythic")
+    parser.add_argument("--response-type", help="Response type, e.g. BiS")
+    discarded_group = parser.add_mutually_exclusive_group()
+    discarded_group.add_argument("--discarded", dest="discarded", action="store_const", const=True, help="Only discarded items")
+    discarded_group.add_argument("--kept", dest="discarded", action="store_const", const=False, help="Only items that were not discarded")
+    parser.add_argument("--group-by", nargs="+", choices=sorted(LOOT_GROUP_COLUMNS), help="Count entries per group instead of listing them")
+    parser.add_argument("--archived", action="store_true", help="Query the archived past seasons instead of the loot store")
+    parser.add_argument("--totals", action="store_true", help="Loot totals per character from the stored season totals (lifetime unless --season is given)")
+    parser.add_argument("--by-season", action="store_true", help="With --totals, one row per character and season")
+    args = parser.parse_args()
+    filters = {
+        "character": args.character,
+        "item_id": args.item_id,
+        "slot": args.slot,
+        "difficulty": args.difficulty,
+        "response_type": args.response_type,
+        "discarded": args.discarded,
+    }
+
+    if args.archived:
+        if not archived_season_ids():
+            print("Error: No archived seasons found. Run loot_archive.py first.")
+            exit(1)
+        start = time.perf_counter()
+        columns, rows = query_loot_archives(season_id=args.season, group_by=args.group_by, **filters)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print_table(columns, rows)
+        print(f"\n{len(rows)} row(s) in {elapsed_ms:.1f} ms.")
+        return
+
+    store_path = state_file_path(LOOT_STORE_NAME, extension="sqlite")
+    if not os.path.exists(store_path):
+        print(f"Error: No loot store found at '{store_path}'. Run check_loot_history.py or combined_report.py first.")
+        exit(1)
+
+    start = time.perf_counter()
+    conn = open_loot_store(store_path)
+    try:
+        if args.totals:
+            columns, rows = query_loot_totals(conn, season_id=args.season, character=args.character, by_season=args.by_season)
+        else:
+            columns, rows = query_loot(conn, season_id=args.season, group_by=args.group_by, **filters)
+    finally:
+        conn.close()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print_table(columns, rows)
+    print(f"\n{len(rows)} row(s) in {elapsed_ms:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
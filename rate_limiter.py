@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from report_state import state_file_path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Not available on Windows; the bucket is then only shared between threads
+
+# --- Configuration ---
+# Client-side token bucket per WoW Audit API key, shared by every thread and process on this machine
+# (report scripts, backfills, ad-hoc runs) through a locked state file.
+WOWAUDIT_RATE_LIMIT_PER_SECOND = float(os.getenv('WOWAUDIT_RATE_LIMIT_PER_SECOND', '2'))
+WOWAUDIT_RATE_LIMIT_BURST = float(os.getenv('WOWAUDIT_RATE_LIMIT_BURST', '5'))
+
+# Callers are served in ticket order. A ticket whose holder has not checked in for this long (e.g., the
+# process was killed) is skipped so the queue cannot stall.
+TICKET_ABANDON_SECONDS = 5.0
+
+# Longest single sleep while waiting for a token, so queue position and server limits are re-read often.
+MAX_POLL_SECONDS = 0.5
+
+_thread_lock = threading.Lock()
+
+
+# --- Function to Build the Bucket State Path ---
+def bucket_state_path(api_key):
+    """
+    Returns the state file of the bucket for an API key. The key itself is never written to disk.
+    """
+    key_hash = hashlib.sha1(str(api_key).encode('utf-8')).hexdigest()[:12]
+    return state_file_path(f"rate_limit_{key_hash}")
+
+
+# --- Function to Lock and Update the Bucket ---
+@contextmanager
+def locked_bucket(api_key):
+    """
+    Yields the bucket state dict under an exclusive lock and writes it back afterwards.
+    """
+    path = bucket_state_path(api_key)
+    with _thread_lock, open(f"{path}.lock", 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            bucket = {}
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        bucket = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    bucket = {} # A damaged bucket is simply restarted full
+            now = time.time()
+            if not bucket:
+                bucket = {"tokens": WOWAUDIT_RATE_LIMIT_BURST, "updated": now, "blocked_until": 0.0,
+                          "next_ticket": 0, "serving": 0, "serving_seen": now, "cancelled": []}
+
+            # Refill for the time since the last update
+            elapsed = max(0.0, now - bucket["updated"])
+            bucket["tokens"] = min(WOWAUDIT_RATE_LIMIT_BURST, bucket["tokens"] + elapsed * WOWAUDIT_RATE_LIMIT_PER_SECOND)
+            bucket["updated"] = now
+
+            # Skip tickets of callers that gave up waiting or stopped checking in
+            while bucket["serving"] in bucket["cancelled"]:
+                bucket["cancelled"].remove(bucket["serving"])
+                bucket["serving"] += 1
+                bucket["serving_seen"] = now
+            if bucket["serving"] < bucket["next_ticket"] and now - bucket["serving_seen"] > TICKET_ABANDON_SECONDS:
+                print(f"Warning: Rate limiter ticket {bucket['serving']} was abandoned. Skipping it.")
+                bucket["serving"] += 1
+                bucket["serving_seen"] = now
+
+            yield bucket
+
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(bucket, f)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# --- Function to Take a Token ---
+def acquire_token(api_key, timeout):
+    """
+    Waits for this caller's turn and a free token, then takes it.
+
+    Args:
+        api_key (str): The API key the request is sent with.
+        timeout (float): Maximum seconds to wait.
+
+    Returns:
+        bool: True if a token was taken, False if the timeout ran out first (the ticket is given up).
+    """
+    give_up_at = time.time() + timeout
+    with locked_bucket(api_key) as bucket:
+        ticket = bucket["next_ticket"]
+        bucket["next_ticket"] += 1
+        if bucket["serving"] == ticket:
+            bucket["serving_seen"] = time.time()
+
+    while True:
+        with locked_bucket(api_key) as bucket:
+            now = time.time()
+            if bucket["serving"] > ticket:
+                return False # Skipped as abandoned; should not happen while we keep checking in
+            if bucket["serving"] == ticket:
+                bucket["serving_seen"] = now
+                if bucket["tokens"] >= 1 and now >= bucket["blocked_until"]:
+                    bucket["tokens"] -= 1
+                    bucket["serving"] += 1
+                    bucket["serving_seen"] = now
+                    return True
+                if now >= give_up_at:
+                    bucket["serving"] += 1 # Give up our turn so the queue moves on
+                    bucket["serving_seen"] = now
+                    return False
+                wait = max((1 - bucket["tokens"]) / WOWAUDIT_RATE_LIMIT_PER_SECOND, bucket["blocked_until"] - now)
+            else:
+                if now >= give_up_at:
+                    bucket["cancelled"].append(ticket) # Skipped as soon as it comes up
+                    return False
+                # Roughly when the tokens for everyone ahead of us (and us) will have refilled
+                tokens_needed = ticket - bucket["serving"] + 1 - bucket["tokens"]
+                wait = max(tokens_needed / WOWAUDIT_RATE_LIMIT_PER_SECOND, bucket["blocked_until"] - now)
+        time.sleep(min(max(wait, 0.01), MAX_POLL_SECONDS, max(give_up_at - time.time(), 0.01)))
+
+
+# --- Function to Apply Server Rate-Limit Headers ---
+def observe_rate_limit_headers(api_key, headers):
+    """
+    Aligns the bucket with the server's view when the response carries rate-limit headers:
+    Retry-After (on 429) and X-RateLimit-Reset block the bucket until then, X-RateLimit-Remaining
+    caps the local tokens.
+    """
+    remaining = headers.get("X-RateLimit-Remaining") or headers.get("RateLimit-Remaining")
+    reset = headers.get("X-RateLimit-Reset") or headers.get("RateLimit-Reset")
+    retry_after = headers.get("Retry-After")
+    if remaining is None and retry_after is None:
+        return
+
+    with locked_bucket(api_key) as bucket:
+        now = time.time()
+        blocked_until = bucket["blocked_until"]
+        try:
+            if retry_after is not None:
+                blocked_until = max(blocked_until, now + float(retry_after))
+            if remaining is not None:
+                bucket["tokens"] = min(bucket["tokens"], float(remaining))
+                if float(remaining) <= 0 and reset is not None:
+                    reset_value = float(reset)
+                    # Either an epoch timestamp or seconds until the window resets
+                    blocked_until = max(blocked_until, reset_value if reset_value > 1e9 else now + reset_value)
+        except ValueError:
+            print(f"Warning: Could not parse rate-limit headers: remaining={remaining!r}, reset={reset!r}, retry-after={retry_after!r}")
+        if blocked_until > now:
+            print(f"DEBUG: WoW Audit rate limit reached. Pausing requests for {blocked_until - now:.1f}s.")
+            bucket["tokens"] = 0.0
+        bucket["blocked_until"] = blocked_until
@@ -0,0 +1,164 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+from run_budget import start_run_budget
+from run_checkpoint import finish_run_checkpoint, start_run_checkpoint
+from run_metrics import start_stage, write_metrics
+
+# cProfile/pstats are imported inside run_entry_point, so normal runs do not pay for them at startup.
+
+# --- Configuration ---
+# Directory for profile artifacts (<script>.pstats, <script>.collapsed). Uploaded by the workflows on profiled runs.
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Number of functions listed in the printed cumulative-time hotspot table.
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '25'))
+
+# Call paths below this share of a second are left out of the collapsed-stack output.
+COLLAPSED_MIN_SECONDS = 1e-6
+
+# Peak traced memory per stage, filled by mark_stage while a --profile-memory run is active.
+_memory_stages = []
+_current_stage = None
+
+
+# --- Function to Mark the Start of a Report Stage ---
+def mark_stage(name):
+    """
+    Starts a new named stage. Its duration goes into the run metrics (see run_metrics); with --profile-memory
+    the peak memory of the previous stage is recorded as well.
+    """
+    global _current_stage
+    start_stage(name)
+    if not tracemalloc.is_tracing():
+        return
+    _finish_stage()
+    _current_stage = name
+    tracemalloc.reset_peak()
+
+
+def _finish_stage():
+    if _current_stage is not None:
+        _, peak = tracemalloc.get_traced_memory()
+        _memory_stages.append((_current_stage, peak))
+
+
+# --- Function to Write Collapsed Stacks ---
+def write_collapsed_stacks(stats, path):
+    """
+    Writes the profile as collapsed stacks ("outer;inner;leaf <microseconds>" per line) for flamegraph tools.
+
+    cProfile only records caller -> callee edges, so full stacks are rebuilt from the roots of the call
+    graph. A function's time is split over its callers in proportion to the time each caller spent in it.
+    """
+    raw_stats = stats.stats # {func: (cc, nc, tt, ct, {caller: (cc, nc, tt, ct)})}
+    callees = {}
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        filename, line, function_name = func
+        return f"{function_name} ({os.path.basename(filename)}:{line})" if line else function_name
+
+    collapsed = {}
+
+    def walk(func, path, share):
+        _, _, self_time, total_time, _ = raw_stats[func]
+        if self_time * share >= COLLAPSED_MIN_SECONDS:
+            key = ";".join(label(f) for f in path)
+            collapsed[key] = collapsed.get(key, 0.0) + self_time * share
+        for callee, edge_time in callees.get(func, []):
+            callee_total = raw_stats[callee][3]
+            if callee in path or not callee_total:
+                continue # Recursion is folded into the first occurrence
+            callee_share = share * edge_time / callee_total
+            if callee_share * callee_total >= COLLAPSED_MIN_SECONDS:
+                walk(callee, path + [callee], callee_share)
+
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        if not callers:
+            walk(func, [func], 1.0)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, seconds in sorted(collapsed.items()):
+            f.write(f"{stack} {int(seconds * 1_000_000)}\n")
+
+
+# --- Function to Run a Report Entry Point ---
+def run_entry_point(main, script_name):
+    """
+    Runs a report's main(), under cProfile with --profile and with per-stage tracemalloc with --profile-memory.
+    The run deadline and stage budgets are started here, so only reports are bounded (see run_budget).
+    The run is checkpointed (see run_checkpoint); --resume picks up from the checkpoints of a failed attempt.
+    The checkpoints are deleted when main() succeeds and kept when it fails.
+    Run metrics are written when main() returns or exits (see run_metrics).
+
+    Args:
+        main (callable): The script's main function.
+        script_name (str): Base name of the profile artifacts (e.g., "check_loot_history").
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true", help=f"Profile the run with cProfile and write artifacts to {PROFILE_DIR}/")
+    parser.add_argument("--profile-memory", action="store_true", help="Report peak traced memory per report stage")
+    parser.add_argument("--resume", action="store_true", help="Resume from the checkpoints of an earlier attempt of this run")
+    args = parser.parse_args()
+    start_run_checkpoint(script_name, resume=args.resume)
+
+    start_run_budget()
+    run_started = time.perf_counter()
+    exit_code = 0
+    try:
+        _run_main(main, script_name, args)
+    except SystemExit as e:
+        exit_code = 0 if e.code is None else (e.code if isinstance(e.code, int) else 1) # exit() / sys.exit() mean success
+        raise
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        if exit_code == 0:
+            finish_run_checkpoint()
+        write_metrics(script_name, exit_code, time.perf_counter() - run_started)
+
+
+def _run_main(main, script_name, args):
+    if not args.profile and not args.profile_memory:
+        main()
+        return
+
+    import cProfile
+    import pstats
+
+    if args.profile_memory:
+        tracemalloc.start()
+        mark_stage("startup")
+    profiler = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    try:
+        if profiler:
+            profiler.runcall(main)
+        else:
+            main()
+    finally:
+        # Reports call exit() on fatal errors; the profile of such a run is the most interesting one.
+        elapsed = time.perf_counter() - start
+        if args.profile_memory:
+            _finish_stage()
+            tracemalloc.stop()
+        print(f"\n--- Profile: {script_name} ({elapsed:.2f} s) ---")
+        if profiler:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            pstats_path = os.path.join(PROFILE_DIR, f"{script_name}.pstats")
+            collapsed_path = os.path.join(PROFILE_DIR, f"{script_name}.collapsed")
+            profiler.dump_stats(pstats_path)
+            stats = pstats.Stats(profiler)
+            write_collapsed_stacks(stats, collapsed_path)
+            print(f"Wrote {pstats_path} and {collapsed_path}.")
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        if args.profile_memory:
+            print("Peak traced memory per stage" + (" (timings above include tracemalloc overhead):" if profiler else ":"))
+            for stage, peak in _memory_stages:
+                print(f"  {stage:<24} {peak / 1024:10.1f} KiB")
@@ -0,0 +1,95 @@
+import json
+import hashlib
+import os
+import tempfile
+
+# --- Configuration ---
+# Directory for state that has to survive between runs (watch snapshots, message ids, ...).
+# In GitHub Actions this directory is carried over between runs with actions/cache.
+REPORT_STATE_DIR = os.getenv('REPORT_STATE_DIR', 'report_state')
+
+# State file holding the input/output fingerprints of the last delivered run per report key.
+REPORT_FINGERPRINTS_STATE = 'report_fingerprints'
+
+# If 'true', reports are rendered and posted even when their fingerprint did not change.
+FORCE_REPORT = os.getenv('FORCE_REPORT', 'false').lower() == 'true'
+
+
+# --- Function to Build a State File Path ---
+def state_file_path(name, extension="json"):
+    """
+    Returns the path of a state file inside REPORT_STATE_DIR, creating the directory if needed.
+
+    Args:
+        name (str): The state name (e.g., "mplus_watch_snapshot").
+        extension (str): The file extension to use.
+    """
+    os.makedirs(REPORT_STATE_DIR, exist_ok=True)
+    return os.path.join(REPORT_STATE_DIR, f"{name}.{extension}")
+
+
+# --- Function to Load Persisted State ---
+def load_state(name, default=None):
+    """
+    Loads a JSON state file written by save_state.
+
+    Returns:
+        The stored value, or `default` if the file is missing or unreadable.
+    """
+    path = state_file_path(name)
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read state file '{path}': {e}. Starting from empty state.")
+        return default
+
+
+# --- Function to Persist State ---
+def save_state(name, data):
+    """
+    Writes a JSON state file atomically, so an interrupted run never leaves a half-written file behind.
+    """
+    path = state_file_path(name)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- Function to Fingerprint Report Inputs or Output ---
+def compute_fingerprint(*parts):
+    """
+    Returns a stable SHA-256 hex digest of JSON-serializable parts (dict key order does not matter).
+    """
+    serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+# --- Function to Check a Stored Fingerprint ---
+def fingerprint_unchanged(report_key, kind, fingerprint):
+    """
+    Returns True if `fingerprint` equals the `kind` ("inputs" or "output") fingerprint stored for
+    report_key by the last delivered run. Always False when FORCE_REPORT is set.
+    """
+    if FORCE_REPORT:
+        return False
+    stored = load_state(REPORT_FINGERPRINTS_STATE, {}).get(report_key, {})
+    return stored.get(kind) == fingerprint
+
+
+# --- Function to Store Fingerprints After Delivery ---
+def store_fingerprints(report_key, inputs, output):
+    """
+    Records the input and output fingerprints of a delivered report.
+    """
+    fingerprints = load_state(REPORT_FINGERPRINTS_STATE, {})
+    fingerprints[report_key] = {"inputs": inputs, "output": output}
+    save_state(REPORT_FINGERPRINTS_STATE, fingerprints)
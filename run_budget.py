@@ -0,0 +1,93 @@
+import math
+import os
+import time
+
+import requests
+
+# --- Configuration ---
+# Wall-clock budget for one report run, in seconds. Fetches that do not finish within their stage budget
+# are abandoned, and the report is rendered from whatever finished (see wowaudit_api.stale_sources).
+# Only enforced once the run calls start_run_budget(), which report_profiling.run_entry_point does;
+# bulk scripts such as the backfills and exports fetch without a deadline.
+RUN_DEADLINE_SECONDS = float(os.getenv('RUN_DEADLINE_SECONDS', '240'))
+
+# Share of the run deadline each stage may use. A stage's budget starts with its first request and is
+# always capped by what is left of the run, minus the time reserved for posting to Discord.
+STAGE_BUDGET_SHARES = {
+    "period": 0.15,
+    "characters": 0.15,
+    "historical_data": 0.25,
+    "loot_history": 0.35,
+}
+DEFAULT_STAGE_SHARE = 0.25
+
+# Always left over for delivering the report, so the weekly post goes out even when an upstream is degraded.
+DELIVERY_RESERVE_SECONDS = float(os.getenv('DELIVERY_RESERVE_SECONDS', '20'))
+
+_run_started = None # Set by start_run_budget(); None means no budget is enforced
+_stage_started = {}
+
+
+# --- Exception for an Exhausted Budget ---
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised when a stage or the run is out of time. Subclasses Timeout, so the existing
+    `except requests.exceptions.RequestException` handlers treat it like any failed request.
+    """
+
+
+# --- Function to Restart the Run Clock ---
+def start_run_budget():
+    """
+    Starts (or restarts) the run deadline and all stage budgets. Until this is called, fetches are unbounded.
+    Long-running loops (watch mode) call this per poll.
+    """
+    global _run_started
+    _run_started = time.monotonic()
+    _stage_started.clear()
+
+
+# --- Function to Check for an Active Budget ---
+def run_budget_active():
+    """
+    Returns True once start_run_budget() has been called in this process.
+    """
+    return _run_started is not None
+
+
+# --- Function to Get the Remaining Run Time ---
+def run_remaining_seconds():
+    """
+    Returns the seconds left before the run deadline (negative once it has passed, infinite without a budget).
+    """
+    if _run_started is None:
+        return math.inf
+    return RUN_DEADLINE_SECONDS - (time.monotonic() - _run_started)
+
+
+# --- Function to Get the Remaining Stage Time ---
+def stage_remaining_seconds(stage):
+    """
+    Returns the seconds a stage may still spend on fetching (infinite without a budget).
+    The stage clock starts on the first call.
+
+    Args:
+        stage (str): A key of STAGE_BUDGET_SHARES (e.g., "loot_history").
+    """
+    if _run_started is None:
+        return math.inf
+    started = _stage_started.setdefault(stage, time.monotonic())
+    stage_budget = STAGE_BUDGET_SHARES.get(stage, DEFAULT_STAGE_SHARE) * RUN_DEADLINE_SECONDS
+    stage_left = stage_budget - (time.monotonic() - started)
+    return min(stage_left, run_remaining_seconds() - DELIVERY_RESERVE_SECONDS)
+
+
+# --- Function to Get a Delivery Timeout ---
+def delivery_timeout_seconds():
+    """
+    Timeout for a Discord request: what is left of the run, but never less than the delivery reserve.
+    None (no timeout) when no run budget is active.
+    """
+    if _run_started is None:
+        return None
+    return max(run_remaining_seconds(), DELIVERY_RESERVE_SECONDS)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from report_state import REPORT_STATE_DIR
+
+# Checkpoints of one report run, so a retried run (python <report>.py --resume) only repeats the part that
+# failed. Each stage writes its results under <RUN_CHECKPOINT_DIR>/<run id>/<script>/<stage>/:
+#   inputs    raw WoW Audit response bodies and the parsed Google Sheet tier data
+#   embeds    the rendered Discord payload per report key
+#   delivery  the receipt (message id) of every delivered payload
+# On resume, inputs are read from the checkpoint instead of the network, a rendered payload is sent
+# exactly as it was first rendered, and payloads with a receipt are not delivered again.
+
+# --- Configuration ---
+# GitHub keeps GITHUB_RUN_ID across "Re-run jobs", so a retry finds the checkpoints of the failed attempt.
+REPORT_RUN_ID = os.getenv('REPORT_RUN_ID') or os.getenv('GITHUB_RUN_ID') or 'local'
+RUN_CHECKPOINT_DIR = os.getenv('RUN_CHECKPOINT_DIR', os.path.join(REPORT_STATE_DIR, 'runs'))
+
+# Checkpoints of other runs older than this are deleted when a run starts.
+RUN_CHECKPOINT_MAX_AGE_DAYS = 7
+
+_run_dir = None
+_resuming = False
+
+
+# --- Function to Start Checkpointing a Run ---
+def start_run_checkpoint(script_name, resume=False):
+    """
+    Enables checkpointing for this process. A fresh run discards earlier checkpoints of the same run id
+    and script; a resumed run reads them back.
+
+    Args:
+        script_name (str): Name of the report script (e.g., "combined_report").
+        resume (bool): Pick up from the checkpoints of an earlier attempt.
+    """
+    global _run_dir, _resuming
+    _run_dir = os.path.join(RUN_CHECKPOINT_DIR, REPORT_RUN_ID, script_name)
+    _resuming = resume
+
+    if resume:
+        if os.path.isdir(_run_dir):
+            print(f"Resuming run {REPORT_RUN_ID} from the checkpoints in '{_run_dir}'.")
+        else:
+            print(f"Warning: No checkpoints found for run {REPORT_RUN_ID} in '{_run_dir}'. Starting from scratch.")
+    else:
+        shutil.rmtree(_run_dir, ignore_errors=True)
+    os.makedirs(_run_dir, exist_ok=True)
+    prune_run_checkpoints()
+
+
+# --- Function to Stop Reading Checkpoints ---
+def finish_resume():
+    """
+    Makes the rest of the process fetch fresh data again (e.g., the next poll of watch mode), while still writing checkpoints.
+    """
+    global _resuming
+    _resuming = False
+
+
+# --- Function to Discard the Checkpoints of a Successful Run ---
+def finish_run_checkpoint():
+    """
+    Deletes this run's checkpoints and stops checkpointing. Called when the run succeeded; a failed run
+    keeps its checkpoints so a retry can --resume.
+    """
+    global _run_dir, _resuming
+    if _run_dir is None:
+        return
+    shutil.rmtree(_run_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(_run_dir)) # The run id directory, once no other script of the run has checkpoints
+    except OSError:
+        pass
+    _run_dir = None
+    _resuming = False
+
+
+# --- Function to Delete Old Checkpoints ---
+def prune_run_checkpoints():
+    """
+    Deletes the checkpoint directories of other runs that were last modified more than RUN_CHECKPOINT_MAX_AGE_DAYS ago.
+    Successful runs delete their own (see finish_run_checkpoint), so only failed runs that were never retried are left.
+    """
+    cutoff = time.time() - RUN_CHECKPOINT_MAX_AGE_DAYS * 24 * 3600
+    for run_id in os.listdir(RUN_CHECKPOINT_DIR):
+        run_path = os.path.join(RUN_CHECKPOINT_DIR, run_id)
+        if run_id != REPORT_RUN_ID and os.path.isdir(run_path) and os.path.getmtime(run_path) < cutoff:
+            shutil.rmtree(run_path, ignore_errors=True)
+
+
+def _checkpoint_file(stage, name):
+    return os.path.join(_run_dir, stage, hashlib.sha1(name.encode('utf-8')).hexdigest()[:20])
+
+
+# --- Function to Read a Checkpoint ---
+def load_checkpoint(stage, name):
+    """
+    Returns the bytes checkpointed for (stage, name) by an earlier attempt, or None. Only resumed runs read checkpoints.
+    """
+    if _run_dir is None or not _resuming:
+        return None
+    path = _checkpoint_file(stage, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# --- Function to Write a Checkpoint ---
+def save_checkpoint(stage, name, data):
+    """
+    Writes the bytes for (stage, name) atomically. Does nothing unless start_run_checkpoint was called.
+    """
+    if _run_dir is None:
+        return
+    path = _checkpoint_file(stage, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- JSON Helpers ---
+def load_json_checkpoint(stage, name):
+    data = load_checkpoint(stage, name)
+    return json.loads(data) if data is not None else None
+
+
+def save_json_checkpoint(stage, name, value):
+    save_checkpoint(stage, name, json.dumps(value, ensure_ascii=False).encode('utf-8'))
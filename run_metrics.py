@@ -0,0 +1,151 @@
+import requests
+import os
+import tempfile
+import threading
+import time
+
+# Metrics of one report run: how the run performed (stage durations, HTTP requests, retries, payload sizes)
+# and what it reported (vault compliance, zero-loot players, roster size per data source). At the end of the run they are
+# written as an OpenMetrics textfile (METRICS_DIR/<script>.prom, readable by the node_exporter textfile
+# collector) and, when METRICS_PUSH_URL is set, pushed to a Pushgateway.
+
+# --- Configuration ---
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')
+
+# Base URL of a Pushgateway (e.g., http://localhost:9091). Each run replaces the group job=<script>.
+METRICS_PUSH_URL = os.getenv('METRICS_PUSH_URL')
+METRICS_PUSH_TIMEOUT_SECONDS = 10
+
+_lock = threading.Lock() # Hedged requests and backfill threads record concurrently
+_metrics = {} # {name: {"type": "counter"|"gauge", "help": str, "samples": {((label, value), ...): number}}}
+_current_stage = None
+_stage_started = None
+
+
+# --- Functions to Record Metrics ---
+def inc_counter(name, help_text, amount=1, **labels):
+    """
+    Adds `amount` to a counter. The name is given without the _total suffix, which the exposition adds.
+    """
+    with _lock:
+        metric = _metrics.setdefault(name, {"type": "counter", "help": help_text, "samples": {}})
+        key = tuple(sorted(labels.items()))
+        metric["samples"][key] = metric["samples"].get(key, 0) + amount
+
+
+def set_gauge(name, help_text, value, add=False, **labels):
+    """
+    Sets a gauge to `value`, or adds `value` to it when add=True.
+    """
+    with _lock:
+        metric = _metrics.setdefault(name, {"type": "gauge", "help": help_text, "samples": {}})
+        key = tuple(sorted(labels.items()))
+        metric["samples"][key] = (metric["samples"].get(key, 0) + value) if add else value
+
+
+# --- Functions to Record Guild Metrics ---
+def record_vault_compliance(period, roster_size, missing_one, missing_two):
+    """
+    Records how many players of the reported period miss one or two M+ vault slots.
+
+    Args:
+        period (str): Which period the numbers describe ("current" or "previous").
+        roster_size (int): Players in the period's historical data.
+        missing_one (int): Players missing one vault slot.
+        missing_two (int): Players missing two vault slots.
+    """
+    set_gauge("guild_roster_size", "Players in the reported data, by data source", roster_size, source="mplus")
+    set_gauge("guild_players_missing_vault_slots", "Players missing M+ vault slots in the reported period", missing_one, period=period, missing="1")
+    set_gauge("guild_players_missing_vault_slots", "Players missing M+ vault slots in the reported period", missing_two, period=period, missing="2")
+
+
+def record_zero_loot_players(player_loot_data):
+    """
+    Records the roster size and how many players have received no loot this season.
+    """
+    set_gauge("guild_roster_size", "Players in the reported data, by data source", len(player_loot_data), source="loot")
+    set_gauge("guild_zero_loot_players", "Players without loot this season", sum(1 for player in player_loot_data if player['LootCount'] == 0))
+
+
+# --- Function to Time Report Stages ---
+def start_stage(name):
+    """
+    Ends the running stage (recording its duration) and starts timing a new one. Called by report_profiling.mark_stage.
+    """
+    global _current_stage, _stage_started
+    finish_stage()
+    _current_stage = name
+    _stage_started = time.perf_counter()
+
+
+def finish_stage():
+    global _current_stage
+    if _current_stage is not None:
+        set_gauge("report_stage_duration_seconds", "Wall-clock seconds spent per report stage in the last run",
+                  time.perf_counter() - _stage_started, add=True, stage=_current_stage)
+        _current_stage = None
+
+
+# --- Function to Render the Exposition ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics(script_name, openmetrics=True):
+    """
+    Returns all metrics in the text exposition format, each sample labelled with script=<script_name>.
+
+    Args:
+        script_name (str): The report script (e.g., "combined_report").
+        openmetrics (bool): OpenMetrics 1.0 (counters typed without _total, "# EOF" terminator) or
+                            the Prometheus 0.0.4 text format, which the Pushgateway accepts.
+    """
+    lines = []
+    with _lock:
+        for name in sorted(_metrics):
+            metric = _metrics[name]
+            sample_name = f"{name}_total" if metric["type"] == "counter" else name
+            type_name = name if openmetrics else sample_name
+            lines.append(f"# HELP {type_name} {metric['help']}")
+            lines.append(f"# TYPE {type_name} {metric['type']}")
+            for labels, value in sorted(metric["samples"].items()):
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in (("script", script_name),) + labels)
+                lines.append(f"{sample_name}{{{label_text}}} {float(value)!r}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+# --- Function to Write and Push the Run's Metrics ---
+def write_metrics(script_name, exit_code, run_seconds):
+    """
+    Adds the run-level gauges, writes METRICS_DIR/<script>.prom atomically and pushes to METRICS_PUSH_URL if set.
+    Failures are only logged; metrics never fail a report run.
+    """
+    finish_stage()
+    set_gauge("report_run_duration_seconds", "Wall-clock seconds of the whole run", run_seconds)
+    set_gauge("report_run_exit_code", "Exit code of the run (0 = success)", exit_code)
+    set_gauge("report_run_finished_timestamp_seconds", "Unix time the run finished", time.time())
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{script_name}.prom")
+        fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, prefix=f".{script_name}.", suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(render_metrics(script_name))
+        os.chmod(tmp_path, 0o644) # The textfile collector usually runs as another user
+        os.replace(tmp_path, path)
+        print(f"DEBUG: Wrote run metrics to '{path}'.")
+    except OSError as e:
+        print(f"Warning: Could not write run metrics: {e}")
+
+    if METRICS_PUSH_URL:
+        try:
+            response = requests.put(f"{METRICS_PUSH_URL.rstrip('/')}/metrics/job/{script_name}",
+                                    data=render_metrics(script_name, openmetrics=False).encode('utf-8'),
+                                    headers={"Content-Type": "text/plain; version=0.0.4"},
+                                    timeout=METRICS_PUSH_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            print(f"DEBUG: Pushed run metrics to {METRICS_PUSH_URL}.")
+        except requests.exceptions.RequestException as e:
+            print(f"Warning: Could not push run metrics to {METRICS_PUSH_URL}: {e}")
@@ -0,0 +1,144 @@
+import json
+import os
+
+from tier_sheet import cached_worksheet_rows, refresh_cached_worksheet_rows, spreadsheet_change_marker
+
+# gspread is imported lazily inside write_back_to_sheet, like fetch_tier_data_from_sheet in the report scripts.
+
+# --- Configuration ---
+# 1-indexed sheet columns that receive computed stats. Leave unset to not write that stat.
+GOOGLE_SHEET_LOOT_COUNT_COLUMN = os.getenv('GOOGLE_SHEET_LOOT_COUNT_COLUMN')
+GOOGLE_SHEET_VAULT_STATUS_COLUMN = os.getenv('GOOGLE_SHEET_VAULT_STATUS_COLUMN')
+
+
+# --- Function to Build the Column Configuration ---
+def configured_writeback_columns(column_values_by_name):
+    """
+    Maps the configured sheet columns to their values, dropping stats without a configured column.
+
+    Args:
+        column_values_by_name (dict): {"loot_count": {player: value}, "vault_status": {player: value}}.
+
+    Returns:
+        dict: {1-indexed column: {player: value}}.
+    """
+    configured = {"loot_count": GOOGLE_SHEET_LOOT_COUNT_COLUMN, "vault_status": GOOGLE_SHEET_VAULT_STATUS_COLUMN}
+    columns = {}
+    for stat_name, values in column_values_by_name.items():
+        column = configured.get(stat_name)
+        if column:
+            columns[int(column)] = values
+    return columns
+
+
+# --- Function to Compute Changed Cells ---
+def compute_sheet_updates(all_values, player_col, column_values):
+    """
+    Compares the desired values with the current sheet contents and returns only the cells that differ.
+    Players are matched on the name column, the same way fetch_tier_data_from_sheet reads tier pieces.
+
+    Args:
+        all_values (list): Worksheet rows as returned by get_all_values() (first row is the header).
+        player_col (int): 1-indexed column with player names.
+        column_values (dict): {1-indexed column: {player name: value}}.
+
+    Returns:
+        list: Updates for Worksheet.batch_update, e.g. [{"range": "X5", "values": [["12"]]}].
+    """
+    from gspread.utils import rowcol_to_a1
+
+    updates = []
+    for row_index, row in enumerate(all_values[1:], start=2): # Skip header row
+        if len(row) < player_col:
+            continue
+        player_name = row[player_col - 1].strip()
+        if not player_name:
+            continue
+        for column, values in column_values.items():
+            if player_name not in values:
+                continue
+            new_value = str(values[player_name])
+            current_value = row[column - 1].strip() if len(row) >= column else ""
+            if current_value != new_value:
+                updates.append({"range": rowcol_to_a1(row_index, column), "values": [[new_value]]})
+    return updates
+
+
+# --- Function to Apply Written Cells to the Rows ---
+def apply_sheet_updates(all_values, updates):
+    """
+    Returns a copy of the worksheet rows with the batch_update cells applied, padding short rows.
+
+    Args:
+        all_values (list): Worksheet rows as returned by get_all_values().
+        updates (list): Updates as returned by compute_sheet_updates.
+
+    Returns:
+        list: The rows as the sheet holds them after the write.
+    """
+    from gspread.utils import a1_to_rowcol
+
+    rows = [list(row) for row in all_values]
+    for update in updates:
+        row_index, column = a1_to_rowcol(update["range"])
+        row = rows[row_index - 1]
+        row.extend([""] * (column - len(row)))
+        row[column - 1] = update["values"][0][0]
+    return rows
+
+
+# --- Function to Write Stats Back to the Google Sheet ---
+def write_back_to_sheet(sheet_url, worksheet_name, player_col, column_values, credentials_json):
+    """
+    Writes computed stats to the sheet in a single batch_update call. Nothing is written when every
+    cell already holds the desired value. The comparison reuses the rows the tier fetch cached when the
+    spreadsheet has not been modified since, and a write refreshes that cache's change marker.
+
+    Args:
+        sheet_url (str): The URL of the Google Sheet.
+        worksheet_name (str): The name of the worksheet (tab).
+        player_col (int): 1-indexed column with player names.
+        column_values (dict): {1-indexed column: {player name: value}}, see configured_writeback_columns.
+        credentials_json (str): JSON string of Google Service Account credentials.
+
+    Returns:
+        int: Number of cells updated.
+    """
+    if not column_values:
+        print("DEBUG: No sheet write-back columns configured. Skipping Google Sheet write-back.")
+        return 0
+    if not credentials_json:
+        print("Warning: GOOGLE_SHEETS_CREDENTIALS environment variable is not set. Skipping Google Sheet write-back.")
+        return 0
+
+    import gspread # Library for Google Sheets API interaction (imported here, see top of file)
+
+    try:
+        gc = gspread.service_account_from_dict(json.loads(credentials_json))
+        sh = gc.open_by_url(sheet_url)
+        worksheet = sh.worksheet(worksheet_name)
+        all_values = cached_worksheet_rows(sheet_url, worksheet_name, spreadsheet_change_marker(sh))
+        if all_values is None:
+            all_values = worksheet.get_all_values()
+        else:
+            print("DEBUG: Google Sheet unchanged since the tier fetch. Comparing against the cached worksheet rows.")
+        updates = compute_sheet_updates(all_values, player_col, column_values)
+        if not updates:
+            print("Google Sheet is already up to date. Skipping write-back.")
+            return 0
+        worksheet.batch_update(updates, value_input_option='USER_ENTERED')
+        print(f"Successfully wrote {len(updates)} changed cells to the Google Sheet in one batch.")
+        # Our own write bumps the modified time; record it so the next tier fetch still hits its cache
+        refresh_cached_worksheet_rows(sheet_url, worksheet_name, apply_sheet_updates(all_values, updates),
+                                      spreadsheet_change_marker(sh))
+        return len(updates)
+
+    except gspread.exceptions.SpreadsheetNotFound:
+        print(f"Error: Google Spreadsheet not found at URL: {sheet_url}")
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"Error: Worksheet '{worksheet_name}' not found in the spreadsheet.")
+    except json.JSONDecodeError:
+        print("Error: GOOGLE_SHEETS_CREDENTIALS environment variable is not valid JSON.")
+    except Exception as e:
+        print(f"Error writing data to Google Sheet: {e}")
+    return 0
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests") # Installed by the workflows; wowaudit_records imports it
+
+from bulk_decode import BulkDecoder, pack_period_options, unpack_period_options
+
+
+def historical_body(characters):
+    return json.dumps({"characters": characters}).encode("utf-8")
+
+
+def character(name, dungeons):
+    return {"id": 1, "name": name, "data": {"vault_options": {"dungeons": dungeons}}}
+
+
+def test_pack_unpack_round_trip():
+    body = historical_body([
+        character("Alpha", {"option_1": 707, "option_2": 707, "option_3": 710}),
+        character("Bëta", {"option_1": 707, "option_2": None}), # Non-ASCII name, missing and null options
+        {"id": 3, "name": "Gamma", "data": None}, # No vault data at all
+        character("", {"option_1": 707}), # Nameless rows are dropped
+    ])
+
+    assert unpack_period_options(pack_period_options(body)) == {
+        "Alpha": [707, 707, 710],
+        "Bëta": [707, None, None],
+        "Gamma": [None, None, None],
+    }
+
+
+def test_empty_roster_round_trips_to_empty_dict():
+    assert unpack_period_options(pack_period_options(historical_body([]))) == {}
+
+
+def test_inline_decoder_returns_the_same_result():
+    body = historical_body([character("Alpha", {"option_1": 707, "option_2": 700, "option_3": None})])
+
+    with BulkDecoder(max_workers=1) as decoder:
+        future = decoder.submit(pack_period_options, body)
+
+    assert unpack_period_options(future.result()) == {"Alpha": [707, 700, None]}
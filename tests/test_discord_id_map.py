@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests") # Installed by the workflows; discord_id_map imports it
+
+from discord_id_map import apply_map_changeset, compute_map_changeset, merge_changeset_into_file
+from wowaudit_records import Character
+
+
+def test_changeset_converts_old_format_and_adds_new_characters():
+    base_map = {"Alpha": "111", "Beta": {"discord_id": "222", "class": "Mage"}}
+    roster = [Character(1, "Alpha", "Rogue"), Character(2, "Beta", "Mage"), Character(3, "Gamma", "Druid")]
+
+    changeset = compute_map_changeset(base_map, roster)
+    merged, applied, conflicts = apply_map_changeset(base_map, changeset)
+
+    assert merged == {
+        "Alpha": {"discord_id": "111", "class": "Rogue"},
+        "Beta": {"discord_id": "222", "class": "Mage"},
+        "Gamma": {"discord_id": None, "class": "Druid"},
+    }
+    assert (applied, conflicts) == (4, 0)
+
+
+def test_concurrent_edit_of_the_same_field_is_kept():
+    changeset = [{"name": "Alpha", "field": "class", "base": None, "value": "Rogue"}]
+    current_map = {"Alpha": {"discord_id": "111", "class": "Warrior"}} # Someone set the class by hand meanwhile
+
+    merged, applied, conflicts = apply_map_changeset(current_map, changeset)
+
+    assert merged == current_map
+    assert (applied, conflicts) == (0, 1)
+
+
+def test_concurrent_edit_of_another_field_is_merged():
+    changeset = [{"name": "Alpha", "field": "class", "base": None, "value": "Rogue"}]
+    current_map = {"Alpha": {"discord_id": "999"}} # Someone filled in the Discord ID meanwhile
+
+    merged, applied, conflicts = apply_map_changeset(current_map, changeset)
+
+    assert merged == {"Alpha": {"discord_id": "999", "class": "Rogue"}}
+    assert (applied, conflicts) == (1, 0)
+
+
+def test_change_already_applied_is_neither_applied_nor_a_conflict():
+    changeset = [{"name": "Alpha", "field": "class", "base": "Mage", "value": "Rogue"}]
+
+    merged, applied, conflicts = apply_map_changeset({"Alpha": {"discord_id": None, "class": "Rogue"}}, changeset)
+
+    assert (applied, conflicts) == (0, 0)
+
+
+def test_old_format_entry_in_current_map_is_converted_on_merge():
+    changeset = [{"name": "Alpha", "field": "class", "base": None, "value": "Rogue"}]
+
+    merged, applied, conflicts = apply_map_changeset({"Alpha": "111"}, changeset)
+
+    assert merged == {"Alpha": {"discord_id": "111", "class": "Rogue"}}
+    assert (applied, conflicts) == (1, 0)
+
+
+def test_merge_into_file_writes_only_when_something_applied(tmp_path):
+    map_file = tmp_path / "discord_id_map.json"
+    map_file.write_text(json.dumps({"Alpha": {"discord_id": "111", "class": "Warrior"}}), encoding="utf-8")
+    conflicting = [{"name": "Alpha", "field": "class", "base": None, "value": "Rogue"}]
+    new_character = [{"name": "Beta", "field": "class", "base": None, "value": "Mage"}]
+
+    assert merge_changeset_into_file(str(map_file), conflicting) is False
+    assert merge_changeset_into_file(str(map_file), new_character) is True
+    assert json.loads(map_file.read_text(encoding="utf-8")) == {
+        "Alpha": {"discord_id": "111", "class": "Warrior"},
+        "Beta": {"class": "Mage"},
+    }
@@ -0,0 +1,54 @@
+import pytest
+
+import report_state
+from loot_priority import (DEFAULT_PRIORITY_WEIGHTS, SEASON_MATRIX_STATE, compute_priority_scores,
+                           load_mplus_compliance, parse_priority_weights)
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+
+
+def player(name, loot, recent=0, tier=None):
+    return {"PlayerName": name, "LootCount": loot, "RecentLootCount": recent, "Tier": tier}
+
+
+def test_parse_priority_weights_keeps_defaults_for_invalid_entries():
+    weights = parse_priority_weights("loot=2, mplus=abc, bogus=1,")
+    assert weights == dict(DEFAULT_PRIORITY_WEIGHTS, loot=2.0)
+
+
+def test_fewer_items_and_fewer_tier_pieces_rank_first():
+    players = [player("A", 4, tier=(4, 5)), player("B", 0, tier=(1, 5)), player("C", 2, tier=(4, 5))]
+    ranked = compute_priority_scores(players, {}, parse_priority_weights(""))
+    assert [p["PlayerName"] for p in ranked] == ["B", "C", "A"]
+    assert ranked[0]["Priority"] > ranked[1]["Priority"] > ranked[2]["Priority"]
+
+
+def test_ties_are_broken_by_loot_count_then_name():
+    players = [player("B", 0), player("A", 0)]
+    ranked = compute_priority_scores(players, {}, {"loot": 1.0, "tier": 0.0, "recent": 0.0, "mplus": 0.0})
+    assert [p["PlayerName"] for p in ranked] == ["A", "B"]
+
+
+def test_unknown_tier_and_mplus_are_neutral():
+    weights = {"loot": 0.0, "tier": 1.0, "recent": 0.0, "mplus": 1.0}
+    ranked = compute_priority_scores([player("A", 0), player("B", 0, tier=(5, 5))], {"B": 1.0}, weights)
+    assert {p["PlayerName"]: p["Priority"] for p in ranked} == {"A": 50.0, "B": 50.0}
+
+
+def test_mplus_compliance_is_read_from_the_stored_matrix():
+    report_state.save_state(SEASON_MATRIX_STATE, {"season_id": 14, "periods": [1, 2, 3, 4], "statuses": {"A": "0013", "B": "3333"}})
+    assert load_mplus_compliance(14) == {"A": pytest.approx(2 / 3)}
+    assert load_mplus_compliance(15) == {}
+
+
+def test_mplus_compliance_adds_the_latest_period_only_when_not_stored():
+    report_state.save_state(SEASON_MATRIX_STATE, {"season_id": 14, "periods": [1, 2], "statuses": {"A": "01"}})
+    assert load_mplus_compliance(14, 3, {"A": True, "C": False}) == {"A": pytest.approx(2 / 3), "C": 0.0}
+    assert load_mplus_compliance(14, 2, {"A": True}) == {"A": 0.5}
+
+
+def test_mplus_compliance_is_neutral_without_a_stored_matrix():
+    assert load_mplus_compliance(14, 3, {"A": True}) == {}
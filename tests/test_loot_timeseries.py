@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("requests") # Installed by the workflows; wowaudit_records imports it
+
+import report_state
+from loot_timeseries import (load_loot_matrix, loot_in_period, loot_in_window, refresh_loot_matrix, save_loot_matrix,
+                             update_loot_matrix)
+from wowaudit_records import LootEntry
+
+SEASON_ID = 14
+FIRST_PERIOD = 1000
+CURRENT_PERIOD = 1003
+EXCLUDED = {"pass", "transmog"}
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+
+
+@pytest.fixture
+def matrix():
+    return load_loot_matrix(SEASON_ID, FIRST_PERIOD, CURRENT_PERIOD)
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def loot(loot_id, awarded_ts, character_id=7, response_type="Bis", discarded=False):
+    return LootEntry(loot_id, character_id, 1234, "Item", response_type, discarded, "heroic", "head", iso(awarded_ts))
+
+
+def test_entries_are_bucketed_on_period_boundaries(matrix):
+    starts = matrix["starts"]
+    entries = [
+        loot(1, starts[1]), # Exactly at the reset belongs to the new period
+        loot(2, starts[1] - 1), # One second before it to the previous one
+        loot(3, starts[3] + 3600), # Running period
+        loot(4, starts[0] - 1), # Before the first tracked period
+    ]
+
+    assert update_loot_matrix(matrix, entries, EXCLUDED) == (4, 0)
+
+    assert [loot_in_period(matrix, 7, period) for period in range(FIRST_PERIOD, CURRENT_PERIOD + 1)] == [1, 1, 0, 1]
+    assert loot_in_window(matrix, 7, CURRENT_PERIOD, weeks=2) == 1
+    assert matrix["cursor"] == 4
+
+
+def test_excluded_and_discarded_entries_are_not_counted(matrix):
+    starts = matrix["starts"]
+    entries = [loot(1, starts[2], response_type="Pass"), loot(2, starts[2], discarded=True), loot(3, starts[2], response_type=None)]
+
+    update_loot_matrix(matrix, entries, EXCLUDED)
+
+    assert loot_in_period(matrix, 7, FIRST_PERIOD + 2) == 0
+
+
+def test_edited_entries_are_recounted_and_unchanged_ones_skipped(matrix):
+    starts = matrix["starts"]
+    update_loot_matrix(matrix, [loot(1, starts[0]), loot(2, starts[1])], EXCLUDED)
+
+    edited = [
+        loot(1, starts[0], discarded=True), # Marked as discarded later
+        loot(2, starts[2]), # Award time corrected into another period
+        loot(3, starts[3]), # New
+    ]
+    assert update_loot_matrix(matrix, edited, EXCLUDED) == (1, 2)
+    assert [loot_in_period(matrix, 7, period) for period in range(FIRST_PERIOD, CURRENT_PERIOD + 1)] == [0, 0, 1, 1]
+
+    assert update_loot_matrix(matrix, edited, EXCLUDED) == (0, 0)
+
+
+def test_stored_matrix_is_extended_after_a_reset():
+    matrix = refresh_loot_matrix(SEASON_ID, FIRST_PERIOD, CURRENT_PERIOD, [], EXCLUDED)
+    update_loot_matrix(matrix, [loot(1, matrix["starts"][1])], EXCLUDED)
+    save_loot_matrix(matrix)
+
+    extended = load_loot_matrix(SEASON_ID, FIRST_PERIOD, CURRENT_PERIOD + 1)
+
+    assert len(extended["starts"]) == 5
+    assert extended["counts"]["7"] == [0, 1, 0, 0, 0]
+
+
+def test_fallback_first_period_is_kept_across_runs(monkeypatch):
+    monkeypatch.setattr("loot_timeseries.LOOT_MATRIX_FALLBACK_WEEKS", 3)
+    refresh_loot_matrix(SEASON_ID, None, CURRENT_PERIOD, [], EXCLUDED)
+
+    assert load_loot_matrix(SEASON_ID, None, CURRENT_PERIOD + 2)["first_period"] == CURRENT_PERIOD - 2
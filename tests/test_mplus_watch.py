@@ -0,0 +1,119 @@
+import pytest
+
+pytest.importorskip("requests") # Installed by the workflows; check_mplus_requirements imports it
+
+import check_mplus_requirements as watch
+import report_state
+from report_state import load_state, save_state
+from wowaudit_records import VaultSnapshot
+
+COMPLETE = watch.VAULT_STATUS_COMPLETE
+MISSING_ONE = watch.VAULT_STATUS_MISSING_ONE
+MISSING_TWO = watch.VAULT_STATUS_MISSING_TWO
+MET = watch.REQUIRED_DUNGEON_OPTION_VALUE
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+
+
+@pytest.fixture
+def poll(monkeypatch):
+    """
+    Wires watch_current_period_once to an in-memory period and roster. Returns the list of posted embeds;
+    set poll.period / poll.snapshots / poll.delivered between calls.
+    """
+    class Poll(list):
+        period = 1010
+        snapshots = []
+        delivered = True
+
+    posted = Poll()
+
+    def fake_send(message, webhook_url, embed_title="", embed_color=0, thumbnail_url=None, report_key=None):
+        posted.append(message)
+        return posted.delivered
+
+    monkeypatch.setattr(watch, "get_period_data", lambda api_auth_header: {"current_period": posted.period})
+    monkeypatch.setattr(watch, "fetch_wowaudit", lambda endpoint, api_auth_header: endpoint)
+    monkeypatch.setattr(watch, "decode_historical_data", lambda body: posted.snapshots)
+    monkeypatch.setattr(watch, "send_discord_webhook", fake_send)
+    return posted
+
+
+def snapshot(name, option_1=None, option_2=None):
+    return VaultSnapshot(1, name, option_1, option_2, None)
+
+
+def test_diff_reports_only_forward_transitions():
+    previous = {"Alpha": MISSING_TWO, "Beta": MISSING_TWO, "Gamma": MISSING_ONE, "Delta": COMPLETE, "Epsilon": MISSING_ONE}
+    current = {"Alpha": COMPLETE, "Beta": MISSING_ONE, "Gamma": MISSING_ONE, "Delta": COMPLETE, "Epsilon": MISSING_TWO, "Zeta": MISSING_ONE}
+
+    newly_completed, newly_one_slot_short, new_members = watch.diff_vault_statuses(previous, current)
+
+    assert newly_completed == ["Alpha"]
+    assert newly_one_slot_short == ["Beta"]
+    assert new_members == [("Zeta", MISSING_ONE)]
+
+
+def test_first_poll_stores_baseline_without_posting(poll):
+    poll.snapshots = [snapshot("Alpha", MET, MET)]
+
+    watch.watch_current_period_once("key", "https://discord.invalid")
+
+    assert poll == []
+    assert load_state(watch.WATCH_SNAPSHOT_STATE) == {"period": 1010, "statuses": {"Alpha": COMPLETE}}
+
+
+def test_unchanged_poll_posts_nothing(poll):
+    save_state(watch.WATCH_SNAPSHOT_STATE, {"period": 1010, "statuses": {"Alpha": MISSING_ONE}})
+    poll.snapshots = [snapshot("Alpha", MET)]
+
+    watch.watch_current_period_once("key", "https://discord.invalid")
+
+    assert poll == []
+
+
+def test_transition_is_posted_once(poll):
+    save_state(watch.WATCH_SNAPSHOT_STATE, {"period": 1010, "statuses": {"Alpha": MISSING_ONE}})
+    poll.snapshots = [snapshot("Alpha", MET, MET)]
+
+    watch.watch_current_period_once("key", "https://discord.invalid")
+    watch.watch_current_period_once("key", "https://discord.invalid")
+
+    assert len(poll) == 1
+    assert "Har nu klaret" in poll[0] and "Alpha" in poll[0]
+
+
+def test_failed_delivery_keeps_snapshot_for_retry(poll):
+    save_state(watch.WATCH_SNAPSHOT_STATE, {"period": 1010, "statuses": {"Alpha": MISSING_ONE}})
+    poll.snapshots = [snapshot("Alpha", MET, MET)]
+    poll.delivered = False
+
+    watch.watch_current_period_once("key", "https://discord.invalid")
+
+    assert load_state(watch.WATCH_SNAPSHOT_STATE)["statuses"] == {"Alpha": MISSING_ONE}
+
+
+def test_period_reset_reports_progress_made_before_first_poll(poll):
+    save_state(watch.WATCH_SNAPSHOT_STATE, {"period": 1009, "statuses": {"Alpha": COMPLETE, "Beta": COMPLETE}})
+    poll.period = 1010
+    poll.snapshots = [snapshot("Alpha", MET, MET), snapshot("Beta")]
+
+    watch.watch_current_period_once("key", "https://discord.invalid")
+
+    assert len(poll) == 1
+    assert "Alpha" in poll[0] and "Beta" not in poll[0]
+    assert load_state(watch.WATCH_SNAPSHOT_STATE) == {"period": 1010, "statuses": {"Alpha": COMPLETE, "Beta": MISSING_TWO}}
+
+
+def test_watch_mode_without_interval_polls_once(monkeypatch):
+    polls = []
+    monkeypatch.setattr(watch, "WATCH_INTERVAL_MINUTES", 0)
+    monkeypatch.setattr(watch, "start_run_budget", lambda: None)
+    monkeypatch.setattr(watch, "watch_current_period_once", lambda api_auth_header, webhook_url: polls.append(api_auth_header))
+
+    watch.run_watch_mode("key", "https://discord.invalid")
+
+    assert polls == ["key"]
@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+
+import pytest
+
+requests = pytest.importorskip("requests") # Installed by the workflows; period_calendar imports it
+
+import period_calendar
+import report_state
+from loot_timeseries import WEEK_SECONDS, current_period_start
+from period_calendar import PERIOD_CALENDAR_STATE, get_period_data
+from report_state import load_state, save_state
+
+SEASON_14 = {"keystone_season_id": 14, "first_period_id": 1000, "end_date": None}
+SEASON_15 = {"keystone_season_id": 15, "first_period_id": 1030, "end_date": None}
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(period_calendar, "PERIOD_CALENDAR_ENABLED", True)
+    monkeypatch.setattr(period_calendar, "PERIOD_CALENDAR_TRUST_WEEKS", 4)
+    monkeypatch.setattr(period_calendar, "stale_sources", lambda: {})
+
+
+class FakePeriodApi:
+    """
+    Stands in for get_wowaudit_json('/period', ...): records calls and returns (or raises) `answer`.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.answer = {"current_period": 1010, "current_season": SEASON_14}
+
+    def __call__(self, endpoint, api_auth_header):
+        self.calls.append(endpoint)
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakePeriodApi()
+    monkeypatch.setattr(period_calendar, "get_wowaudit_json", fake)
+    return fake
+
+
+def store_calendar(weeks_ago, valid_for_weeks, season=SEASON_14, period=1010):
+    anchor = current_period_start() - weeks_ago * WEEK_SECONDS
+    save_state(PERIOD_CALENDAR_STATE, {
+        "region": period_calendar.WOW_REGION,
+        "period": period,
+        "period_start": anchor,
+        "season": season,
+        "seasons": {str(season["keystone_season_id"]): season["first_period_id"]},
+        "valid_until": anchor + valid_for_weeks * WEEK_SECONDS,
+        "validated_at": anchor,
+    })
+
+
+def test_first_run_fetches_and_trusts_calendar_for_several_weeks(api):
+    assert get_period_data("key")["current_period"] == 1010
+    assert get_period_data("key")["current_period"] == 1010
+
+    assert api.calls == ["/period"]
+    calendar = load_state(PERIOD_CALENDAR_STATE)
+    assert calendar["valid_until"] == calendar["period_start"] + 5 * WEEK_SECONDS
+
+
+def test_calendar_projects_the_period_across_resets(api):
+    store_calendar(weeks_ago=3, valid_for_weeks=5)
+
+    assert get_period_data("key") == {"current_period": 1013, "current_season": SEASON_14}
+    assert api.calls == []
+
+
+def test_expired_calendar_is_revalidated(api):
+    store_calendar(weeks_ago=6, valid_for_weeks=5, period=1004)
+    api.answer = {"current_period": 1010, "current_season": SEASON_14}
+
+    assert get_period_data("key")["current_period"] == 1010
+    assert api.calls == ["/period"]
+    assert load_state(PERIOD_CALENDAR_STATE)["period_start"] == current_period_start()
+
+
+def test_passed_season_end_rolls_over_to_next_season(api):
+    season_end = datetime.fromtimestamp(current_period_start(), timezone.utc).isoformat() # Ended at the last reset
+    store_calendar(weeks_ago=1, valid_for_weeks=1, season=dict(SEASON_14, end_date=season_end), period=1029)
+    api.answer = {"current_period": 1030, "current_season": SEASON_15}
+
+    period_data = get_period_data("key")
+
+    assert api.calls == ["/period"]
+    assert period_data["current_season"]["keystone_season_id"] == 15
+    assert load_state(PERIOD_CALENDAR_STATE)["seasons"] == {"14": 1000, "15": 1030}
+
+
+def test_future_season_end_is_trusted_over_trust_weeks(api):
+    api.answer = {"current_period": 1010, "current_season": dict(SEASON_14, end_date="2999-01-01T00:00:00Z")}
+
+    get_period_data("key")
+
+    assert load_state(PERIOD_CALENDAR_STATE)["valid_until"] == period_calendar.parse_awarded_at("2999-01-01T00:00:00Z")
+
+
+def test_api_failure_falls_back_to_expired_calendar(api):
+    store_calendar(weeks_ago=6, valid_for_weeks=5, period=1004)
+    api.answer = requests.exceptions.ConnectionError("down")
+
+    assert get_period_data("key")["current_period"] == 1010
+    assert api.calls == ["/period"]
@@ -0,0 +1,83 @@
+import pytest
+
+import rate_limiter
+import report_state
+from rate_limiter import acquire_token, observe_rate_limit_headers
+
+API_KEY = "test-key"
+
+
+class FakeClock:
+    """
+    Replaces the time module in rate_limiter: sleep() advances time() instead of waiting.
+    """
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(rate_limiter, "WOWAUDIT_RATE_LIMIT_PER_SECOND", 2.0)
+    monkeypatch.setattr(rate_limiter, "WOWAUDIT_RATE_LIMIT_BURST", 3.0)
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake_clock)
+    return fake_clock
+
+
+def test_burst_is_served_immediately_then_tokens_refill_at_the_rate(clock):
+    start = clock.now
+    for _ in range(3):
+        assert acquire_token(API_KEY, timeout=10)
+    assert clock.now == start
+
+    assert acquire_token(API_KEY, timeout=10)
+    assert clock.now - start == pytest.approx(0.5, abs=0.02) # One token at 2/s
+
+
+def test_refill_is_capped_at_the_burst_size(clock):
+    for _ in range(3):
+        acquire_token(API_KEY, timeout=10)
+    clock.now += 60 # Far longer than needed to refill three tokens
+
+    start = clock.now
+    for _ in range(3):
+        assert acquire_token(API_KEY, timeout=10)
+    assert clock.now == start
+    assert acquire_token(API_KEY, timeout=10)
+    assert clock.now > start
+
+
+def test_retry_after_blocks_the_bucket(clock):
+    start = clock.now
+    observe_rate_limit_headers(API_KEY, {"Retry-After": "4"})
+
+    assert acquire_token(API_KEY, timeout=10)
+    assert clock.now - start == pytest.approx(4, abs=0.02)
+
+
+def test_exhausted_server_window_blocks_until_reset(clock):
+    start = clock.now
+    observe_rate_limit_headers(API_KEY, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(start + 2)})
+
+    assert acquire_token(API_KEY, timeout=10)
+    assert clock.now - start == pytest.approx(2, abs=0.02)
+
+
+def test_timeout_gives_up_the_turn(clock):
+    observe_rate_limit_headers(API_KEY, {"Retry-After": "30"})
+
+    assert not acquire_token(API_KEY, timeout=1)
+
+    # The next caller is not stuck behind the abandoned ticket
+    clock.now += 30
+    start = clock.now
+    assert acquire_token(API_KEY, timeout=1)
+    assert clock.now == start
@@ -0,0 +1,61 @@
+import json
+import sys
+
+import pytest
+
+import report_state
+import tier_sheet
+from tier_sheet import LocalSheetClient, fetch_tier_data_from_sheet
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/local"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_state, "REPORT_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setitem(sys.modules, "gspread", None) # Any gspread import fails, as if it were not installed
+
+
+def write_sheet(path, rows, last_update_time="2025-01-01T12:00:00.000Z"):
+    path.write_text(json.dumps({"last_update_time": last_update_time, "worksheets": {"Overview": rows}}), encoding="utf-8")
+
+
+def test_reads_tier_data_without_gspread(tmp_path):
+    sheet_file = tmp_path / "sheet.json"
+    write_sheet(sheet_file, [["Name", "Class", "Tier"], ["Alpha", "Mage", "4/5"], ["", "Rogue", "1/5"], ["Beta", "Druid"]])
+
+    tier_data = fetch_tier_data_from_sheet(SHEET_URL, "Overview", 1, 3, None, client=LocalSheetClient(str(sheet_file)))
+
+    assert tier_data == {"Alpha": "4/5"}
+
+
+def test_unchanged_sheet_is_served_from_cache(tmp_path, monkeypatch):
+    sheet_file = tmp_path / "sheet.json"
+    write_sheet(sheet_file, [["Name", "Tier"], ["Alpha", "2/5"]])
+    client = LocalSheetClient(str(sheet_file))
+    assert fetch_tier_data_from_sheet(SHEET_URL, "Overview", 1, 2, None, client=client) == {"Alpha": "2/5"}
+
+    def fail_worksheet(self, worksheet_name):
+        raise AssertionError("worksheet read although the sheet is unchanged")
+
+    monkeypatch.setattr(tier_sheet._LocalSpreadsheet, "worksheet", fail_worksheet)
+    assert fetch_tier_data_from_sheet(SHEET_URL, "Overview", 1, 2, None, client=client) == {"Alpha": "2/5"}
+
+
+def test_missing_worksheet_and_file_return_empty(tmp_path, capsys):
+    sheet_file = tmp_path / "sheet.json"
+    write_sheet(sheet_file, [["Name", "Tier"]])
+
+    assert fetch_tier_data_from_sheet(SHEET_URL, "Roster", 1, 2, None, client=LocalSheetClient(str(sheet_file))) == {}
+    assert "Worksheet 'Roster' not found" in capsys.readouterr().out
+
+    assert fetch_tier_data_from_sheet(SHEET_URL, "Overview", 1, 2, None, client=LocalSheetClient(str(tmp_path / "missing.json"))) == {}
+    assert "Google Spreadsheet not found" in capsys.readouterr().out
+
+
+def test_local_file_setting_creates_local_client(tmp_path, monkeypatch):
+    sheet_file = tmp_path / "sheet.json"
+    write_sheet(sheet_file, [["Name", "Tier"], ["Gamma", "5/5"]])
+    monkeypatch.setattr(tier_sheet, "GOOGLE_SHEET_LOCAL_FILE", str(sheet_file))
+
+    assert fetch_tier_data_from_sheet(SHEET_URL, "Overview", 1, 2, None) == {"Gamma": "5/5"}
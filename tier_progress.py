@@ -0,0 +1,164 @@
+import os
+
+from report_state import load_state, save_state
+
+# --- Configuration ---
+# Tier pieces needed for the set bonus the report tracks ("time to 4-set").
+TIER_SET_BONUS_PIECES = int(os.getenv('TIER_SET_BONUS_PIECES', '4'))
+
+# State file holding the player x period tier piece table for the current season.
+TIER_PROGRESS_STATE = 'tier_progress'
+
+
+# --- Function to Parse a Tier Piece String ---
+def parse_tier_pieces(tier_pieces):
+    """
+    Turns a sheet value like "4/5" into (4, 5). Returns None for "N/A" or anything unparsable.
+    """
+    current_str, separator, max_str = str(tier_pieces).partition('/')
+    if not separator:
+        return None
+    try:
+        return int(current_str), int(max_str)
+    except ValueError:
+        return None
+
+
+# --- Function to Parse the Sheet's Tier Data ---
+def parse_tier_table(tier_pieces_data):
+    """
+    Parses the sheet's tier strings once per run.
+
+    Args:
+        tier_pieces_data (dict): {player_name: "x/y"} from fetch_tier_data_from_sheet.
+
+    Returns:
+        dict: {player_name: (current, max)} for every value that could be parsed.
+    """
+    tier_table = {}
+    for player_name, tier_pieces in tier_pieces_data.items():
+        parsed = parse_tier_pieces(tier_pieces)
+        if parsed is not None:
+            tier_table[player_name] = parsed
+    return tier_table
+
+
+# --- Function to Load the Tier Progress Table ---
+def load_tier_progress(season_id, first_period, current_period):
+    """
+    Loads the stored table for this season (or an empty one) and extends it up to current_period.
+    Players' piece counts are carried forward into periods without a snapshot.
+
+    Returns:
+        dict: {"season_id", "first_period", "pieces": {player_name: [pieces per period, None before the first snapshot]},
+               "max_pieces": {player_name: max}, "set_bonus_period": {player_name: first period with the set bonus,
+               or None if the player already had it in their first snapshot}}
+    """
+    progress = load_state(TIER_PROGRESS_STATE)
+    if not progress or progress.get("season_id") != season_id:
+        progress = {
+            "season_id": season_id,
+            "first_period": first_period if first_period is not None else current_period,
+            "pieces": {},
+            "max_pieces": {},
+            "set_bonus_period": {},
+        }
+
+    period_count = current_period - progress["first_period"] + 1
+    for player_pieces in progress["pieces"].values():
+        while len(player_pieces) < period_count:
+            player_pieces.append(player_pieces[-1] if player_pieces else None)
+    return progress
+
+
+# --- Function to Record the Current Snapshot ---
+def record_tier_snapshot(progress, current_period, tier_table):
+    """
+    Writes today's parsed tier counts into the running period's column. Later runs in the same period
+    overwrite it, so each period ends up holding its last snapshot. A player reaching the set bonus
+    is stamped with the period once, so time-to-set never has to be recomputed from the history.
+    Only a rise from below TIER_SET_BONUS_PIECES dates the set bonus; players who already have it in
+    their first snapshot (first run, or added to the sheet mid-season) are stamped None (unknown).
+    """
+    index = current_period - progress["first_period"]
+    if index < 0:
+        return progress
+    period_count = index + 1
+    for player_name, (current_pieces, max_pieces) in tier_table.items():
+        player_pieces = progress["pieces"].setdefault(player_name, [])
+        while len(player_pieces) < period_count:
+            player_pieces.append(None)
+        # Last snapshot before this one (load_tier_progress carries it into this period); None if never seen
+        previous_pieces = next((pieces for pieces in reversed(player_pieces[:period_count]) if pieces is not None), None)
+        player_pieces[index] = current_pieces
+        progress["max_pieces"][player_name] = max_pieces
+        if current_pieces >= TIER_SET_BONUS_PIECES and player_name not in progress["set_bonus_period"]:
+            reached_now = previous_pieces is not None and previous_pieces < TIER_SET_BONUS_PIECES
+            progress["set_bonus_period"][player_name] = current_period if reached_now else None
+    return progress
+
+
+# --- Function to Update and Persist the Tier Progress Table ---
+def refresh_tier_progress(season_id, first_period, current_period, tier_table):
+    """
+    Loads the stored table, records today's snapshot and saves it. An empty tier table (e.g., the sheet
+    could not be read) is not recorded, so it cannot erase the stored history.
+
+    Returns:
+        dict: The updated table, see load_tier_progress.
+    """
+    progress = load_tier_progress(season_id, first_period, current_period)
+    if tier_table:
+        record_tier_snapshot(progress, current_period, tier_table)
+        save_state(TIER_PROGRESS_STATE, progress)
+    return progress
+
+
+# --- Function to Get a Player's Weekly Gain ---
+def tier_gain(progress, player_name, period):
+    """
+    Returns the pieces gained in a period (its snapshot minus the previous period's), or None if either is unknown.
+    """
+    player_pieces = progress["pieces"].get(player_name) if progress else None
+    index = period - progress["first_period"] if progress else -1
+    if not player_pieces or index < 1 or index >= len(player_pieces):
+        return None
+    if player_pieces[index] is None or player_pieces[index - 1] is None:
+        return None
+    return player_pieces[index] - player_pieces[index - 1]
+
+
+# --- Function to Get a Player's Time to the Set Bonus ---
+def weeks_to_set_bonus(progress, player_name):
+    """
+    Returns the season week (1 = first period) in which the player reached TIER_SET_BONUS_PIECES, or None.
+    """
+    set_bonus_period = progress["set_bonus_period"].get(player_name) if progress else None
+    if set_bonus_period is None:
+        return None
+    return set_bonus_period - progress["first_period"] + 1
+
+
+# --- Function to Format the Tier Part of a Loot Line ---
+def format_tier_display(tier_pieces, raw_value, tier_emoji_map, fallback_emoji, gain=None, set_bonus_week=None, week_label="denne uge"):
+    """
+    Returns e.g. "(Tier: 3 / 5, +1 denne uge, 4-sæt i uge 6)" with the emoji from tier_emoji_map.
+
+    Args:
+        tier_pieces (tuple): (current, max) from parse_tier_table, or None if the value was not parsable.
+        raw_value (str): The sheet value, shown with fallback_emoji when tier_pieces is None.
+        tier_emoji_map (dict): {count: emoji}; counts without an emoji are shown as numbers.
+        fallback_emoji (str): Emoji for missing or unparsable values.
+        gain (int, optional): Pieces gained this period, see tier_gain.
+        set_bonus_week (int, optional): Season week the set bonus was reached, see weeks_to_set_bonus.
+        week_label (str): How the report refers to the period of the gain.
+    """
+    if tier_pieces is None:
+        return f"(Tier: {fallback_emoji} {raw_value})"
+    current_pieces, max_pieces = tier_pieces
+    parts = [f"Tier: {tier_emoji_map.get(current_pieces, str(current_pieces))} / {tier_emoji_map.get(max_pieces, str(max_pieces))}"]
+    if gain:
+        parts.append(f"{gain:+d} {week_label}")
+    if set_bonus_week is not None:
+        parts.append(f"{TIER_SET_BONUS_PIECES}-sæt i uge {set_bonus_week}")
+    return f"({', '.join(parts)})"
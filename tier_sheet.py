@@ -0,0 +1,235 @@
+import json
+import os
+
+from report_state import load_state, save_state
+from run_checkpoint import load_json_checkpoint, save_json_checkpoint
+
+# gspread is imported lazily inside the functions below so runs without
+# GOOGLE_SHEETS_CREDENTIALS never load google-auth and its transport stack.
+# Runs against a LocalSheetClient do not need gspread installed at all.
+
+# --- Configuration ---
+# Path to a JSON file that stands in for the Sheets API (see LocalSheetClient). For local runs and testing.
+GOOGLE_SHEET_LOCAL_FILE = os.getenv('GOOGLE_SHEET_LOCAL_FILE')
+
+# State file holding the last read worksheet rows and parsed tier map together with the spreadsheet's modified time.
+TIER_SHEET_CACHE_STATE = 'tier_sheet_cache'
+
+
+# --- Exceptions of the Local Stand-In ---
+class LocalSpreadsheetNotFound(Exception):
+    """
+    Raised by LocalSheetClient when the JSON file does not exist (gspread's SpreadsheetNotFound).
+    """
+
+
+class LocalWorksheetNotFound(Exception):
+    """
+    Raised by LocalSheetClient when the file has no worksheet of that name (gspread's WorksheetNotFound).
+    """
+
+
+# --- Local Stand-In for the Sheets API ---
+class LocalSheetClient:
+    """
+    Serves a spreadsheet from a JSON file with the small part of the gspread client interface the
+    reports use (open_by_url -> get_lastUpdateTime / worksheet -> get_all_values). File format:
+
+        {"last_update_time": "2025-01-01T12:00:00.000Z", "worksheets": {"Overview": [["Name", ...], ...]}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def open_by_url(self, sheet_url):
+        if not os.path.exists(self.path):
+            raise LocalSpreadsheetNotFound(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return _LocalSpreadsheet(json.load(f))
+
+
+class _LocalSpreadsheet:
+    def __init__(self, data):
+        self.data = data
+
+    def get_lastUpdateTime(self):
+        return self.data.get("last_update_time")
+
+    def worksheet(self, worksheet_name):
+        rows = self.data.get("worksheets", {}).get(worksheet_name)
+        if rows is None:
+            raise LocalWorksheetNotFound(worksheet_name)
+        return _LocalWorksheet(rows)
+
+
+class _LocalWorksheet:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_all_values(self):
+        return [[str(value) for value in row] for row in self.rows]
+
+
+# --- Function to Create a Sheets Client ---
+def sheet_client(credentials_json):
+    """
+    Returns a gspread client for the service account, or a LocalSheetClient when GOOGLE_SHEET_LOCAL_FILE is set.
+    """
+    if GOOGLE_SHEET_LOCAL_FILE:
+        return LocalSheetClient(GOOGLE_SHEET_LOCAL_FILE)
+
+    import gspread # Library for Google Sheets API interaction (imported here, see top of file)
+
+    return gspread.service_account_from_dict(json.loads(credentials_json))
+
+
+# --- Function to Get a Client's Not-Found Exceptions ---
+def not_found_errors(client):
+    """
+    Returns the (spreadsheet not found, worksheet not found) exception types the client raises.
+    gspread is only imported for a real client.
+    """
+    if isinstance(client, LocalSheetClient):
+        return LocalSpreadsheetNotFound, LocalWorksheetNotFound
+
+    import gspread # Library for Google Sheets API interaction (imported here, see top of file)
+
+    return gspread.exceptions.SpreadsheetNotFound, gspread.exceptions.WorksheetNotFound
+
+
+# --- Function to Read the Spreadsheet's Change Marker ---
+def spreadsheet_change_marker(spreadsheet):
+    """
+    Returns the spreadsheet's last modified time (a single Drive metadata request), or None if it cannot be read.
+    """
+    try:
+        if hasattr(spreadsheet, "get_lastUpdateTime"): # gspread >= 6
+            return spreadsheet.get_lastUpdateTime()
+        return spreadsheet.lastUpdateTime # gspread 5
+    except Exception as e:
+        print(f"Warning: Could not read the spreadsheet's last update time: {e}. Reading the sheet data.")
+        return None
+
+
+# --- Function to Parse Tier Pieces from Worksheet Rows ---
+def parse_tier_rows(all_values, player_col, tier_col):
+    """
+    Maps player names to their tier piece strings (e.g., {"PlayerName": "4/5"}), skipping the header row.
+    """
+    tier_data = {}
+    for row in all_values[1:]: # Skip header row
+        if len(row) >= max(player_col, tier_col): # Ensure row has enough columns
+            player_name = row[player_col - 1].strip() # Adjust to 0-indexed
+            tier_piece_info = row[tier_col - 1].strip() # Adjust to 0-indexed
+
+            if player_name: # Only add if player name is not empty
+                tier_data[player_name] = tier_piece_info
+    return tier_data
+
+
+# --- Function to Get the Cached Worksheet Rows ---
+def cached_worksheet_rows(sheet_url, worksheet_name, change_marker):
+    """
+    Returns the worksheet rows the last tier fetch read, if the spreadsheet has not been modified since.
+
+    Args:
+        sheet_url (str): The URL of the Google Sheet.
+        worksheet_name (str): The name of the worksheet (tab).
+        change_marker (str): The spreadsheet's current last modified time (see spreadsheet_change_marker).
+
+    Returns:
+        list or None: The rows as returned by get_all_values(), or None if they must be read again.
+    """
+    cached = load_state(TIER_SHEET_CACHE_STATE)
+    if not change_marker or not cached or cached.get("rows") is None:
+        return None
+    if cached.get("key", [])[:2] != [sheet_url, worksheet_name] or cached.get("change_marker") != change_marker:
+        return None
+    return cached["rows"]
+
+
+# --- Function to Refresh the Cache After Our Own Write ---
+def refresh_cached_worksheet_rows(sheet_url, worksheet_name, all_values, change_marker):
+    """
+    Stores rows we just wrote under the spreadsheet's new modified time, so our own write does not
+    invalidate the tier cache on the next run. Does nothing when the cache belongs to another worksheet.
+
+    Args:
+        sheet_url (str): The URL of the Google Sheet.
+        worksheet_name (str): The name of the worksheet (tab).
+        all_values (list): The worksheet rows with the written cells applied.
+        change_marker (str): The spreadsheet's last modified time after the write.
+    """
+    cached = load_state(TIER_SHEET_CACHE_STATE)
+    if not change_marker or not cached or cached.get("key", [])[:2] != [sheet_url, worksheet_name]:
+        return
+    _, _, player_col, tier_col = cached["key"]
+    save_state(TIER_SHEET_CACHE_STATE, {"key": cached["key"], "change_marker": change_marker,
+                                        "tier_data": parse_tier_rows(all_values, player_col, tier_col), "rows": all_values})
+
+
+# --- Function to Fetch Tier Data from Google Sheet ---
+def fetch_tier_data_from_sheet(sheet_url, worksheet_name, player_col, tier_col, credentials_json, client=None):
+    """
+    Fetches player names and their tier piece counts from a Google Sheet.
+
+    The parsed map is cached in the report state together with the spreadsheet's last modified time.
+    When the sheet has not been edited since, the cached map is returned without reading the worksheet.
+    It is also checkpointed for the run, so a resumed run does not contact the Sheets API at all.
+
+    Args:
+        sheet_url (str): The URL of the Google Sheet.
+        worksheet_name (str): The name of the worksheet (tab).
+        player_col (int): The 1-indexed column number for player names.
+        tier_col (int): The 1-indexed column number for tier pieces (e.g., "4/5").
+        credentials_json (str): JSON string of Google Service Account credentials.
+        client (optional): A gspread client or LocalSheetClient to use instead of creating one.
+
+    Returns:
+        dict: A dictionary mapping player names to their tier piece strings (e.g., {"PlayerName": "4/5"}).
+              Returns an empty dict if fetching fails.
+    """
+    resumed = load_json_checkpoint("inputs", "tier_sheet")
+    if resumed is not None:
+        print(f"Using tier data for {len(resumed)} players from the run checkpoint.")
+        return resumed
+
+    if client is None and not credentials_json and not GOOGLE_SHEET_LOCAL_FILE:
+        print("Warning: GOOGLE_SHEETS_CREDENTIALS environment variable is not set. Skipping Google Sheet data fetch.")
+        return {}
+
+    cache_key = [sheet_url, worksheet_name, player_col, tier_col]
+    # Replaced by the client's own exception types once it exists; the except clauses read them at match time
+    spreadsheet_not_found, worksheet_not_found = LocalSpreadsheetNotFound, LocalWorksheetNotFound
+    try:
+        client = client or sheet_client(credentials_json)
+        spreadsheet_not_found, worksheet_not_found = not_found_errors(client)
+        sh = client.open_by_url(sheet_url)
+
+        change_marker = spreadsheet_change_marker(sh)
+        cached = load_state(TIER_SHEET_CACHE_STATE)
+        if change_marker and cached and cached.get("key") == cache_key and cached.get("change_marker") == change_marker:
+            print(f"Google Sheet unchanged since {change_marker}. Using cached tier data for {len(cached['tier_data'])} players.")
+            save_json_checkpoint("inputs", "tier_sheet", cached["tier_data"])
+            return cached["tier_data"]
+
+        worksheet = sh.worksheet(worksheet_name)
+        all_values = worksheet.get_all_values()
+
+        tier_data = parse_tier_rows(all_values, player_col, tier_col)
+
+        print(f"Successfully fetched tier data for {len(tier_data)} players from Google Sheet.")
+        if change_marker:
+            save_state(TIER_SHEET_CACHE_STATE, {"key": cache_key, "change_marker": change_marker, "tier_data": tier_data, "rows": all_values})
+        save_json_checkpoint("inputs", "tier_sheet", tier_data)
+        return tier_data
+
+    except spreadsheet_not_found:
+        print(f"Error: Google Spreadsheet not found at URL: {sheet_url}")
+    except worksheet_not_found:
+        print(f"Error: Worksheet '{worksheet_name}' not found in the spreadsheet.")
+    except json.JSONDecodeError:
+        print("Error: GOOGLE_SHEETS_CREDENTIALS environment variable is not valid JSON.")
+    except Exception as e:
+        print(f"Error fetching data from Google Sheet: {e}")
+    return {} # Return empty dict on failure
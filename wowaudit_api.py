@@ -0,0 +1,236 @@
+import requests
+import hashlib
+import math
+import os
+import queue
+import threading
+import time
+
+from report_state import load_state, save_state, state_file_path
+from rate_limiter import acquire_token, observe_rate_limit_headers
+from run_budget import DeadlineExceeded, run_budget_active, stage_remaining_seconds
+from run_metrics import inc_counter
+from run_checkpoint import load_checkpoint, load_json_checkpoint, save_checkpoint, save_json_checkpoint
+from wowaudit_records import load_json_body
+
+# --- Configuration ---
+WOWAUDIT_API_BASE_URL = 'https://wowaudit.com/v1'
+
+# Index of cached response validators per URL: {url: {"etag": ..., "last_modified": ..., "body_file": ...}}.
+# The response bodies themselves are stored as separate files so the index stays small.
+HTTP_CACHE_STATE = 'http_cache'
+_http_cache_lock = threading.Lock() # Backfills fetch from several threads; the index is read-modify-write
+
+# A GET that has not answered after HEDGE_DELAY_SECONDS gets a second, parallel attempt; the first response
+# wins and the stragglers are abandoned. Failed attempts are retried the same way, up to HEDGE_MAX_ATTEMPTS.
+HEDGE_DELAY_SECONDS = float(os.getenv('HEDGE_DELAY_SECONDS', '3'))
+HEDGE_MAX_ATTEMPTS = max(int(os.getenv('HEDGE_MAX_ATTEMPTS', '3')), 1) # Every GET needs at least one attempt
+
+# Without a run budget, failed attempts are retried one after the other with exponential backoff starting
+# at this many seconds. A 429's Retry-After is honoured on top of that by the rate limiter.
+WOWAUDIT_RETRY_BACKOFF_SECONDS = float(os.getenv('WOWAUDIT_RETRY_BACKOFF_SECONDS', '1'))
+
+# Paths answered from the local cache because the API failed or ran out of time: {path: fetched_at (unix time)}.
+_stale_sources = {}
+
+
+# --- Function to Build WoW Audit Request Headers ---
+def wowaudit_headers(api_auth_header):
+    """
+    Returns the headers every WoW Audit API request needs.
+    """
+    return {
+        "accept": "application/json",
+        "Authorization": api_auth_header
+    }
+
+
+# --- Function to Get the Budget Stage of a Path ---
+def stage_for_path(path):
+    """
+    Returns the run_budget stage of an API path, e.g. "/loot_history/14" -> "loot_history".
+    """
+    return path.strip('/').split('/')[0].split('?')[0]
+
+
+# --- Function to Send One GET Attempt ---
+def _get_attempt(url, headers, stage, timeout):
+    """
+    Takes a token from the shared rate limiter and sends one GET.
+
+    Returns:
+        tuple: (response, None) or (None, error).
+    """
+    api_key = headers.get("Authorization")
+    if not acquire_token(api_key, math.inf if timeout is None else timeout):
+        return None, DeadlineExceeded(f"No rate limit token for {url} within the '{stage}' budget")
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        observe_rate_limit_headers(api_key, response.headers)
+        inc_counter("wowaudit_requests", "WoW Audit API requests by endpoint and HTTP status", endpoint=stage, status=str(response.status_code))
+        inc_counter("wowaudit_response_bytes", "WoW Audit API response body bytes by endpoint", len(response.content), endpoint=stage)
+    except requests.exceptions.RequestException as e:
+        inc_counter("wowaudit_requests", "WoW Audit API requests by endpoint and HTTP status", endpoint=stage, status="error")
+        return None, e
+    if response.status_code == 429 or response.status_code >= 500:
+        return response, requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {url}", response=response)
+    return response, None
+
+
+# --- Function to Send a Hedged GET ---
+def hedged_get(url, headers, stage):
+    """
+    GETs a URL within the stage budget, sending a parallel attempt whenever the outstanding ones have not
+    answered after HEDGE_DELAY_SECONDS or have failed. Attempts run in daemon threads, so abandoned
+    stragglers never hold up the run. Each attempt takes a token from the shared rate limiter first.
+
+    Without an active run budget (bulk scripts, see run_budget) nothing is hedged: attempts are sent one
+    after the other, only after the previous one failed and a backoff of WOWAUDIT_RETRY_BACKOFF_SECONDS
+    (doubling per retry), and without a timeout. Retry-After blocks the shared rate limiter, so the
+    next attempt's token waits for it as well.
+
+    Returns:
+        requests.Response: The first response that is not a 429/5xx.
+
+    Raises:
+        DeadlineExceeded: If the stage budget runs out first.
+        requests.exceptions.RequestException: If every attempt failed.
+    """
+    if not run_budget_active():
+        for attempt_number in range(1, HEDGE_MAX_ATTEMPTS + 1):
+            if attempt_number > 1:
+                backoff_seconds = WOWAUDIT_RETRY_BACKOFF_SECONDS * 2 ** (attempt_number - 2)
+                print(f"DEBUG: Sending attempt {attempt_number} for {url} in {backoff_seconds:.1f}s.")
+                time.sleep(backoff_seconds)
+                inc_counter("wowaudit_retries", "Hedged or retried WoW Audit API attempts beyond the first", endpoint=stage)
+            response, error = _get_attempt(url, headers, stage, None)
+            if error is None:
+                return response
+            print(f"Warning: Attempt for {url} failed: {error}")
+        raise error
+
+    results = queue.Queue()
+
+    def attempt(timeout):
+        results.put(_get_attempt(url, headers, stage, timeout))
+
+    attempts = in_flight = 0
+    last_error = None
+    while True:
+        remaining = stage_remaining_seconds(stage)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Budget for stage '{stage}' exhausted after {attempts} attempt(s) for {url}")
+        if attempts < HEDGE_MAX_ATTEMPTS:
+            if attempts:
+                print(f"DEBUG: Sending attempt {attempts + 1} for {url}.")
+                inc_counter("wowaudit_retries", "Hedged or retried WoW Audit API attempts beyond the first", endpoint=stage)
+            threading.Thread(target=attempt, args=(max(remaining, 0.1),), daemon=True).start()
+            attempts += 1
+            in_flight += 1
+        elif not in_flight:
+            raise last_error
+
+        wait_seconds = min(HEDGE_DELAY_SECONDS, remaining) if attempts < HEDGE_MAX_ATTEMPTS else remaining
+        try:
+            response, error = results.get(timeout=wait_seconds)
+        except queue.Empty:
+            continue # No answer yet: hedge with another attempt
+        in_flight -= 1
+        if error is None:
+            return response
+        last_error = error
+        print(f"Warning: Attempt for {url} failed: {error}")
+
+
+# --- Function to List Stale Sources ---
+def stale_sources():
+    """
+    Returns {path: fetched_at} for every response served from the local cache after the API failed this run.
+    """
+    return dict(_stale_sources)
+
+
+# --- Function to Fetch a WoW Audit Endpoint Conditionally ---
+def fetch_wowaudit(path, api_auth_header):
+    """
+    GETs a WoW Audit API path (e.g., "/period" or "/historical_data?period=1021") and returns the raw body.
+
+    The ETag/Last-Modified validators of the previous response are sent as If-None-Match/If-Modified-Since.
+    On 304 Not Modified the cached body is returned, so an unchanged endpoint costs one empty response.
+
+    The request is hedged and bounded by the run budget (see hedged_get). If it still fails, the cached
+    body is returned when there is one, and the path is recorded in stale_sources().
+
+    Every body is checkpointed for the run, so a resumed run (see run_checkpoint) reads it back without a request.
+
+    Returns:
+        bytes: The response body.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails or returns an HTTP error.
+    """
+    resumed_body = load_checkpoint("inputs", path)
+    if resumed_body is not None:
+        stale = load_json_checkpoint("inputs", f"stale:{path}")
+        if stale:
+            _stale_sources[path] = stale["fetched_at"]
+        print(f"DEBUG: {path} read from the run checkpoint.")
+        return resumed_body
+
+    body = _fetch_wowaudit_conditional(path, api_auth_header)
+    save_checkpoint("inputs", path, body)
+    if path in _stale_sources:
+        save_json_checkpoint("inputs", f"stale:{path}", {"fetched_at": _stale_sources[path]})
+    return body
+
+
+def _fetch_wowaudit_conditional(path, api_auth_header):
+    url = f"{WOWAUDIT_API_BASE_URL}{path}"
+    headers = wowaudit_headers(api_auth_header)
+
+    with _http_cache_lock:
+        cached = load_state(HTTP_CACHE_STATE, {}).get(url)
+    cached_body = None
+    if cached and os.path.exists(cached.get("body_file", "")):
+        with open(cached["body_file"], 'rb') as f:
+            cached_body = f.read()
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        response = hedged_get(url, headers, stage_for_path(path))
+        if response.status_code == 304 and cached_body is not None:
+            print(f"DEBUG: {path} not modified since last run, using cached response.")
+            return cached_body
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        if cached_body is None:
+            raise
+        print(f"Warning: {path} could not be fetched ({e}). Using the cached response from the last successful run.")
+        # Cache entries written before fetched_at was recorded fall back to the body file's mtime
+        _stale_sources[path] = cached.get("fetched_at") or os.path.getmtime(cached["body_file"])
+        inc_counter("wowaudit_stale_responses", "WoW Audit API responses served from the local cache after a failure", endpoint=stage_for_path(path))
+        return cached_body
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        body_file = state_file_path(f"http_cache_{hashlib.sha1(url.encode('utf-8')).hexdigest()}", extension="body")
+        with open(body_file, 'wb') as f:
+            f.write(response.content)
+        with _http_cache_lock:
+            cache_index = load_state(HTTP_CACHE_STATE, {})
+            cache_index[url] = {"etag": etag, "last_modified": last_modified, "body_file": body_file, "fetched_at": time.time()}
+            save_state(HTTP_CACHE_STATE, cache_index)
+    return response.content
+
+
+# --- Function to Fetch and Decode a WoW Audit Endpoint ---
+def get_wowaudit_json(path, api_auth_header):
+    """
+    Same as fetch_wowaudit, but returns the decoded JSON. A malformed body raises
+    requests.exceptions.JSONDecodeError, a RequestException (see wowaudit_records.load_json_body).
+    """
+    return load_json_body(fetch_wowaudit(path, api_auth_header))
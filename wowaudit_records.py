@@ -0,0 +1,142 @@
+import requests
+
+try:
+    from orjson import loads as json_loads # Optional, decodes bytes noticeably faster than the json module
+except ImportError:
+    from json import loads as json_loads
+
+# Typed records for WoW Audit API payloads. Each payload is decoded and validated once here, so the
+# report loops can read plain attributes without chained .get()/isinstance checks.
+
+
+# --- Record: Character (/v1/characters) ---
+class Character:
+    __slots__ = ("id", "name", "character_class")
+
+    def __init__(self, id, name, character_class):
+        self.id = id
+        self.name = name
+        self.character_class = character_class
+
+    def __repr__(self):
+        return f"Character(id={self.id!r}, name={self.name!r}, character_class={self.character_class!r})"
+
+
+# --- Record: Dungeon Vault Snapshot (/v1/historical_data) ---
+class VaultSnapshot:
+    __slots__ = ("character_id", "name", "option_1", "option_2", "option_3")
+
+    def __init__(self, character_id, name, option_1, option_2, option_3):
+        self.character_id = character_id
+        self.name = name
+        self.option_1 = option_1
+        self.option_2 = option_2
+        self.option_3 = option_3
+
+    def __repr__(self):
+        return (f"VaultSnapshot(name={self.name!r}, option_1={self.option_1!r}, "
+                f"option_2={self.option_2!r}, option_3={self.option_3!r})")
+
+
+# --- Record: Loot History Entry (/v1/loot_history/{season_id}) ---
+class LootEntry:
+    __slots__ = ("id", "character_id", "item_id", "name", "response_type", "discarded", "difficulty", "slot", "awarded_at")
+
+    def __init__(self, id, character_id, item_id, name, response_type, discarded, difficulty, slot, awarded_at):
+        self.id = id
+        self.character_id = character_id
+        self.item_id = item_id
+        self.name = name
+        self.response_type = response_type # Response type name as shown in WoW Audit (e.g., "BiS"), or None
+        self.discarded = discarded
+        self.difficulty = difficulty
+        self.slot = slot
+        self.awarded_at = awarded_at # ISO 8601 timestamp string, or None
+
+    def __repr__(self):
+        return f"LootEntry(id={self.id!r}, character_id={self.character_id!r}, name={self.name!r}, response_type={self.response_type!r})"
+
+
+# --- Function to Parse a Response Body ---
+def load_json_body(body):
+    """
+    Parses a WoW Audit response body as JSON.
+
+    Raises:
+        requests.exceptions.JSONDecodeError: If the body is not valid JSON. Like response.json(), this is both a
+            RequestException (the reports' fetch error handlers) and a ValueError (the backfills' decode handlers).
+    """
+    try:
+        return json_loads(body)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(getattr(e, "msg", str(e)), getattr(e, "doc", ""), getattr(e, "pos", 0)) from e
+
+
+# --- Function to Decode /v1/characters ---
+def decode_characters(body):
+    """
+    Decodes a /v1/characters response body into Character records.
+    Entries without an id or name are skipped.
+    """
+    characters = []
+    for char_data in load_json_body(body):
+        if not isinstance(char_data, dict):
+            continue
+        char_id = char_data.get('id')
+        char_name = char_data.get('name')
+        if char_id and char_name:
+            characters.append(Character(char_id, char_name, char_data.get('class')))
+    return characters
+
+
+# --- Function to Decode /v1/historical_data ---
+def decode_historical_data(body):
+    """
+    Decodes a /v1/historical_data response body into VaultSnapshot records.
+    Missing 'data'/'vault_options'/'dungeons' objects become None options.
+    """
+    snapshots = []
+    payload = load_json_body(body)
+    for item in (payload.get("characters") or []) if isinstance(payload, dict) else []:
+        if not isinstance(item, dict):
+            print(f"Warning: Historical data item is not a dictionary. Skipping: {item}")
+            continue
+        data_content = item.get("data")
+        vault_options_content = data_content.get("vault_options") if isinstance(data_content, dict) else None
+        dungeons = vault_options_content.get("dungeons") if isinstance(vault_options_content, dict) else None
+        if not isinstance(dungeons, dict):
+            dungeons = {}
+        snapshots.append(VaultSnapshot(
+            item.get("id"),
+            item.get("name"),
+            dungeons.get("option_1"),
+            dungeons.get("option_2"),
+            dungeons.get("option_3"),
+        ))
+    return snapshots
+
+
+# --- Function to Decode /v1/loot_history/{season_id} ---
+def decode_loot_history(body):
+    """
+    Decodes a /v1/loot_history response body (entries under 'history_items') into LootEntry records.
+    """
+    entries = []
+    payload = load_json_body(body)
+    for loot_entry in (payload.get('history_items') or []) if isinstance(payload, dict) else []:
+        if not isinstance(loot_entry, dict):
+            print(f"Warning: Unexpected loot entry format encountered. Expected dict, got {type(loot_entry)}: {loot_entry}")
+            continue
+        response_type = loot_entry.get('response_type')
+        entries.append(LootEntry(
+            loot_entry.get('id'),
+            loot_entry.get('character_id'), # Loot history uses 'character_id' for recipient
+            loot_entry.get('item_id'),
+            loot_entry.get('name'),
+            response_type.get('name') if isinstance(response_type, dict) else None,
+            bool(loot_entry.get('discarded', False)),
+            loot_entry.get('difficulty'),
+            loot_entry.get('slot'),
+            loot_entry.get('awarded_at') or loot_entry.get('timestamp'),
+        ))
+    return entries